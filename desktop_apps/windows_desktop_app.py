@@ -2,63 +2,742 @@
 """
 Hyper-Jarvis Windows Desktop Application
 PyQt5-based GUI for browser automation with DeepSeek LLM integration
+
+Heavy modules are imported lazily: requests and sqlite3 on a background
+thread behind the splash screen, QtWebEngine (Chromium) when the Browser
+tab is first shown. Run with --profile-startup to write a timing report.
 """
 
+import time
+STARTUP_T0 = time.perf_counter()
+
 import sys
 import os
 import json
-import asyncio
-import requests
-from typing import Optional
+import argparse
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 from datetime import datetime
 
 import PyQt5.QtWidgets as QtWidgets
 import PyQt5.QtCore as QtCore
 import PyQt5.QtGui as QtGui
-from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtCore import QThread, pyqtSignal
+IMPORTS_DONE = time.perf_counter()
 
 # Configuration
 LLM_SERVER_URL = os.environ.get("LLM_SERVER_URL", "http://localhost:8000")
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "4"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", "512"))
+UI_FRAME_MS = int(os.environ.get("UI_FRAME_MS", "16"))
+ACTION_TIMEOUT_MS = int(os.environ.get("ACTION_TIMEOUT_MS", "30000"))
+ACTION_POLL_MS = int(os.environ.get("ACTION_POLL_MS", "100"))
+HEALTH_INTERVAL = float(os.environ.get("HEALTH_INTERVAL", "10"))
+HEALTH_BACKOFF_MAX = float(os.environ.get("HEALTH_BACKOFF_MAX", "60"))
+# Kept short: closing the window waits for a probe in progress
+HEALTH_PROBE_TIMEOUT = float(os.environ.get("HEALTH_PROBE_TIMEOUT", "1.5"))
+HEALTH_STOP_WAIT_MS = int(HEALTH_PROBE_TIMEOUT * 1000) + 500
+DATA_DIR = Path(os.environ.get("HYPER_JARVIS_DATA_DIR", Path.home() / ".hyper_jarvis"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1000"))
+CACHE_PREFETCH = int(os.environ.get("CACHE_PREFETCH", "50"))
+HISTORY_LIMIT = int(os.environ.get("HISTORY_LIMIT", "100"))
 APP_VERSION = "1.0.0"
 
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    model TEXT,
+    created REAL NOT NULL,
+    cached INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+HISTORY_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    prompt, response, content='history', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts (rowid, prompt, response) VALUES (new.id, new.prompt, new.response);
+END;
+"""
+
+class StartupProfile:
+    """Timings of startup phases, relative to process start, for --profile-startup"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float, float, str]] = []
+        self._lock = threading.Lock()
+        self.record("module imports", STARTUP_T0, IMPORTS_DONE)
+
+    def record(self, name: str, start: float, end: float):
+        with self._lock:
+            self.phases.append((name, start - STARTUP_T0, end - start,
+                                threading.current_thread().name))
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        self.record(name, now, now)
+
+    def report(self) -> str:
+        lines = [f"Hyper-Jarvis startup profile (v{APP_VERSION})",
+                 f"{'start ms':>10} {'took ms':>10}  {'thread':<14} phase"]
+        with self._lock:
+            for name, start, duration, thread in sorted(self.phases, key=lambda p: p[1]):
+                lines.append(f"{start * 1000:10.1f} {duration * 1000:10.1f}  {thread:<14} {name}")
+        lines.append("Per-module import times: python -X importtime windows_desktop_app.py")
+        return "\n".join(lines) + "\n"
+
+startup_profile = StartupProfile()
+
+def completion_params(plan_actions: bool = False) -> Dict[str, Any]:
+    """Sampling parameters sent with every task (part of the cache key)"""
+    params = {"max_tokens": LLM_MAX_TOKENS, "temperature": 0.7}
+    if plan_actions:
+        # The server constrains the output to its browser action-plan schema
+        params["response_format"] = {"type": "json_schema", "json_schema": {"name": "action_plan"}}
+    return params
+
+class LocalStore:
+    """
+    On-disk response cache and task history in one sqlite file. Responses
+    are keyed by prompt + server model + sampling params and evicted least
+    recently used beyond CACHE_MAX_ENTRIES; the most recently used ones are
+    also kept in memory. History is full-text searchable.
+    """
+
+    def __init__(self, path: Path):
+        import sqlite3
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Opened on the startup thread and used from the GUI thread, so access is serialized by _lock
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._hot: "OrderedDict[str, str]" = OrderedDict()
+        self.fts = True
+        with self._lock, self.db:
+            self.db.executescript(STORE_SCHEMA)
+            try:
+                self.db.executescript(HISTORY_FTS_SCHEMA)
+            except sqlite3.OperationalError:
+                # sqlite built without FTS5: search falls back to LIKE
+                self.fts = False
+
+    @staticmethod
+    def cache_key(prompt: str, model: str, params: Dict[str, Any]) -> str:
+        import hashlib
+        material = json.dumps({"prompt": prompt, "model": model, "params": params}, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, response: str):
+        self._hot[key] = response
+        self._hot.move_to_end(key)
+        while len(self._hot) > CACHE_PREFETCH:
+            self._hot.popitem(last=False)
+
+    def prefetch(self):
+        """Load the most recently used responses into memory"""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT key, response FROM responses ORDER BY last_used DESC LIMIT ?",
+                (CACHE_PREFETCH,)).fetchall()
+            for key, response in reversed(rows):
+                self._remember(key, response)
+
+    def lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            response = self._hot.get(key)
+            if response is None:
+                row = self.db.execute("SELECT response FROM responses WHERE key = ?",
+                                      (key,)).fetchone()
+                if row is None:
+                    return None
+                response = row[0]
+            self._remember(key, response)
+            with self.db:
+                self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return response
+
+    def store(self, key: str, prompt: str, model: str, response: str):
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, prompt, model, response, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, prompt, model, response, now, now))
+            self.db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (CACHE_MAX_ENTRIES,))
+            self._remember(key, response)
+
+    def add_history(self, prompt: str, response: str, model: Optional[str], cached: bool):
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT INTO history (prompt, response, model, created, cached) VALUES (?, ?, ?, ?, ?)",
+                (prompt, response, model, time.time(), int(cached)))
+
+    def search_history(self, query: str, limit: int = HISTORY_LIMIT) -> List[Tuple]:
+        """(id, prompt, response, created, cached) rows, best matches first"""
+        columns = "h.id, h.prompt, h.response, h.created, h.cached"
+        terms = query.split()
+        with self._lock:
+            if not terms:
+                return self.db.execute(
+                    f"SELECT {columns} FROM history h ORDER BY h.id DESC LIMIT ?", (limit,)).fetchall()
+            if self.fts:
+                # Quote each term so user input is never parsed as FTS syntax
+                match = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+                return self.db.execute(
+                    f"SELECT {columns} FROM history_fts JOIN history h ON h.id = history_fts.rowid "
+                    f"WHERE history_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit)).fetchall()
+            pattern = f"%{query.strip()}%"
+            return self.db.execute(
+                f"SELECT {columns} FROM history h WHERE h.prompt LIKE ? OR h.response LIKE ? "
+                f"ORDER BY h.id DESC LIMIT ?", (pattern, pattern, limit)).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+class RequestCancelled(Exception):
+    """Raised inside a worker whose request was cancelled"""
+
+class StreamIncomplete(IOError):
+    """Raised when a response stream ends before the server's [DONE]"""
+
+class LLMClient:
+    """
+    Long-lived HTTP client for the LLM server. All requests share one
+    keep-alive connection pool, so only the first request (or the first
+    after an idle disconnect) pays for the TCP/TLS handshake.
+    """
+
+    def __init__(self, base_url: str):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._active = {}  # cancel event -> open response
+        self.model: Optional[str] = None  # reported by /health
+
+    def set_base_url(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def health(self) -> bool:
+        import requests
+        try:
+            response = self.session.get(f"{self.base_url}/health", timeout=HEALTH_PROBE_TIMEOUT)
+            if response.status_code != 200:
+                return False
+            self.model = response.json().get("model", self.model)
+            return True
+        except (requests.RequestException, ValueError):
+            return False
+
+    def stream_completion(self, prompt: str, params: Dict[str, Any],
+                          cancel: threading.Event) -> Iterator[str]:
+        """
+        POST /v1/completions with stream=true and yield text deltas as the
+        server sends them; raises RequestCancelled once `cancel` is set and
+        StreamIncomplete if the connection ends without data: [DONE]
+        """
+        response = self.session.post(
+            f"{self.base_url}/v1/completions",
+            json={"prompt": prompt, **params, "stream": True},
+            timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+            stream=True
+        )
+        with self._lock:
+            self._active[cancel] = response
+        try:
+            if cancel.is_set():
+                raise RequestCancelled()
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    return
+                event = json.loads(data)
+                if "error" in event:
+                    raise RuntimeError(event["error"].get("message", event["error"]))
+                for choice in event.get("choices", []):
+                    if choice.get("text"):
+                        yield choice["text"]
+            # A crashed server or cut proxy connection must not pass for a full answer
+            raise StreamIncomplete("Connection closed before the response was complete")
+        except Exception:
+            if cancel.is_set():
+                raise RequestCancelled()
+            raise
+        finally:
+            with self._lock:
+                self._active.pop(cancel, None)
+            response.close()
+
+    def cancel(self, cancel: threading.Event):
+        """
+        Cancel one request. Closing its response drops the connection, which
+        the server sees as a disconnect and aborts the generation.
+        """
+        cancel.set()
+        with self._lock:
+            response = self._active.pop(cancel, None)
+        if response is not None:
+            response.close()
+
+    def close(self):
+        with self._lock:
+            events = list(self._active)
+        for cancel in events:
+            self.cancel(cancel)
+        self.session.close()
+
 class LLMWorker(QThread):
-    """Worker thread for LLM API calls"""
+    """Worker thread for LLM API calls, streaming the response as it is generated"""
+    chunk = pyqtSignal(str)
+    progress = pyqtSignal(int)
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
+    cancelled = pyqtSignal()
     
-    def __init__(self, prompt: str):
+    def __init__(self, client: LLMClient, prompt: str, params: Dict[str, Any],
+                 cache_key: Optional[str] = None):
         super().__init__()
+        self.client = client
         self.prompt = prompt
+        self.params = params
+        self.cache_key = cache_key
+        self.model = client.model
+        self.cancel_event = threading.Event()
     
     def run(self):
+        parts = []
         try:
-            response = requests.post(
-                f"{LLM_SERVER_URL}/v1/completions",
-                json={
-                    "prompt": self.prompt,
-                    "max_tokens": 512,
-                    "temperature": 0.7,
-                },
-                timeout=60
-            )
-            response.raise_for_status()
-            data = response.json()
-            result = data["choices"][0]["text"]
-            self.finished.emit(result)
+            for text in self.client.stream_completion(self.prompt, self.params, self.cancel_event):
+                parts.append(text)
+                self.chunk.emit(text)
+                # One streamed delta is one token
+                self.progress.emit(min(100, len(parts) * 100 // LLM_MAX_TOKENS))
+            self.finished.emit("".join(parts))
+        except RequestCancelled:
+            self.cancelled.emit()
         except Exception as e:
             self.error.emit(f"Error: {str(e)}")
+    
+    def cancel(self):
+        self.client.cancel(self.cancel_event)
+
+class HealthMonitor(QThread):
+    """
+    Polls /health off the GUI thread. While the server is unreachable the
+    interval doubles up to HEALTH_BACKOFF_MAX; probe_now() skips the wait.
+    """
+    status_changed = pyqtSignal(bool)
+    
+    def __init__(self, client: LLMClient):
+        super().__init__()
+        self.client = client
+        self._wake = threading.Event()
+        self._stopping = False
+    
+    def run(self):
+        delay = HEALTH_INTERVAL
+        while not self._stopping:
+            connected = self.client.health()
+            if self._stopping:
+                break
+            self.status_changed.emit(connected)
+            delay = HEALTH_INTERVAL if connected else min(delay * 2, HEALTH_BACKOFF_MAX)
+            self._wake.wait(delay)
+            self._wake.clear()
+    
+    def probe_now(self):
+        self._wake.set()
+    
+    def request_stop(self):
+        """Ask the loop to exit after the probe in progress, without waiting"""
+        self._stopping = True
+        self._wake.set()
+    
+    def stop(self) -> bool:
+        """Stop and wait at most HEALTH_STOP_WAIT_MS (longer than one probe can take)"""
+        self.request_stop()
+        return self.wait(HEALTH_STOP_WAIT_MS)
+
+# Checks (and for click/type, acts on) one element; true = done, false = not yet
+ELEMENT_PROBE_JS = """
+function (selector, action, text) {
+  try {
+    var el = document.querySelector(selector);
+    var visible = !!el && el.getClientRects().length > 0 &&
+        getComputedStyle(el).visibility !== 'hidden';
+    if (action === 'attached') return !!el;
+    if (action === 'detached') return !el;
+    if (action === 'visible') return visible;
+    if (action === 'hidden') return !visible;
+    if (!visible) return false;
+    el.scrollIntoView({block: 'center'});
+    if (action === 'click') {
+      el.click();
+    } else {
+      el.focus();
+      if (el.isContentEditable) { el.textContent = text; } else { el.value = text; }
+      el.dispatchEvent(new Event('input', {bubbles: true}));
+      el.dispatchEvent(new Event('change', {bubbles: true}));
+    }
+    return true;
+  } catch (e) {
+    return {error: String(e)};
+  }
+}
+"""
+
+# runJavaScript swallows exceptions, so scripts report their own errors
+EVALUATE_JS = """
+(function (script) {
+  try { return {value: (0, eval)(script)}; } catch (e) { return {error: String(e)}; }
+})(%s)
+"""
+
+def parse_action_plan(text: str) -> Optional[List[Dict[str, Any]]]:
+    """The actions of an action-plan JSON response, or None if it is not one"""
+    text = text.strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        plan = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    actions = plan.get("actions") if isinstance(plan, dict) else None
+    if not isinstance(actions, list) or not all(isinstance(a, dict) for a in actions):
+        return None
+    return actions
+
+class BrowserActionExecutor(QtCore.QObject):
+    """
+    Runs action plans (the vocabulary of src/modules/dispatcher.js) on the
+    embedded browser via runJavaScript. Actions run in order and stop at the
+    first failure, except that consecutive waits start together and
+    complete as a group. Element checks of all pending actions are batched
+    into one runJavaScript call per poll.
+    """
+    action_done = pyqtSignal(int, dict)
+    finished = pyqtSignal(list)
+    
+    def __init__(self, view, parent=None):
+        super().__init__(parent)
+        self.view = view
+        self.actions: List[Dict[str, Any]] = []
+        self.results: List[Dict[str, Any]] = []
+        self.group: Dict[int, Optional[Dict[str, Any]]] = {}  # index -> result once done
+        self.probes: Dict[int, Tuple[str, str, str, float]] = {}  # index -> selector, state, text, deadline
+        self.running = False
+        self.polling = False  # a probe call is in flight; never click twice
+        self.generation = 0  # callbacks from a cancelled run are ignored
+        self.poll_timer = QtCore.QTimer(self)
+        self.poll_timer.setInterval(ACTION_POLL_MS)
+        self.poll_timer.timeout.connect(self._poll)
+        self.handlers = {
+            "navigate": self._navigate,
+            "click": self._click,
+            "type": self._type,
+            "wait": self._wait,
+            "screenshot": self._screenshot,
+            "evaluate": self._evaluate,
+            "getcontent": self._get_content,
+        }
+    
+    def run(self, actions: List[Dict[str, Any]]):
+        self.cancel()
+        self.actions = actions
+        self.results = []
+        self.running = True
+        self._start_group(0)
+    
+    def cancel(self):
+        self.generation += 1
+        self.running = False
+        self.group.clear()
+        self.probes.clear()
+        self.polling = False
+        self.poll_timer.stop()
+    
+    def _start_group(self, index: int):
+        if index >= len(self.actions):
+            self.running = False
+            self.finished.emit(self.results)
+            return
+        end = index + 1
+        if self._type_of(index) == "wait":
+            while end < len(self.actions) and self._type_of(end) == "wait":
+                end += 1
+        self.group = {i: None for i in range(index, end)}
+        for i in range(index, end):
+            if i in self.group:  # an earlier action of the group may have failed synchronously
+                self._start(i)
+    
+    def _type_of(self, index: int) -> str:
+        return str(self.actions[index].get("type") or "").lower()
+    
+    def _start(self, index: int):
+        action = self.actions[index]
+        action_type = self._type_of(index)
+        handler = self.handlers.get(action_type)
+        try:
+            if not action_type:
+                raise ValueError("Action type is required")
+            if handler is None:
+                raise ValueError(f"Unknown action type: {action_type}")
+            handler(index, action.get("parameters") or {})
+        except ValueError as e:
+            self._fail(index, str(e))
+    
+    def _succeed(self, index: int, result: Any):
+        self._complete(index, {"success": True, "action": self._type_of(index), "result": result})
+    
+    def _fail(self, index: int, error: str):
+        self._complete(index, {"success": False, "action": self.actions[index].get("type"),
+                               "error": error})
+    
+    def _complete(self, index: int, result: Dict[str, Any]):
+        if index not in self.group or self.group[index] is not None:
+            return
+        self.group[index] = result
+        self.probes.pop(index, None)
+        if any(r is None for r in self.group.values()):
+            return
+        for i in sorted(self.group):
+            self.results.append(self.group[i])
+            self.action_done.emit(i, self.group[i])
+            if not self.group[i]["success"]:
+                self.cancel()
+                self.finished.emit(self.results)
+                return
+        self._start_group(max(self.group) + 1)
+    
+    def _callback(self, index: Any, handle: Callable[[Any, Any], None]) -> Callable[[Any], None]:
+        """Wrap a Qt callback so it is dropped if the run was cancelled meanwhile"""
+        generation = self.generation
+        def callback(value):
+            if generation == self.generation:
+                handle(index, value)
+        return callback
+    
+    # Element actions are polled until done or timed out
+    
+    def _probe(self, index: int, selector: str, state: str, text: str = "",
+               timeout_ms: Optional[int] = None):
+        timeout_ms = timeout_ms or ACTION_TIMEOUT_MS
+        self.probes[index] = (selector, state, text, time.monotonic() + timeout_ms / 1000)
+        if not self.poll_timer.isActive():
+            self.poll_timer.start()
+        self._poll()
+    
+    def _poll(self):
+        if not self.probes:
+            self.poll_timer.stop()
+            return
+        if self.polling:
+            return
+        self.polling = True
+        indexes = list(self.probes)
+        calls = ",".join(f"({ELEMENT_PROBE_JS}).apply(null, {json.dumps(list(self.probes[i][:3]))})"
+                         for i in indexes)
+        self.view.page().runJavaScript(f"[{calls}]", self._callback(indexes, self._on_poll))
+    
+    def _on_poll(self, indexes: List[int], values: Any):
+        self.polling = False
+        values = values if isinstance(values, list) else [None] * len(indexes)
+        now = time.monotonic()
+        for index, value in zip(indexes, values):
+            if index not in self.probes:
+                continue
+            selector, state, _, deadline = self.probes[index]
+            action_type = self._type_of(index)
+            if isinstance(value, dict) and "error" in value:
+                self._fail(index, value["error"])
+            elif value is True:
+                result = {"success": True, "selector": selector}
+                if action_type == "type":
+                    result["text"] = self.probes[index][2]
+                self._succeed(index, result)
+            elif now >= deadline:
+                self._fail(index, f"Timed out waiting for {selector} ({state})")
+    
+    def _click(self, index: int, params: Dict[str, Any]):
+        if not params.get("selector"):
+            raise ValueError("Selector is required for click action")
+        self._probe(index, params["selector"], "click")
+    
+    def _type(self, index: int, params: Dict[str, Any]):
+        if not params.get("selector") or params.get("text") is None:
+            raise ValueError("Selector and text are required for type action")
+        self._probe(index, params["selector"], "type", str(params["text"]))
+    
+    def _wait(self, index: int, params: Dict[str, Any]):
+        selector, timeout = params.get("selector"), params.get("timeout")
+        if selector:
+            self._probe(index, selector, params.get("state") or "visible", timeout_ms=timeout)
+        elif timeout:
+            succeed = self._callback(index, self._succeed)
+            QtCore.QTimer.singleShot(int(timeout), lambda: succeed({"success": True, "waited": timeout}))
+        else:
+            raise ValueError("Either selector or timeout is required for wait action")
+    
+    # Page-level actions
+    
+    def _navigate(self, index: int, params: Dict[str, Any]):
+        url = params.get("url")
+        if not url:
+            raise ValueError("URL is required for navigate action")
+        page = self.view.page()
+        succeed, fail = self._callback(index, self._succeed), self._callback(index, self._fail)
+        timer = QtCore.QTimer(self)
+        timer.setSingleShot(True)
+        
+        def done(ok: bool):
+            timer.stop()
+            timer.deleteLater()
+            page.loadFinished.disconnect(done)
+            if ok:
+                succeed({"success": True, "url": url})
+            else:
+                fail(f"Navigation to {url} failed")
+        
+        def timed_out():
+            timer.deleteLater()
+            page.loadFinished.disconnect(done)
+            fail(f"Navigation to {url} timed out")
+        
+        page.loadFinished.connect(done)
+        timer.timeout.connect(timed_out)
+        timer.start(ACTION_TIMEOUT_MS)
+        self.view.load(QtCore.QUrl(url))
+    
+    def _screenshot(self, index: int, params: Dict[str, Any]):
+        # The widget can only grab what is rendered, so fullPage captures the viewport
+        image_format = "JPEG" if params.get("type") == "jpeg" else "PNG"
+        data = QtCore.QByteArray()
+        buffer = QtCore.QBuffer(data)
+        buffer.open(QtCore.QIODevice.WriteOnly)
+        self.view.grab().save(buffer, image_format)
+        self._succeed(index, {"success": True, "screenshot": bytes(data.toBase64()).decode("ascii")})
+    
+    def _evaluate(self, index: int, params: Dict[str, Any]):
+        if not params.get("script"):
+            raise ValueError("Script is required for evaluate action")
+        self.view.page().runJavaScript(EVALUATE_JS % json.dumps(params["script"]),
+                                       self._callback(index, self._on_evaluate))
+    
+    def _on_evaluate(self, index: int, value: Any):
+        if isinstance(value, dict) and "error" in value:
+            self._fail(index, value["error"])
+        else:
+            self._succeed(index, {"success": True,
+                                  "result": value.get("value") if isinstance(value, dict) else value})
+    
+    def _get_content(self, index: int, params: Dict[str, Any]):
+        page = self.view.page()
+        
+        def on_html(index: int, html: str):
+            self._succeed(index, {"content": html, "title": page.title(), "url": page.url().toString()})
+        
+        page.toHtml(self._callback(index, on_html))
+
+class StartupWorker(QThread):
+    """Builds the HTTP client and local store off the GUI thread"""
+    ready = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+    
+    def run(self):
+        client = None
+        try:
+            with startup_profile.phase("http client"):
+                client = LLMClient(LLM_SERVER_URL)
+            with startup_profile.phase("local store"):
+                store = LocalStore(DATA_DIR / "history.db")
+                store.prefetch()
+        except Exception as e:
+            if client is not None:
+                client.close()
+            self.failed.emit(f"{type(e).__name__}: {e}")
+            return
+        self.ready.emit(client, store)
 
 class MainWindow(QtWidgets.QMainWindow):
+    started = pyqtSignal()
+    startup_failed = pyqtSignal(str)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle(f"Hyper-Jarvis Browser - v{APP_VERSION}")
         self.setGeometry(100, 100, 1200, 800)
         self.setStyleSheet(self.get_stylesheet())
+        # Created by StartupWorker while the window is being built
+        self.llm_client: Optional[LLMClient] = None
+        self.store: Optional[LocalStore] = None
+        self.health_monitor: Optional[HealthMonitor] = None
+        self.browser_view = None
+        self.executor: Optional[BrowserActionExecutor] = None
         self.llm_worker = None
+        self.workers = set()  # kept alive until their thread has exited
+        self.report_disconnect = True
+        # Streamed text is buffered and flushed to the view once per frame
+        self.pending_chunks = []
+        self.render_timer = QtCore.QTimer(self)
+        self.render_timer.setInterval(UI_FRAME_MS)
+        self.render_timer.timeout.connect(self.flush_chunks)
+        self.startup_worker = StartupWorker()
+        self.startup_worker.ready.connect(self.on_startup_ready)
+        self.startup_worker.failed.connect(self.on_startup_failed)
+        self.startup_worker.start()
         self.init_ui()
-        self.check_llm_server()
+    
+    def on_startup_ready(self, client: "LLMClient", store: "LocalStore"):
+        """Background init is done: start health checks and enable tasks"""
+        self.startup_worker.wait()
+        self.llm_client = client
+        self.store = store
+        self.health_monitor = HealthMonitor(self.llm_client)
+        self.health_monitor.status_changed.connect(self.on_server_status)
+        self.health_monitor.start()
+        self.refresh_history()
+        self.execute_btn.setEnabled(True)
+        self.started.emit()
+    
+    def on_startup_failed(self, message: str):
+        """Background init raised: the window never becomes usable"""
+        self.startup_worker.wait()
+        self.startup_failed.emit(message)
     
     def init_ui(self):
         """Initialize UI components"""
@@ -97,11 +776,37 @@ class MainWindow(QtWidgets.QMainWindow):
         )
         left_layout.addWidget(self.prompt_input)
         
-        # Execute button
-        execute_btn = QtWidgets.QPushButton("Execute Task")
-        execute_btn.clicked.connect(self.execute_task)
-        execute_btn.setStyleSheet("background-color: #4CAF50; color: white; padding: 10px; font-weight: bold;")
-        left_layout.addWidget(execute_btn)
+        # Execute / Stop buttons
+        button_layout = QtWidgets.QHBoxLayout()
+        self.execute_btn = QtWidgets.QPushButton("Execute Task")
+        self.execute_btn.clicked.connect(self.execute_task)
+        self.execute_btn.setStyleSheet("background-color: #4CAF50; color: white; padding: 10px; font-weight: bold;")
+        self.execute_btn.setEnabled(False)  # until the client is ready
+        button_layout.addWidget(self.execute_btn)
+        
+        self.stop_btn = QtWidgets.QPushButton("Stop")
+        self.stop_btn.clicked.connect(self.stop_task)
+        self.stop_btn.setStyleSheet("background-color: #f44336; color: white; padding: 10px; font-weight: bold;")
+        self.stop_btn.setEnabled(False)
+        button_layout.addWidget(self.stop_btn)
+        left_layout.addLayout(button_layout)
+        
+        self.use_cache = QtWidgets.QCheckBox("Replay cached responses")
+        self.use_cache.setChecked(True)
+        left_layout.addWidget(self.use_cache)
+        
+        self.plan_actions = QtWidgets.QCheckBox("Plan and run browser actions")
+        left_layout.addWidget(self.plan_actions)
+        
+        # History of past tasks, searchable
+        left_layout.addWidget(QtWidgets.QLabel("History"))
+        self.history_search = QtWidgets.QLineEdit()
+        self.history_search.setPlaceholderText("Search past tasks...")
+        self.history_search.textChanged.connect(self.refresh_history)
+        left_layout.addWidget(self.history_search)
+        self.history_list = QtWidgets.QListWidget()
+        self.history_list.itemClicked.connect(self.replay_history_item)
+        left_layout.addWidget(self.history_list)
         
         left_panel.setMaximumWidth(400)
         splitter.addWidget(left_panel)
@@ -119,9 +824,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.output_text.setReadOnly(True)
         self.tabs.addTab(self.output_text, "LLM Response")
         
-        # Browser tab
-        self.browser_view = QWebEngineView()
-        self.tabs.addTab(self.browser_view, "Browser")
+        # Browser tab; the web engine is created when the tab is first shown
+        self.browser_tab = QtWidgets.QWidget()
+        QtWidgets.QVBoxLayout(self.browser_tab).setContentsMargins(0, 0, 0, 0)
+        self.tabs.addTab(self.browser_tab, "Browser")
+        self.tabs.currentChanged.connect(self.on_tab_changed)
         
         right_layout.addWidget(self.tabs)
         splitter.addWidget(right_panel)
@@ -138,21 +845,33 @@ class MainWindow(QtWidgets.QMainWindow):
         
         central_widget.setLayout(layout)
     
-    def check_llm_server(self):
-        """Check if LLM server is running"""
-        try:
-            response = requests.get(f"{LLM_SERVER_URL}/health", timeout=5)
-            if response.status_code == 200:
-                self.status_label.setText("LLM Server: Connected ✓")
-                self.status_label.setStyleSheet("color: green; font-weight: bold;")
-                return True
-        except:
-            pass
+    def on_tab_changed(self, index: int):
+        if self.tabs.widget(index) is self.browser_tab:
+            self.ensure_browser_view()
+    
+    def ensure_browser_view(self):
+        """The embedded browser, starting the web engine on first use"""
+        if self.browser_view is None:
+            with startup_profile.phase("web engine"):
+                from PyQt5.QtWebEngineWidgets import QWebEngineView
+                self.browser_view = QWebEngineView()
+            self.browser_tab.layout().addWidget(self.browser_view)
+        return self.browser_view
+    
+    def on_server_status(self, connected: bool):
+        """Update the server indicator from the background health probe"""
+        if connected:
+            self.status_label.setText("LLM Server: Connected ✓")
+            self.status_label.setStyleSheet("color: green; font-weight: bold;")
+            self.report_disconnect = False
+            return
         
         self.status_label.setText("LLM Server: Disconnected ✗")
         self.status_label.setStyleSheet("color: red; font-weight: bold;")
-        self.show_error(f"Cannot connect to LLM Server at {LLM_SERVER_URL}")
-        return False
+        if self.report_disconnect:
+            # Only the first failed probe after startup or a settings change
+            self.report_disconnect = False
+            self.show_error(f"Cannot connect to LLM Server at {LLM_SERVER_URL}")
     
     def execute_task(self):
         """Execute browser task using LLM"""
@@ -161,24 +880,179 @@ class MainWindow(QtWidgets.QMainWindow):
             self.show_error("Please enter a task description")
             return
         
+        if self.llm_worker is not None:
+            # A new task supersedes the one still running
+            self.llm_worker.cancel()
+            self.llm_worker = None
+        
+        # Responses are cached per server model, so nothing is replayed until it is known
+        if self.executor is not None:
+            self.executor.cancel()
+        model = self.llm_client.model
+        params = completion_params(self.plan_actions.isChecked())
+        cache_key = LocalStore.cache_key(prompt, model, params) if model else None
+        if cache_key is not None and self.use_cache.isChecked():
+            cached = self.store.lookup(cache_key)
+            if cached is not None:
+                self.pending_chunks.clear()
+                self.output_text.setPlainText(cached)
+                self.finish_task()
+                self.store.add_history(prompt, cached, model, cached=True)
+                self.refresh_history()
+                if self.plan_actions.isChecked():
+                    self.run_plan(cached)
+                return
+        
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
-        self.output_text.setText("Processing...")
+        self.pending_chunks.clear()
+        self.output_text.clear()
+        self.output_text.setPlaceholderText("Processing...")
+        self.stop_btn.setEnabled(True)
         
-        self.llm_worker = LLMWorker(prompt)
+        self.llm_worker = LLMWorker(self.llm_client, prompt, params, cache_key)
+        self.workers.add(self.llm_worker)
+        self.llm_worker.chunk.connect(self.on_llm_chunk)
+        self.llm_worker.progress.connect(self.on_llm_progress)
         self.llm_worker.finished.connect(self.on_llm_response)
         self.llm_worker.error.connect(self.on_llm_error)
+        self.llm_worker.cancelled.connect(self.on_llm_cancelled)
+        self.llm_worker.finished.connect(self.on_worker_done)
+        self.llm_worker.error.connect(self.on_worker_done)
+        self.llm_worker.cancelled.connect(self.on_worker_done)
         self.llm_worker.start()
     
+    def on_worker_done(self):
+        """Release a worker once its thread has exited"""
+        worker = self.sender()
+        worker.wait()
+        self.workers.discard(worker)
+        if worker is self.llm_worker:
+            self.llm_worker = None
+    
+    def stop_task(self):
+        """Abort the running task; the server stops generating when the stream closes"""
+        if self.llm_worker is not None:
+            self.llm_worker.cancel()
+        if self.executor is not None and self.executor.running:
+            self.executor.cancel()
+            self.finish_task("[Stopped]")
+        self.stop_btn.setEnabled(False)
+    
+    def on_llm_chunk(self, text: str):
+        """Queue streamed text for the next frame"""
+        if self.sender() is not self.llm_worker:
+            return
+        self.pending_chunks.append(text)
+        if not self.render_timer.isActive():
+            self.render_timer.start()
+    
+    def flush_chunks(self):
+        """Append all text received since the last frame in one edit"""
+        if not self.pending_chunks:
+            self.render_timer.stop()
+            return
+        text = "".join(self.pending_chunks)
+        self.pending_chunks.clear()
+        self.output_text.moveCursor(QtGui.QTextCursor.End)
+        self.output_text.insertPlainText(text)
+        self.output_text.ensureCursorVisible()
+    
+    def on_llm_progress(self, percent: int):
+        if self.sender() is self.llm_worker:
+            self.progress_bar.setValue(percent)
+    
+    def finish_task(self, note: str = ""):
+        """Flush remaining text, append `note` and reset the controls"""
+        self.flush_chunks()
+        self.render_timer.stop()
+        if note:
+            if self.output_text.toPlainText():
+                note = "\n\n" + note
+            self.output_text.moveCursor(QtGui.QTextCursor.End)
+            self.output_text.insertPlainText(note)
+        self.output_text.setPlaceholderText("")
+        self.progress_bar.setVisible(False)
+        self.stop_btn.setEnabled(False)
+    
     def on_llm_response(self, response: str):
         """Handle LLM response"""
-        self.output_text.setText(response)
-        self.progress_bar.setVisible(False)
+        worker = self.sender()
+        if worker is not self.llm_worker:
+            return
+        self.finish_task()
+        if worker.cache_key is not None:
+            self.store.store(worker.cache_key, worker.prompt, worker.model, response)
+        self.store.add_history(worker.prompt, response, worker.model, cached=False)
+        self.refresh_history()
+        if "response_format" in worker.params:
+            self.run_plan(response)
+    
+    def run_plan(self, response: str):
+        """Execute an action-plan response in the embedded browser"""
+        actions = parse_action_plan(response)
+        if not actions:
+            self.finish_task("[No browser actions in the response]")
+            return
+        if self.executor is None:
+            self.executor = BrowserActionExecutor(self.ensure_browser_view(), self)
+            self.executor.action_done.connect(self.on_action_done)
+            self.executor.finished.connect(self.on_plan_finished)
+        self.tabs.setCurrentWidget(self.browser_tab)
+        self.output_text.moveCursor(QtGui.QTextCursor.End)
+        self.output_text.insertPlainText(f"\n\nRunning {len(actions)} browser actions...")
+        self.stop_btn.setEnabled(True)
+        self.executor.run(actions)
+    
+    def on_action_done(self, index: int, result: dict):
+        status = "ok" if result["success"] else f"failed: {result['error']}"
+        self.output_text.moveCursor(QtGui.QTextCursor.End)
+        self.output_text.insertPlainText(f"\n[{index + 1}] {result['action']}: {status}")
+    
+    def on_plan_finished(self, results: list):
+        succeeded = sum(1 for r in results if r["success"])
+        total = len(self.executor.actions)
+        self.finish_task(f"[Browser actions: {succeeded}/{total} succeeded]")
+    
+    def refresh_history(self):
+        """Fill the history list with the tasks matching the search box"""
+        if self.store is None:
+            return
+        self.history_list.clear()
+        for row_id, prompt, response, created, cached in self.store.search_history(
+                self.history_search.text()):
+            stamp = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M")
+            label = f"{stamp}{' (cached)' if cached else ''}  {prompt.splitlines()[0][:60]}"
+            item = QtWidgets.QListWidgetItem(label)
+            item.setToolTip(prompt)
+            item.setData(QtCore.Qt.UserRole, (prompt, response))
+            self.history_list.addItem(item)
+    
+    def replay_history_item(self, item):
+        """Show a past task and its response without contacting the server"""
+        if self.llm_worker is not None:
+            self.llm_worker.cancel()
+            self.llm_worker = None
+        if self.executor is not None:
+            self.executor.cancel()
+        prompt, response = item.data(QtCore.Qt.UserRole)
+        self.prompt_input.setPlainText(prompt)
+        self.pending_chunks.clear()
+        self.output_text.setPlainText(response)
+        self.finish_task()
+        self.tabs.setCurrentWidget(self.output_text)
     
     def on_llm_error(self, error: str):
         """Handle LLM error"""
-        self.output_text.setText(error)
-        self.progress_bar.setVisible(False)
+        if self.sender() is not self.llm_worker:
+            return
+        self.finish_task(error)
+    
+    def on_llm_cancelled(self):
+        """Handle a stopped task, keeping what was generated so far"""
+        if self.sender() is not self.llm_worker:
+            return
+        self.finish_task("[Stopped]")
     
     def show_settings(self):
         """Show settings dialog"""
@@ -205,7 +1079,27 @@ class MainWindow(QtWidgets.QMainWindow):
         global LLM_SERVER_URL
         LLM_SERVER_URL = url
         os.environ["LLM_SERVER_URL"] = url
-        self.check_llm_server()
+        self.llm_client.set_base_url(url)
+        self.report_disconnect = True
+        self.health_monitor.probe_now()
+    
+    def closeEvent(self, event):
+        """Abort in-flight requests and stop background threads"""
+        # Signalled first so its last probe overlaps with the other shutdown work
+        if self.health_monitor is not None:
+            self.health_monitor.request_stop()
+        if self.executor is not None:
+            self.executor.cancel()
+        for worker in list(self.workers):
+            worker.cancel()
+            worker.wait()
+        if self.health_monitor is not None:
+            self.health_monitor.stop()
+        if self.llm_client is not None:
+            self.llm_client.close()
+        if self.store is not None:
+            self.store.close()
+        super().closeEvent(event)
     
     def show_error(self, message: str):
         """Show error dialog"""
@@ -245,10 +1139,49 @@ class MainWindow(QtWidgets.QMainWindow):
         }
         """
 
+def make_splash() -> QtWidgets.QSplashScreen:
+    pixmap = QtGui.QPixmap(420, 220)
+    pixmap.fill(QtGui.QColor("#2196F3"))
+    splash = QtWidgets.QSplashScreen(pixmap)
+    splash.showMessage(f"Hyper-Jarvis Browser v{APP_VERSION}\n\nStarting...",
+                       QtCore.Qt.AlignCenter, QtGui.QColor("white"))
+    return splash
+
 def main():
-    app = QtWidgets.QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
+    parser = argparse.ArgumentParser(description="Hyper-Jarvis desktop application")
+    parser.add_argument("--profile-startup", nargs="?", const=str(DATA_DIR / "startup_profile.txt"),
+                        metavar="PATH", help="write a startup timing report (default: %(const)s)")
+    args, qt_args = parser.parse_known_args()
+    
+    # Lets QtWebEngine be imported after the application object exists
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
+    with startup_profile.phase("qt application"):
+        app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    with startup_profile.phase("splash"):
+        splash = make_splash()
+        splash.show()
+        app.processEvents()
+    with startup_profile.phase("main window"):
+        window = MainWindow()
+    
+    def on_started():
+        window.show()
+        splash.finish(window)
+        startup_profile.mark("window shown")
+        if args.profile_startup:
+            report = startup_profile.report()
+            Path(args.profile_startup).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.profile_startup).write_text(report)
+            print(report, end="")
+    
+    def on_startup_failed(message: str):
+        splash.close()
+        QtWidgets.QMessageBox.critical(None, "Hyper-Jarvis Browser",
+                                       f"Hyper-Jarvis Browser could not start.\n\n{message}")
+        app.exit(1)
+    
+    window.started.connect(on_started)
+    window.startup_failed.connect(on_startup_failed)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
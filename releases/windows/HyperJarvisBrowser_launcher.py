@@ -4,20 +4,23 @@
 # Admins: Ujjawal Kaushik, Jiya Singh
 
 import sys
-import subprocess
-from pathlib import Path
+import importlib.util
 
 try:
     from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
-    from PyQt5.QtWebEngineWidgets import QWebEngineView
-    from PyQt5.QtCore import QUrl, QThread, pyqtSignal
+    from PyQt5.QtCore import Qt, QCoreApplication, QTimer, QUrl
+    if importlib.util.find_spec("PyQt5.QtWebEngineWidgets") is None:
+        raise ImportError("PyQtWebEngine")
 except ImportError:
     print("Please install PyQt5: pip install PyQt5 PyQtWebEngine")
     sys.exit(1)
 
+HOME_URL = "https://www.google.com"
+
 class HyperJarvisApp(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.browser = None
         self.initUI()
         
     def initUI(self):
@@ -25,17 +28,22 @@ class HyperJarvisApp(QMainWindow):
         self.setGeometry(100, 100, 1200, 800)
         
         central_widget = QWidget()
-        layout = QVBoxLayout()
-        
-        self.browser = QWebEngineView()
-        self.browser.load(QUrl("https://www.google.com"))
-        
-        layout.addWidget(self.browser)
-        central_widget.setLayout(layout)
+        self.main_layout = QVBoxLayout()
+        central_widget.setLayout(self.main_layout)
         self.setCentralWidget(central_widget)
         self.show()
+        # Start the web engine (Chromium) only after the window has painted
+        QTimer.singleShot(0, self.load_home)
+    
+    def load_home(self):
+        from PyQt5.QtWebEngineWidgets import QWebEngineView
+        self.browser = QWebEngineView()
+        self.main_layout.addWidget(self.browser)
+        self.browser.load(QUrl(HOME_URL))
 
 if __name__ == '__main__':
+    # Lets QtWebEngine be imported after the application object exists
+    QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     browser = HyperJarvisApp()
     sys.exit(app.exec_())
@@ -8,16 +8,310 @@ Usage:
 """
 
 import os
+import json
+import time
+import fnmatch
+import hashlib
 import subprocess
 import argparse
 import sys
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Model fetch settings (HF_ENDPOINT can point at a mirror or a local file server)
+HF_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co").rstrip("/")
+HF_TOKEN = os.getenv("HF_TOKEN")
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+FETCH_PART_MB = int(os.getenv("FETCH_PART_MB", "64"))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "5"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "60"))
+
+# What an inference server needs: config, tokenizer and safetensors weights
+FETCH_PATTERNS = ("*.json", "tokenizer.model", "*.safetensors")
+# mistral-inference checkpoints duplicate the Hugging Face shards
+FETCH_EXCLUDE = ("consolidated*",)
+
+@dataclass
+class RemoteFile:
+    """One file of a model repository"""
+    path: str
+    size: int
+    sha256: Optional[str] = None   # LFS files
+    git_oid: Optional[str] = None  # small files: git blob sha1
+
+class FetchProgress:
+    """Byte counter shared by download threads, printed periodically"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reporter = threading.Thread(target=self._report, daemon=True)
+
+    def add(self, count: int):
+        with self._lock:
+            self.done += count
+
+    def line(self) -> str:
+        elapsed = max(time.time() - self.started, 1e-6)
+        rate = self.done / elapsed
+        return (f"  {self.done / 1e9:6.2f} / {self.total / 1e9:.2f} GB "
+                f"({self.done / max(self.total, 1):4.0%}, {rate / 1e6:.1f} MB/s)")
+
+    def _report(self):
+        while not self._stop.wait(2.0):
+            print(self.line(), flush=True)
+
+    def __enter__(self):
+        self._reporter.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._reporter.join()
+        print(self.line(), flush=True)
+
+class ModelFetcher:
+    """
+    Downloads a model repository's files into the Hugging Face cache layout
+    (hub/models--org--name/snapshots/<commit>) without loading the model.
+    Large files are fetched as parallel byte ranges into a preallocated
+    ".incomplete" file whose per-part progress is kept in a sidecar JSON,
+    so an interrupted run resumes where it stopped. Every file is checked
+    against the repository's sha256 (LFS) or git blob id before it is moved
+    into place.
+    """
+
+    def __init__(self, repo_id: str, cache_dir: Path, revision: str = "main",
+                 endpoint: str = HF_ENDPOINT, token: Optional[str] = HF_TOKEN,
+                 workers: int = FETCH_WORKERS, part_size: int = FETCH_PART_MB * 2**20):
+        self.repo_id = repo_id
+        self.revision = revision
+        self.endpoint = endpoint
+        self.token = token
+        self.workers = workers
+        self.part_size = part_size
+        self.repo_dir = cache_dir / "hub" / ("models--" + repo_id.replace("/", "--"))
+
+    def _request(self, url: str, headers: Optional[Dict[str, str]] = None):
+        headers = dict(headers or {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers),
+                                      timeout=FETCH_TIMEOUT)
+
+    def _api(self, path: str):
+        with self._request(f"{self.endpoint}/api/models/{self.repo_id}/{path}") as response:
+            return json.load(response)
+
+    def list_files(self) -> Tuple[str, List[RemoteFile]]:
+        """Commit sha of the revision and the files it contains"""
+        commit = self._api(f"revision/{self.revision}")["sha"]
+        files = []
+        for entry in self._api(f"tree/{commit}?recursive=1"):
+            if entry.get("type") != "file":
+                continue
+            lfs = entry.get("lfs") or {}
+            files.append(RemoteFile(entry["path"], lfs.get("size", entry.get("size", 0)),
+                                    sha256=lfs.get("oid"),
+                                    git_oid=None if lfs else entry.get("oid")))
+        return commit, files
+
+    @staticmethod
+    def select(files: List[RemoteFile]) -> List[RemoteFile]:
+        def wanted(path: str) -> bool:
+            name = Path(path).name
+            return (any(fnmatch.fnmatch(name, p) for p in FETCH_PATTERNS)
+                    and not any(fnmatch.fnmatch(name, p) for p in FETCH_EXCLUDE))
+        return [f for f in files if wanted(f.path)]
+
+    def _url(self, commit: str, path: str) -> str:
+        return f"{self.endpoint}/{self.repo_id}/resolve/{commit}/{path}"
+
+    def supports_ranges(self, commit: str, remote: RemoteFile) -> bool:
+        try:
+            with self._request(self._url(commit, remote.path), {"Range": "bytes=0-0"}) as response:
+                return response.status == 206
+        except urllib.error.URLError:
+            return False
+
+    @staticmethod
+    def verify(path: Path, remote: RemoteFile) -> bool:
+        if path.stat().st_size != remote.size:
+            return False
+        if remote.sha256:
+            digest = hashlib.sha256()
+        elif remote.git_oid:
+            digest = hashlib.sha1(f"blob {remote.size}\0".encode())
+        else:
+            return True
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(8 * 2**20), b""):
+                digest.update(block)
+        return digest.hexdigest() == (remote.sha256 or remote.git_oid)
+
+    def _fetch_part(self, url: str, tmp: Path, start: int, end: int, done: List[int],
+                    index: int, state: "FileState", progress: FetchProgress):
+        """Download bytes [start + done[index], end) of one part, retrying with backoff"""
+        for attempt in range(FETCH_RETRIES + 1):
+            offset = start + done[index]
+            if offset >= end:
+                return
+            try:
+                headers = {"Range": f"bytes={offset}-{end - 1}"} if state.ranged else {}
+                with self._request(url, headers) as response, open(tmp, "r+b") as f:
+                    if state.ranged and response.status != 206:
+                        raise IOError(f"server ignored the byte range (HTTP {response.status})")
+                    f.seek(offset)
+                    try:
+                        for block in iter(lambda: response.read(2**20), b""):
+                            block = block[:end - offset]
+                            f.write(block)
+                            offset += len(block)
+                            done[index] += len(block)
+                            progress.add(len(block))
+                            state.checkpoint(index, f)
+                        if offset < end:
+                            raise IOError(f"connection closed at byte {offset} of {end}")
+                    finally:
+                        # Record whatever reached the file, so the next attempt or run resumes after it
+                        state.checkpoint(index, f, force=True)
+                return
+            except (urllib.error.URLError, IOError, OSError) as e:
+                if not state.ranged:
+                    # Without ranges the part can only restart from zero
+                    progress.add(-done[index])
+                    done[index] = 0
+                if attempt == FETCH_RETRIES:
+                    raise
+                delay = min(2 ** attempt, 30)
+                print(f"  ! {Path(tmp).name} part {index}: {e}; retrying in {delay}s", flush=True)
+                time.sleep(delay)
+
+    def fetch(self, files: Optional[List[RemoteFile]] = None) -> Path:
+        """Download (or resume) the selected files; returns the snapshot directory"""
+        commit, remote_files = self.list_files()
+        files = files if files is not None else self.select(remote_files)
+        snapshot = self.repo_dir / "snapshots" / commit
+        # Only the shards listed in the safetensors index are needed
+        index = next((f for f in files if f.path.endswith("model.safetensors.index.json")), None)
+        if index is not None:
+            self._fetch_files(commit, snapshot, [index])
+            weight_map = json.loads((snapshot / index.path).read_text())["weight_map"]
+            folder = str(Path(index.path).parent)
+            shards = {name if folder == "." else f"{folder}/{name}" for name in weight_map.values()}
+            files = [f for f in files if not f.path.endswith(".safetensors") or f.path in shards]
+        self._fetch_files(commit, snapshot, files)
+        (self.repo_dir / "refs").mkdir(parents=True, exist_ok=True)
+        (self.repo_dir / "refs" / self.revision).write_text(commit)
+        return snapshot
+
+    def _fetch_files(self, commit: str, snapshot: Path, files: List[RemoteFile]):
+        pending = []
+        for remote in files:
+            target = snapshot / remote.path
+            if target.exists() and self.verify(target, remote):
+                continue
+            pending.append(remote)
+        if not pending:
+            return
+        ranged = self.supports_ranges(commit, max(pending, key=lambda f: f.size))
+        states = [FileState(snapshot / f.path, f, self.part_size if ranged else None)
+                  for f in pending]
+        total = sum(f.size for f in pending)
+        with FetchProgress(total) as progress, ThreadPoolExecutor(self.workers) as pool:
+            progress.add(sum(sum(s.done) for s in states))
+            futures = {pool.submit(self._fetch_part, self._url(commit, s.remote.path), s.tmp,
+                                   start, end, s.done, i, s, progress): s
+                       for s in states for i, (start, end) in enumerate(s.parts)}
+            for future in as_completed(futures):
+                future.result()
+        for state in states:
+            state.save(force=True)
+            if not self.verify(state.tmp, state.remote):
+                state.discard()
+                raise IOError(f"Checksum mismatch for {state.remote.path}; "
+                              f"partial download removed, run again to retry")
+            state.tmp.replace(state.target)
+            state.sidecar.unlink(missing_ok=True)
+            print(f"  ✓ {state.remote.path} ({state.remote.size / 1e6:.1f} MB)")
+
+class FileState:
+    """
+    Preallocated partial file plus the per-part byte counts needed to resume
+    it. The sidecar only records bytes a part has flushed and fsynced, so
+    after a crash it never claims data that did not reach the disk.
+    """
+
+    def __init__(self, target: Path, remote: RemoteFile, part_size: Optional[int]):
+        self.target = target
+        self.remote = remote
+        self.ranged = part_size is not None
+        self.tmp = target.with_name(target.name + ".incomplete")
+        self.sidecar = target.with_name(target.name + ".incomplete.json")
+        size = max(remote.size, 1)
+        step = part_size or size
+        self.parts = [[start, min(start + step, remote.size)] for start in range(0, size, step)]
+        self.done = [0] * len(self.parts)
+        self._lock = threading.Lock()
+        self._saved = 0.0
+        self._synced = [0.0] * len(self.parts)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if self.ranged and self.tmp.exists() and self.sidecar.exists():
+            try:
+                saved = json.loads(self.sidecar.read_text())
+            except ValueError:
+                saved = {}
+            if saved.get("size") == remote.size and saved.get("parts") == self.parts:
+                self.done = saved["done"]
+        self.durable = list(self.done)
+        with open(self.tmp, "ab") as f:
+            f.truncate(remote.size)
+
+    def checkpoint(self, index: int, f, force: bool = False):
+        """Make part `index`'s writes durable through its handle `f`, then save (once a second)"""
+        if not self.ranged:
+            return
+        now = time.time()
+        if not force and now - self._synced[index] < 1.0:
+            return
+        self._synced[index] = now
+        f.flush()
+        os.fsync(f.fileno())
+        self.durable[index] = self.done[index]
+        self.save(force)
+
+    def save(self, force: bool = False):
+        """Persist durable progress at most once a second (always when forced)"""
+        if not self.ranged:
+            return
+        now = time.time()
+        with self._lock:
+            if not force and now - self._saved < 1.0:
+                return
+            self._saved = now
+            # Written aside and renamed: a crash mid-write leaves the previous sidecar intact
+            staging = self.sidecar.with_name(self.sidecar.name + ".tmp")
+            staging.write_text(json.dumps({"size": self.remote.size, "parts": self.parts,
+                                           "done": self.durable}))
+            os.replace(staging, self.sidecar)
+
+    def discard(self):
+        self.tmp.unlink(missing_ok=True)
+        self.sidecar.unlink(missing_ok=True)
 
 class MistralLLMSetup:
     def __init__(self):
         self.model_name = "mistralai/Mistral-7B-Instruct-v0.2"
         self.cache_dir = Path(os.getenv("HF_HOME", "~/.cache/huggingface")).expanduser()
-        self.models_dir = self.cache_dir / "hub" / self.model_name.replace("/", "--")
+        self.models_dir = self.cache_dir / "hub" / ("models--" + self.model_name.replace("/", "--"))
         
     def install_dependencies(self):
         """Install required Python packages"""
@@ -46,27 +340,10 @@ class MistralLLMSetup:
         
         os.environ["HF_HOME"] = str(self.cache_dir)
         
-        # Create a simple Python script to download the model
-        download_script = '''
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
-
-model_name = "mistralai/Mistral-7B-Instruct-v0.2"
-print(f"Downloading {model_name}...")
-
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype=torch.float16,
-    device_map="auto"
-)
-
-print(f"✓ {model_name} downloaded successfully!")
-print(f"Model loaded on GPU: {next(model.parameters()).device}")
-'''
-        
-        # Execute download
-        subprocess.run([sys.executable, "-c", download_script], check=True)
+        # Fetch only the files serving needs, straight to the cache (no GPU, no model load)
+        fetcher = ModelFetcher(self.model_name, self.cache_dir)
+        snapshot = fetcher.fetch()
+        print(f"✓ {self.model_name} downloaded to {snapshot}")
         
     def create_vllm_server(self):
         """Create vLLM inference server script"""
@@ -76,16 +353,50 @@ print(f"Model loaded on GPU: {next(model.parameters()).device}")
 """
 vLLM Inference Server for Mistral 7B
 Provides REST API for LLM reasoning in Hyper-Jarvis
+
+Built on AsyncLLMEngine: requests are submitted to the engine's background
+loop and awaited, so concurrent /infer and /reason calls are continuously
+batched together and /health stays responsive during generation. The
+engine is created in the app's lifespan, so importing this module (tests,
+tooling, worker imports) does not load the model.
 """
 
+import os
+import json
+import uuid
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
-from vllm import LLM, SamplingParams
+from vllm import SamplingParams
+from vllm.engine.arg_utils import AsyncEngineArgs
+from vllm.engine.async_llm_engine import AsyncLLMEngine
 import torch
-import json
 
-app = FastAPI(title="Hyper-Jarvis Mistral LLM Server")
+MAX_NUM_SEQS = int(os.environ.get("MAX_NUM_SEQS", "64"))
+
+engine = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the model when the server starts and stop the engine loop on exit"""
+    global engine
+    print("Initializing Mistral 7B with vLLM...")
+    engine = AsyncLLMEngine.from_engine_args(AsyncEngineArgs(
+        model="mistralai/Mistral-7B-Instruct-v0.2",
+        tensor_parallel_size=torch.cuda.device_count(),
+        dtype="float16",
+        gpu_memory_utilization=0.90,
+        max_model_len=4096,
+        max_num_seqs=MAX_NUM_SEQS,
+    ))
+    print("✓ vLLM server ready!")
+    yield
+    if hasattr(engine, "shutdown_background_loop"):
+        engine.shutdown_background_loop()
+    engine = None
+
+app = FastAPI(title="Hyper-Jarvis Mistral LLM Server", lifespan=lifespan)
 
 class InferenceRequest(BaseModel):
     prompt: str
@@ -97,58 +408,58 @@ class InferenceResponse(BaseModel):
     text: str
     stop_reason: str
 
-# Initialize vLLM
-print("Initializing Mistral 7B with vLLM...")
-llm = LLM(
-    model="mistralai/Mistral-7B-Instruct-v0.2",
-    tensor_parallel_size=torch.cuda.device_count(),
-    dtype="float16",
-    gpu_memory_utilization=0.90,
-    max_model_len=4096,
-)
-print("✓ vLLM server ready!")
+async def generate(prompt: str, request: InferenceRequest, raw_request: Request):
+    """Run one prompt through the shared engine; aborts if the client goes away"""
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Model is not loaded")
+    sampling_params = SamplingParams(
+        temperature=request.temperature,
+        top_p=request.top_p,
+        max_tokens=request.max_tokens,
+    )
+    request_id = uuid.uuid4().hex
+    final = None
+    try:
+        async for output in engine.generate(prompt, sampling_params, request_id):
+            if await raw_request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client disconnected")
+            final = output
+    except BaseException:
+        if final is None or not final.finished:
+            await engine.abort(request_id)
+        raise
+    return final.outputs[0]
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "model": "Mistral-7B", "gpu_count": torch.cuda.device_count()}
 
 @app.post("/infer", response_model=InferenceResponse)
-async def infer(request: InferenceRequest):
+async def infer(request: InferenceRequest, raw_request: Request):
     try:
-        sampling_params = SamplingParams(
-            temperature=request.temperature,
-            top_p=request.top_p,
-            max_tokens=request.max_tokens,
-        )
-        
-        outputs = llm.generate([request.prompt], sampling_params)
-        text = outputs[0].outputs[0].text
+        output = await generate(request.prompt, request, raw_request)
         
         return InferenceResponse(
-            text=text,
-            stop_reason=outputs[0].outputs[0].finish_reason
+            text=output.text,
+            stop_reason=output.finish_reason
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/reason")
-async def browser_reasoning(request: InferenceRequest):
+async def browser_reasoning(request: InferenceRequest, raw_request: Request):
     """LLM reasoning for browser automation"""
     try:
         # Add system prompt for browser automation
         system = """You are an AI browser automation agent. Given a user command and current page state,
 generateJSONplan with browser actions. Return only valid JSON."""
         
-        full_prompt = f"{system}\n\n{request.prompt}"
+        full_prompt = f"{system}\\n\\n{request.prompt}"
         
-        sampling_params = SamplingParams(
-            temperature=request.temperature,
-            top_p=request.top_p,
-            max_tokens=request.max_tokens,
-        )
-        
-        outputs = llm.generate([full_prompt], sampling_params)
-        response_text = outputs[0].outputs[0].text
+        output = await generate(full_prompt, request, raw_request)
+        response_text = output.text
         
         # Try to extract JSON
         try:
@@ -156,16 +467,18 @@ generateJSONplan with browser actions. Return only valid JSON."""
             return {"plan": json_data, "raw": response_text}
         except:
             return {"plan": None, "raw": response_text}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
-    print("\n" + "="*50)
+    print("\\n" + "="*50)
     print("Mistral 7B vLLM Server Starting...")
     print("="*50)
     print("Health: http://localhost:8000/health")
     print("Docs: http://localhost:8000/docs")
-    print("="*50 + "\n")
+    print("="*50 + "\\n")
     
     uvicorn.run(app, host="0.0.0.0", port=8000)
 '''
@@ -205,7 +518,7 @@ def main():
     
     try:
         if args.download_only:
-            setup.install_dependencies()
+            # The fetch is stdlib-only: no need to install the serving stack first
             setup.download_model()
         elif args.start_server:
             setup.start_server()
@@ -1,12 +1,39 @@
 # Advanced AI Optimization Engine - Generated by Camber Agent
-import logging
+import os
+import re
+import json
+import math
 import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
 from enum import Enum
-from dataclasses import dataclass
-from typing import List
+from collections import OrderedDict, deque
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Dict, Any, Callable, Awaitable, Deque, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Cache configuration
+AI_CACHE_MAX_BYTES = int(os.environ.get("AI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+AI_CACHE_TTL_SECONDS = float(os.environ.get("AI_CACHE_TTL_SECONDS", "3600"))
+AI_CACHE_DB_PATH = os.environ.get("AI_CACHE_DB_PATH")  # unset = memory only
+AI_CACHE_DISK_MAX_BYTES = int(os.environ.get("AI_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+AI_CACHE_TOUCH_INTERVAL = float(os.environ.get("AI_CACHE_TOUCH_INTERVAL", "1"))  # seconds between disk write batches
+
+# Reasoning-mode policy configuration
+REASONING_BUDGET_FAST = int(os.environ.get("REASONING_BUDGET_FAST", "256"))
+REASONING_BUDGET_DEEP = int(os.environ.get("REASONING_BUDGET_DEEP", "2048"))
+REASONING_BUDGET_CREATIVE = int(os.environ.get("REASONING_BUDGET_CREATIVE", "1024"))
+AI_FAST_MODEL = os.environ.get("AI_FAST_MODEL")  # unset = the requested/default model
+AI_DEEP_MODEL = os.environ.get("AI_DEEP_MODEL")
+AI_CREATIVE_MODEL = os.environ.get("AI_CREATIVE_MODEL")
+AI_DOWNGRADE_QUEUE_DEPTH = int(os.environ.get("AI_DOWNGRADE_QUEUE_DEPTH", "32"))
+AI_DOWNGRADE_P95_SECONDS = float(os.environ.get("AI_DOWNGRADE_P95_SECONDS", "30"))
+AI_LATENCY_WINDOW = int(os.environ.get("AI_LATENCY_WINDOW", "200"))
+
 class ReasoningMode(Enum):
     FAST = "fast"
     DEEP = "deep"
@@ -20,13 +47,425 @@ class AIResponse:
     latency: float
     mode: str
 
+@dataclass
+class ModePolicy:
+    """Concrete generation settings behind a ReasoningMode"""
+    mode: ReasoningMode
+    temperature: float
+    top_p: float
+    max_tokens: int
+    reasoning_budget: int
+    model: Optional[str] = None
+    cacheable: bool = True
+
+DEFAULT_MODE_POLICIES = {
+    # Greedy and short: replayable, cheap browser actions
+    ReasoningMode.FAST: ModePolicy(ReasoningMode.FAST, temperature=0.0, top_p=1.0, max_tokens=512,
+                                   reasoning_budget=REASONING_BUDGET_FAST, model=AI_FAST_MODEL),
+    # DeepSeek-R1's recommended sampling with room to think
+    ReasoningMode.DEEP: ModePolicy(ReasoningMode.DEEP, temperature=0.6, top_p=0.95, max_tokens=1024,
+                                   reasoning_budget=REASONING_BUDGET_DEEP, model=AI_DEEP_MODEL),
+    # Diverse output is the point, so never replay it
+    ReasoningMode.CREATIVE: ModePolicy(ReasoningMode.CREATIVE, temperature=1.0, top_p=0.95,
+                                       max_tokens=1024, reasoning_budget=REASONING_BUDGET_CREATIVE,
+                                       model=AI_CREATIVE_MODEL, cacheable=False),
+}
+
+class LatencyWindow:
+    """Sliding window of recent latencies"""
+
+    def __init__(self, size: int = AI_LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1)]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+def reasoning_steps(reasoning: str) -> List[str]:
+    """Split a reasoning trace into steps: paragraphs, or lines for a single paragraph"""
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", reasoning) if p.strip()]
+    if len(paragraphs) > 1:
+        return paragraphs
+    return [line.strip() for line in reasoning.splitlines() if line.strip()]
+
+def sequence_confidence(cumulative_logprob: Optional[float], num_tokens: int) -> float:
+    """Geometric-mean token probability of a generation (0.0 when unknown)"""
+    if cumulative_logprob is None or num_tokens <= 0:
+        return 0.0
+    return math.exp(cumulative_logprob / num_tokens)
+
+class ReasoningPolicy:
+    """
+    Maps ReasoningMode to concrete settings and adapts to load: DEEP is
+    served as FAST while the admission queue is deeper than
+    downgrade_queue_depth or DEEP's recent p95 latency exceeds
+    downgrade_p95 seconds.
+    """
+
+    def __init__(self, policies: Optional[Dict[ReasoningMode, ModePolicy]] = None,
+                 downgrade_queue_depth: int = AI_DOWNGRADE_QUEUE_DEPTH,
+                 downgrade_p95: float = AI_DOWNGRADE_P95_SECONDS,
+                 window: int = AI_LATENCY_WINDOW):
+        self.policies = dict(policies or DEFAULT_MODE_POLICIES)
+        self.downgrade_queue_depth = downgrade_queue_depth
+        self.downgrade_p95 = downgrade_p95
+        self._latency = {mode: LatencyWindow(window) for mode in ReasoningMode}
+        self.selected = {mode.value: 0 for mode in ReasoningMode}
+        self.downgrades = 0
+
+    def p95(self, mode: ReasoningMode) -> Optional[float]:
+        return self._latency[mode].percentile(95)
+
+    def overloaded(self, queue_depth: int) -> bool:
+        if self.downgrade_queue_depth and queue_depth >= self.downgrade_queue_depth:
+            return True
+        p95 = self.p95(ReasoningMode.DEEP)
+        return bool(self.downgrade_p95) and p95 is not None and p95 >= self.downgrade_p95
+
+    def select(self, mode: ReasoningMode,
+               queue_depth: int = 0) -> Tuple[ModePolicy, Optional[ReasoningMode]]:
+        """Return (policy to apply, mode it was downgraded from or None)"""
+        downgraded_from = None
+        if mode == ReasoningMode.DEEP and self.overloaded(queue_depth):
+            downgraded_from, mode = mode, ReasoningMode.FAST
+            self.downgrades += 1
+        self.selected[mode.value] += 1
+        return self.policies[mode], downgraded_from
+
+    def observe(self, mode: ReasoningMode, latency: float):
+        """Record how long a generation in `mode` took end to end"""
+        self._latency[mode].add(latency)
+
+    def make_response(self, text: str, reasoning: str, mode: ReasoningMode, latency: float,
+                      cumulative_logprob: Optional[float] = None,
+                      num_tokens: int = 0) -> AIResponse:
+        """AIResponse filled from a measured generation"""
+        return AIResponse(
+            text=text,
+            reasoning_steps=reasoning_steps(reasoning),
+            confidence=sequence_confidence(cumulative_logprob, num_tokens),
+            latency=latency,
+            mode=mode.value,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "selected": dict(self.selected),
+            "downgrades": self.downgrades,
+            "p95_seconds": {mode.value: self.p95(mode) for mode in ReasoningMode},
+            "samples": {mode.value: len(self._latency[mode]) for mode in ReasoningMode},
+        }
+
+def make_cache_key(model: str, prompt: str, sampling_params: Optional[Dict[str, Any]] = None,
+                   mode: ReasoningMode = ReasoningMode.FAST) -> str:
+    """
+    Stable content hash, identical across processes and restarts. The
+    prompt is hashed exactly as rendered: whitespace changes tokenization,
+    so prompts differing only in whitespace can generate different text.
+    """
+    material = json.dumps({
+        "model": model,
+        "prompt": prompt,
+        "params": sampling_params or {},
+        "mode": mode.value,
+    }, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class SQLiteCacheTier:
+    """
+    On-disk cache tier shared by every process pointing at the same file.
+    WAL mode lets uvicorn workers read concurrently while one writes.
+
+    Only reads run on the caller's thread. Writes, deletes and last_access
+    updates are queued and applied by a writer thread in one transaction
+    per batch; hits refresh last_access at most every
+    AI_CACHE_TOUCH_INTERVAL seconds. The byte total is kept as a running
+    count and only recomputed exactly when it crosses the budget.
+    """
+    def __init__(self, path: str, max_bytes: int = AI_CACHE_DISK_MAX_BYTES,
+                 touch_interval: float = AI_CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()          # guards the connection
+        self._pending_lock = threading.Lock()  # guards the write queues
+        self._pending: Dict[str, Optional[tuple]] = {}  # key -> (value, expires_at), None = delete
+        self._touched: Dict[str, float] = {}
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS response_cache_last_access ON response_cache(last_access)"
+        )
+        self._conn.commit()
+        self._bytes = self._total_locked()
+        self._writer = threading.Thread(target=self._write_loop, name="cache-writer", daemon=True)
+        self._writer.start()
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Return (value, expires_at) or None"""
+        now = time.time()
+        with self._pending_lock:
+            if key in self._pending:
+                entry = self._pending[key]
+                return entry if entry is not None and entry[1] > now else None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        with self._pending_lock:
+            if row[1] <= now:
+                self._pending.setdefault(key, None)
+                self._wakeup.set()
+                return None
+            self._touched[key] = now
+        return bytes(row[0]), row[1]
+
+    def put(self, key: str, value: bytes, expires_at: float):
+        """Queue a write; returns without touching the database"""
+        with self._pending_lock:
+            self._pending[key] = (value, expires_at)
+            self._touched.pop(key, None)
+        self._wakeup.set()
+
+    def flush(self):
+        """Apply queued writes and last_access updates in one transaction"""
+        # Swap under the connection lock so readers never see a batch that is neither queued nor applied
+        with self._lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+                touched, self._touched = self._touched, {}
+            if not pending and not touched:
+                return
+            try:
+                self._apply_locked(pending, touched)
+                self._conn.commit()
+            except sqlite3.Error:
+                self._conn.rollback()
+                self._bytes = self._total_locked()
+                raise
+
+    def _apply_locked(self, pending: Dict[str, Optional[tuple]], touched: Dict[str, float]):
+        now = time.time()
+        for key, entry in pending.items():
+            row = self._conn.execute("SELECT size FROM response_cache WHERE key = ?", (key,)).fetchone()
+            self._bytes -= row[0] if row else 0
+            if entry is None:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                continue
+            value, expires_at = entry
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, now),
+            )
+            self._bytes += len(value)
+        if touched:
+            self._conn.executemany(
+                "UPDATE response_cache SET last_access = ? WHERE key = ?",
+                [(at, key) for key, at in touched.items()],
+            )
+        if self._bytes > self.max_bytes:
+            self._evict_locked()
+
+    def _write_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.touch_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache write failed: {e}")
+
+    def _total_locked(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+
+    def _evict_locked(self):
+        # Other processes share the file: re-sync the running total before deleting anything
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        self._bytes = self._total_locked()
+        if self._bytes <= self.max_bytes:
+            return
+        # Drop least recently used rows until we are back under budget
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM response_cache ORDER BY last_access ASC"
+        ).fetchall():
+            if self._bytes <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            self._bytes -= size
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+class ResponseCache:
+    """
+    Byte-bounded LRU with per-entry TTL, backed by an optional disk tier.
+    Values must be JSON serialisable; they are stored encoded so the byte
+    budget is exact and callers always get an independent copy back.
+    """
+    def __init__(self, max_bytes: int = AI_CACHE_MAX_BYTES, ttl: float = AI_CACHE_TTL_SECONDS,
+                 disk: Optional[SQLiteCacheTier] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk = disk
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Blocking lookup through both tiers; async code should use aget()"""
+        found, value = self._get_memory(key)
+        if found:
+            return value
+        return self._get_disk(key, self.disk.get(key) if self.disk is not None else None)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Like get(), but the disk tier is read on a worker thread"""
+        found, value = self._get_memory(key)
+        if found:
+            return value
+        row = await asyncio.to_thread(self.disk.get, key) if self.disk is not None else None
+        return self._get_disk(key, row)
+
+    def _get_memory(self, key: str) -> Tuple[bool, Optional[Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, json.loads(value)
+                self._remove_locked(key)
+                self.expirations += 1
+        return False, None
+
+    def _get_disk(self, key: str, row: Optional[tuple]) -> Optional[Any]:
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            self._insert_locked(key, value, expires_at)
+            self.hits += 1
+            self.disk_hits += 1
+        return json.loads(value)
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None):
+        encoded = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._insert_locked(key, encoded, expires_at)
+        if self.disk is not None:
+            self.disk.put(key, encoded, expires_at)
+
+    def _insert_locked(self, key: str, encoded: bytes, expires_at: float):
+        if key in self._entries:
+            self._remove_locked(key)
+        if len(encoded) > self.max_bytes:
+            return
+        self._entries[key] = (encoded, expires_at)
+        self._bytes += len(encoded)
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove_locked(oldest)
+            self.evictions += 1
+
+    def _remove_locked(self, key: str):
+        encoded, _ = self._entries.pop(key)
+        self._bytes -= len(encoded)
+
+    def flush(self):
+        """Apply writes still queued for the disk tier"""
+        if self.disk is not None:
+            self.disk.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
 class AdvancedAIOptimizer:
-    def __init__(self):
-        self.cache = {}
-        
-    async def process_with_cache(self, prompt: str, mode: ReasoningMode = ReasoningMode.FAST) -> AIResponse:
-        cache_key = hash(prompt + mode.value)
-        if cache_key in self.cache:
+    def __init__(self, model: str = "default", max_bytes: int = AI_CACHE_MAX_BYTES,
+                 ttl: float = AI_CACHE_TTL_SECONDS, disk_path: Optional[str] = AI_CACHE_DB_PATH):
+        self.model = model
+        disk = SQLiteCacheTier(disk_path) if disk_path else None
+        self.cache = ResponseCache(max_bytes=max_bytes, ttl=ttl, disk=disk)
+        self.policy = ReasoningPolicy()
+
+    def cache_key(self, prompt: str, mode: ReasoningMode = ReasoningMode.FAST,
+                  sampling_params: Optional[Dict[str, Any]] = None,
+                  model: Optional[str] = None) -> str:
+        return make_cache_key(model or self.model, prompt, sampling_params, mode)
+
+    def store(self, prompt: str, response: AIResponse, mode: ReasoningMode = ReasoningMode.FAST,
+              sampling_params: Optional[Dict[str, Any]] = None, model: Optional[str] = None):
+        self.cache.put(self.cache_key(prompt, mode, sampling_params, model), asdict(response))
+
+    async def process_with_cache(self, prompt: str, mode: ReasoningMode = ReasoningMode.FAST,
+                                 generate: Optional[Callable[[str, ReasoningMode], Awaitable[AIResponse]]] = None,
+                                 sampling_params: Optional[Dict[str, Any]] = None,
+                                 model: Optional[str] = None) -> Optional[AIResponse]:
+        """Return a cached response, or call `generate` on a miss and cache its result"""
+        cacheable = self.policy.policies[mode].cacheable
+        cache_key = self.cache_key(prompt, mode, sampling_params, model)
+        cached = await self.cache.aget(cache_key) if cacheable else None
+        if cached is not None:
             logger.info(f"Cache hit for prompt")
-            return self.cache[cache_key]
-        return None
+            return AIResponse(**cached)
+        if generate is None:
+            return None
+        started = time.perf_counter()
+        response = await generate(prompt, mode)
+        latency = time.perf_counter() - started
+        self.policy.observe(mode, latency)
+        if response is not None:
+            if not response.latency:
+                response.latency = latency
+            if cacheable:
+                self.cache.put(cache_key, asdict(response))
+        return response
+
+    def flush(self):
+        self.cache.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "policy": self.policy.stats()}
@@ -0,0 +1,55 @@
+"""
+Shared pytest setup: the server modules import each other flat from
+vllm_server/ (and the response cache from src/, the desktop app from
+desktop_apps/), and every test runs against the deterministic CPU fake
+backend instead of vLLM.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+os.environ.setdefault("INFERENCE_BACKEND", "fake")
+os.environ.setdefault("FAKE_TOKENS_PER_SECOND", "0")
+os.environ.setdefault("FAKE_TTFT_MS", "0")
+os.environ.setdefault("STARTUP_CACHE_ENABLED", "0")
+sys.path[:0] = [str(ROOT / "vllm_server"), str(ROOT / "src"), str(ROOT / "desktop_apps"), str(ROOT)]
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def server():
+    """The inference server module"""
+    import deepseek_vllm_server
+    return deepseek_vllm_server
+
+@pytest.fixture
+async def server_client(request, server, monkeypatch):
+    """
+    httpx client talking to the server with its lifespan running. Parametrize
+    indirectly with {name: value} to override module settings or singletons
+    first, e.g. {"MAX_CHOICES": 2} or {"admission": AdmissionController(...)};
+    upper-case (env-derived) names are mirrored into the environment too.
+    """
+    for name, value in getattr(request, "param", {}).items():
+        if name.isupper():
+            monkeypatch.setenv(name, str(value))
+        monkeypatch.setattr(server, name, value)
+    async with server.lifespan(server.app):
+        await server.engine_task
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://server") as client:
+            yield client
+
+@pytest.fixture(scope="session")
+def qapp():
+    """A QCoreApplication for desktop-app tests that use timers or threads (no display needed)"""
+    QtCore = pytest.importorskip("PyQt5.QtCore")
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
@@ -0,0 +1,112 @@
+"""
+Action plans in the desktop app: parse_action_plan accepts only a JSON
+object holding a list of actions, and BrowserActionExecutor maps each
+action type to its handler, stops at the first failure and probes
+consecutive waits together.
+"""
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from windows_desktop_app import EVALUATE_JS, BrowserActionExecutor, parse_action_plan
+
+def test_parse_action_plan_extracts_the_actions():
+    text = 'Plan:\n{"actions": [{"type": "navigate", "parameters": {"url": "https://a.example"}}]}\nDone.'
+    assert parse_action_plan(text) == [{"type": "navigate", "parameters": {"url": "https://a.example"}}]
+
+@pytest.mark.parametrize("text", [
+    "just an answer",
+    '{"actions": "click"}',
+    '{"actions": [{"type": "click"}, "scroll"]}',
+    '{"steps": []}',
+    '{"actions": [',
+    '{"actions": [{"type": "click"}',
+])
+def test_parse_action_plan_rejects_other_text(text):
+    assert parse_action_plan(text) is None
+
+class FakePage:
+    """runJavaScript answers synchronously with the next scripted value, or
+    leaves the callback pending (like a busy page) once they run out"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.scripts = []
+        self.pending = []
+
+    def runJavaScript(self, script, callback):
+        self.scripts.append(script)
+        if self.answers:
+            callback(self.answers.pop(0))
+        else:
+            self.pending.append(callback)
+
+class FakeView:
+    def __init__(self, answers=()):
+        self._page = FakePage(answers)
+
+    def page(self):
+        return self._page
+
+def run_executor(actions, answers=()):
+    view = FakeView(answers)
+    executor = BrowserActionExecutor(view)
+    finished = []
+    executor.finished.connect(finished.append)
+    executor.run(actions)
+    return executor, view.page(), finished
+
+def run(actions, answers=()):
+    _, page, finished = run_executor(actions, answers)
+    return finished, page.scripts
+
+def test_actions_map_to_their_handlers(qapp):
+    finished, scripts = run([
+        {"type": "Evaluate", "parameters": {"script": "1 + 1"}},
+        {"type": "click", "parameters": {"selector": "#go"}},
+        {"type": "type", "parameters": {"selector": "#q", "text": "invoices"}},
+    ], answers=[{"value": 2}, [True], [True]])
+    assert scripts[0] == EVALUATE_JS % '"1 + 1"'
+    assert '["#go", "click", ""]' in scripts[1] and '["#q", "type", "invoices"]' in scripts[2]
+    assert finished == [[
+        {"success": True, "action": "evaluate", "result": {"success": True, "result": 2}},
+        {"success": True, "action": "click", "result": {"success": True, "selector": "#go"}},
+        {"success": True, "action": "type",
+         "result": {"success": True, "selector": "#q", "text": "invoices"}},
+    ]]
+
+@pytest.mark.parametrize("action, error", [
+    ({"type": "fly"}, "Unknown action type: fly"),
+    ({"parameters": {}}, "Action type is required"),
+    ({"type": "click", "parameters": {}}, "Selector is required for click action"),
+    ({"type": "wait"}, "Either selector or timeout is required for wait action"),
+])
+def test_invalid_action_stops_the_plan(qapp, action, error):
+    finished, scripts = run([action, {"type": "evaluate", "parameters": {"script": "1"}}])
+    assert finished == [[{"success": False, "action": action.get("type"), "error": error}]]
+    assert scripts == []
+
+def test_script_errors_fail_the_action(qapp):
+    finished, _ = run([{"type": "evaluate", "parameters": {"script": "boom()"}}],
+                      answers=[{"error": "ReferenceError: boom is not defined"}])
+    assert finished[0][0]["error"] == "ReferenceError: boom is not defined"
+
+def test_consecutive_waits_are_probed_in_one_call(qapp):
+    executor, page, finished = run_executor([
+        {"type": "wait", "parameters": {"selector": "#a"}},
+        {"type": "wait", "parameters": {"selector": "#b", "state": "attached"}},
+        {"type": "click", "parameters": {"selector": "#a"}},
+    ])
+    # #b joined while the first probe was in flight; the next tick polls both together
+    assert len(page.scripts) == 1
+    page.pending.pop(0)([False])
+    executor._poll()
+    assert len(page.scripts) == 2
+    assert '["#a", "visible", ""]' in page.scripts[1] and '["#b", "attached", ""]' in page.scripts[1]
+    page.pending.pop(0)([True, True])
+    assert '["#a", "click", ""]' in page.scripts[2]
+    page.pending.pop(0)([True])
+    assert [result["action"] for result in finished[0]] == ["wait", "wait", "click"]
+    assert all(result["success"] for result in finished[0])
+    executor.cancel()
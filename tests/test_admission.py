@@ -0,0 +1,64 @@
+"""
+Admission control: requests beyond capacity queue briefly, and a full
+queue or an expired wait is shed with a 429 carrying Retry-After.
+"""
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+@pytest.mark.anyio
+async def test_queued_request_is_admitted_when_capacity_frees():
+    admission = AdmissionController(max_concurrency=1, max_queue=1)
+    first = await admission.acquire("default", 10)
+    waiting = asyncio.create_task(admission.acquire("default", 10))
+    await asyncio.sleep(0)
+    assert admission.stats()["queued"] == 1
+    first.release()
+    second = await waiting
+    assert admission.stats()["running"] == 1
+    second.release()
+    assert admission.stats()["running"] == 0
+
+@pytest.mark.anyio
+async def test_full_queue_and_expired_wait_are_rejected():
+    admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+    ticket = await admission.acquire("default", 10)
+    waiting = asyncio.create_task(admission.acquire("default", 10))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as full:
+        await admission.acquire("default", 10)
+    assert full.value.reason == "queue_full" and full.value.retry_after >= 1
+    with pytest.raises(AdmissionRejected) as expired:
+        await waiting
+    assert expired.value.reason == "queue_timeout"
+    ticket.release()
+    assert admission.stats()["rejected"] == 2
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("server_client", [{"admission": AdmissionController(max_concurrency=1, max_queue=0)}],
+                         indirect=True)
+async def test_saturated_server_answers_429_with_retry_after(server, server_client):
+    ticket = await server.admission.acquire("default", 0)
+    body = {"prompt": "open the settings page", "max_tokens": 8, "temperature": 0.7}
+    rejected = await server_client.post("/v1/completions", json=body)
+    assert rejected.status_code == 429
+    assert int(rejected.headers["retry-after"]) >= 1
+    ticket.release()
+    accepted = await server_client.post("/v1/completions", json=body)
+    assert accepted.status_code == 200
+
+@pytest.mark.anyio
+async def test_blocked_head_waiter_does_not_hold_back_other_tenants():
+    admission = AdmissionController(max_concurrency=4, max_queue=4, tenant_concurrency=1)
+    busy = await admission.acquire("a", 10)
+    blocked = asyncio.create_task(admission.acquire("a", 10))
+    await asyncio.sleep(0)
+    # Global capacity is free, so tenant b must not queue behind tenant a's waiter
+    other = await asyncio.wait_for(admission.acquire("b", 10), 1)
+    assert admission.stats()["running"] == 2 and not blocked.done()
+    busy.release()
+    (await blocked).release()
+    other.release()
@@ -0,0 +1,37 @@
+"""
+VLLMBackend.stats against stand-ins for the V0 and V1 engine internals:
+whatever the installed vLLM lacks is left out instead of failing the call.
+"""
+
+from types import SimpleNamespace
+
+from backends import VLLMBackend
+
+def backend_with(engine):
+    backend = VLLMBackend("m")
+    backend.engine = engine
+    return backend
+
+def test_v0_scheduler_stats():
+    scheduler = SimpleNamespace(
+        running=[1, 2], waiting=[3],
+        cache_config=SimpleNamespace(num_gpu_blocks=100),
+        block_manager=SimpleNamespace(get_num_free_gpu_blocks=lambda: 75),
+    )
+    stats = backend_with(SimpleNamespace(engine=SimpleNamespace(scheduler=[scheduler]))).stats()
+    assert (stats["running"], stats["waiting"], stats["kv_cache_usage"]) == (2, 1, 0.25)
+
+def test_v0_scheduler_without_block_manager_gives_partial_stats():
+    scheduler = SimpleNamespace(running=[1], waiting=[], cache_config=SimpleNamespace(num_gpu_blocks=None))
+    stats = backend_with(SimpleNamespace(engine=SimpleNamespace(scheduler=scheduler))).stats()
+    assert (stats["running"], stats["waiting"]) == (1, 0)
+    assert "kv_cache_usage" not in stats
+
+def test_v1_engine_reports_unfinished_requests():
+    processor = SimpleNamespace(get_num_unfinished_requests=lambda: 4)
+    stats = backend_with(SimpleNamespace(output_processor=processor, engine_core=object())).stats()
+    assert stats["running"] == 4
+    assert "waiting" not in stats and "kv_cache_usage" not in stats
+
+def test_unknown_engine_keeps_the_base_stats():
+    assert backend_with(object()).stats() == {"backend": "vllm", "model": "m"}
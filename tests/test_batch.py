@@ -0,0 +1,77 @@
+"""
+Prompt lists, n > 1 and /v1/batch: every choice is admitted in one step,
+a request that could never fit is refused with a 400, and a malformed
+batch line fails alone instead of cutting off the result stream.
+"""
+
+import json
+import asyncio
+
+import pytest
+
+from admission import AdmissionController
+
+def admission_of(max_concurrency):
+    return [{"admission": AdmissionController(max_concurrency=max_concurrency, max_queue=4)}]
+
+@pytest.mark.anyio
+async def test_prompt_list_with_n_gets_one_choice_per_prompt_and_sample(server_client):
+    response = await server_client.post("/v1/completions", json={
+        "prompt": ["open the inbox", "close the tab"], "n": 2, "max_tokens": 4,
+    })
+    assert response.status_code == 200
+    choices = response.json()["choices"]
+    assert [choice["index"] for choice in choices] == [0, 1, 2, 3]
+    assert all(choice["text"] for choice in choices)
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("server_client", admission_of(2), indirect=True)
+async def test_more_choices_than_the_server_can_run_is_a_400(server, server_client):
+    response = await asyncio.wait_for(server_client.post("/v1/completions", json={
+        "prompt": "x", "n": 3, "max_tokens": 4,
+    }), 5)
+    assert response.status_code == 400
+    assert server.admission.stats()["running"] == 0
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("server_client", admission_of(2), indirect=True)
+async def test_choices_wait_without_holding_part_of_their_capacity(server, server_client):
+    ticket = await server.admission.acquire("default", 0)
+    waiting = asyncio.create_task(server_client.post("/v1/completions", json={
+        "prompt": "x", "n": 2, "max_tokens": 4,
+    }))
+    await asyncio.sleep(0.05)
+    assert server.admission.stats()["running"] == 1 and server.admission.stats()["queued"] == 1
+    # A single request still fits beside the queued pair
+    alone = await server_client.post("/v1/completions", json={"prompt": "y", "max_tokens": 4})
+    assert alone.status_code == 200
+    ticket.release()
+    assert (await waiting).status_code == 200
+    assert server.admission.stats()["running"] == 0
+
+@pytest.mark.anyio
+async def test_batch_answers_each_line_and_fails_malformed_ones_alone(server_client):
+    lines = [
+        {"prompt": "open the inbox", "max_tokens": 4},
+        {"custom_id": "chat", "url": "/v1/chat/completions",
+         "body": {"messages": [{"role": "user", "content": "hi"}], "max_tokens": 4}},
+        [1, 2],
+        "abc",
+        {"custom_id": "list-body", "body": [1, 2]},
+        {"custom_id": "bad-url", "url": "/v1/embeddings", "body": {"input": "x"}},
+        {"custom_id": "invalid", "body": {"prompt": "x", "n": 0}},
+    ]
+    response = await server_client.post(
+        "/v1/batch", content="\n".join(json.dumps(line) for line in lines))
+    assert response.status_code == 200
+    results = {result["custom_id"]: result for result in map(json.loads, response.text.splitlines())}
+    statuses = {custom_id: result["response"]["status_code"] for custom_id, result in results.items()}
+    assert statuses == {"0": 200, "chat": 200, "2": 400, "3": 400, "list-body": 400,
+                        "bad-url": 404, "invalid": 400}
+    assert results["chat"]["response"]["body"]["choices"][0]["message"]["role"] == "assistant"
+    assert results["0"]["error"] is None and results["2"]["error"]["message"]
+
+@pytest.mark.anyio
+async def test_batch_with_a_line_that_is_not_json_is_rejected_up_front(server_client):
+    response = await server_client.post("/v1/batch", content='{"prompt": "x"}\n{not json')
+    assert response.status_code == 400
@@ -0,0 +1,82 @@
+"""
+Single-flight coalescing: a seat reserved at admission survives the flight
+finishing before the subscriber arrives, and only deterministic requests
+share a generation.
+"""
+
+import asyncio
+
+import pytest
+
+from backends import CompletionOutput, RequestOutput
+from coalescing import SingleFlight
+
+def generation(steps, started, gate=None):
+    """start() stand-in that counts engine requests and emits `steps` snapshots"""
+    async def start(request_id):
+        started.append(request_id)
+        for step in range(1, steps + 1):
+            if gate is not None:
+                await gate.wait()
+            await asyncio.sleep(0)
+            yield RequestOutput(request_id, "", [], [CompletionOutput(0, "x" * step, [step])],
+                                finished=step == steps)
+    return start
+
+async def no_abort(request_id):
+    pass
+
+async def drain(outputs):
+    return [output async for output in outputs]
+
+@pytest.mark.anyio
+async def test_reserved_seat_outlives_the_flight():
+    flights, started = SingleFlight(), []
+    first = asyncio.create_task(drain(flights.subscribe("k", "a", generation(3, started), no_abort)))
+    await asyncio.sleep(0)
+    reservation = flights.reserve("k", "b")
+    assert reservation is not None
+    await first
+    assert not flights.has("k")
+    # Subscribing after the flight ended replays its final snapshot instead of starting another
+    outputs = await drain(flights.subscribe("k", "b", generation(3, started), no_abort))
+    assert started == ["a"]
+    assert outputs[-1].finished and outputs[-1].outputs[0].text == "xxx"
+    assert flights.stats() == {"in_flight": 0, "started": 1, "coalesced": 1, "reserved": 0}
+
+@pytest.mark.anyio
+async def test_reservation_keeps_the_flight_running_until_released():
+    flights, started, gate = SingleFlight(), [], asyncio.Event()
+    first = asyncio.create_task(drain(flights.subscribe("k", "a", generation(3, started, gate),
+                                                        no_abort)))
+    await asyncio.sleep(0)
+    reservation = flights.reserve("k", "b")
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    # The first subscriber left, but the reserved seat keeps the generation alive
+    assert flights.has("k")
+    reservation.release()
+    assert not flights.has("k")
+    assert flights.reserve("k", "c") is None
+
+async def concurrent(client, body, count=6):
+    return await asyncio.gather(*(client.post("/v1/completions", json=body) for _ in range(count)))
+
+@pytest.mark.anyio
+async def test_identical_greedy_requests_share_one_generation(server, server_client, monkeypatch):
+    monkeypatch.setattr(server, "coalescer", SingleFlight())
+    body = {"prompt": "plan the search", "max_tokens": 8, "temperature": 0, "bypass_cache": True}
+    responses = await concurrent(server_client, body)
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["choices"][0]["text"] for response in responses}) == 1
+    assert server.coalescer.stats()["started"] == 1
+    assert server.coalescer.stats()["coalesced"] == 5
+
+@pytest.mark.anyio
+async def test_sampled_requests_are_never_coalesced(server, server_client, monkeypatch):
+    monkeypatch.setattr(server, "coalescer", SingleFlight())
+    body = {"prompt": "plan the search", "max_tokens": 8, "temperature": 0.7}
+    responses = await concurrent(server_client, body)
+    assert {response.status_code for response in responses} == {200}
+    assert server.coalescer.stats() == {"in_flight": 0, "started": 0, "coalesced": 0, "reserved": 0}
@@ -0,0 +1,23 @@
+"""
+Cold start of the desktop app: importing it must not pull in the HTTP
+stack, SQLite or QtWebEngine; each is loaded on first use instead.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+DESKTOP_APPS = Path(__file__).resolve().parent.parent / "desktop_apps"
+
+def test_import_defers_heavy_modules():
+    code = ("import sys, windows_desktop_app; "
+            "print(' '.join(m for m in ('requests', 'sqlite3', 'PyQt5.QtWebEngineWidgets') "
+            "if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=DESKTOP_APPS,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,101 @@
+"""
+Liveness and readiness verdicts: a loading engine is alive but not ready,
+a stalled one is neither, and a nearly full admission queue only takes the
+replica out of rotation. Checked on HealthMonitor and through the fake
+backend's /health/live, /health/ready and /stats.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController
+from health import EngineSample, HealthMonitor
+
+async def no_probe():
+    return EngineSample(state="ready")
+
+def monitor(**kwargs):
+    return HealthMonitor(no_probe, min_gpu_free_mb=256, **kwargs)
+
+def test_loading_engine_is_alive_but_not_ready():
+    verdict = monitor().evaluate(EngineSample(state="loading"), None)
+    assert (verdict["live"], verdict["ready"]) == (True, False)
+    assert verdict["ready_reasons"] == ["engine loading"]
+
+def test_failed_engine_is_neither_alive_nor_ready():
+    verdict = monitor().evaluate(EngineSample(state="failed", engine_errors=["m: dead"]), None)
+    assert (verdict["live"], verdict["ready"]) == (False, False)
+    assert verdict["live_reasons"] == ["engine failed to start", "m: dead"]
+
+def test_pending_work_without_output_is_a_stall():
+    health = monitor(stall_seconds=0.05)
+    busy = EngineSample(state="ready", running=2, waiting=1)
+    assert health.evaluate(busy, None)["live"]
+    time.sleep(0.1)
+    verdict = health.evaluate(busy, None)
+    assert not verdict["live"] and "3 sequences pending with no output" in verdict["live_reasons"][0]
+    # Output resets the clock
+    health.note_progress()
+    assert health.evaluate(busy, None)["live"]
+
+def test_idle_engine_never_stalls():
+    health = monitor(stall_seconds=0)
+    health.last_progress -= 60
+    assert health.evaluate(EngineSample(state="ready"), None)["live"]
+
+def test_full_queue_and_low_gpu_memory_only_affect_readiness():
+    verdict = monitor().evaluate(EngineSample(state="ready", queued=9, max_queue=10),
+                                 [{"index": 0, "free_mb": 100.0, "total_mb": 8000.0}])
+    assert (verdict["live"], verdict["ready"]) == (True, False)
+    assert verdict["ready_reasons"] == ["GPU memory headroom 100 MB < 256 MB", "admission queue 9/10"]
+
+async def probes(client):
+    live, ready = await asyncio.gather(client.get("/health/live"), client.get("/health/ready"))
+    return live.status_code, ready.status_code, ready.json()["reasons"]
+
+@pytest.mark.anyio
+async def test_server_is_ready_once_loaded(server, server_client):
+    await server.health_monitor.sample()
+    assert await probes(server_client) == (200, 200, [])
+
+@pytest.mark.anyio
+async def test_server_reports_loading(server, server_client, monkeypatch):
+    monkeypatch.setattr(server, "engine_state", "loading")
+    await server.health_monitor.sample()
+    assert await probes(server_client) == (200, 503, ["engine loading"])
+    assert (await server_client.get("/health")).status_code == 503
+
+@pytest.mark.anyio
+async def test_server_reports_a_stalled_engine(server, server_client, monkeypatch):
+    monkeypatch.setattr(server.health_monitor, "stall_seconds", 0.05)
+    ticket = await server.admission.acquire("default", 0)
+    try:
+        server.health_monitor.last_progress -= 60
+        await server.health_monitor.sample()
+        await asyncio.sleep(0.1)
+        await server.health_monitor.sample()
+        live, ready, reasons = await probes(server_client)
+        assert (live, ready) == (503, 503)
+        assert "1 sequences pending with no output" in reasons[0]
+        stats = (await server_client.get("/stats")).json()
+        assert stats["health"]["live"] is False and stats["admission"]["running"] == 1
+    finally:
+        ticket.release()
+        server.health_monitor.note_progress()
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("server_client", [{"admission": AdmissionController(max_concurrency=1, max_queue=2)}],
+                         indirect=True)
+async def test_server_with_a_saturated_queue_is_alive_but_not_ready(server, server_client):
+    ticket = await server.admission.acquire("default", 0)
+    waiters = [asyncio.create_task(server.admission.acquire("default", 0)) for _ in range(2)]
+    await asyncio.sleep(0)
+    await server.health_monitor.sample()
+    assert await probes(server_client) == (200, 503, ["admission queue 2/2"])
+    stats = (await server_client.get("/stats")).json()
+    assert stats["health"]["checks"]["queued"] == 2 and stats["startup"]["status"] == "ready"
+    ticket.release()
+    for waiter in waiters:
+        (await waiter).release()
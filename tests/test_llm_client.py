@@ -0,0 +1,92 @@
+"""
+Desktop LLMClient against a local SSE stand-in: deltas are yielded as they
+arrive, and a stream cut off before data: [DONE] is an error rather than
+a finished (and cached) answer. HealthMonitor shuts down within one probe.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+import windows_desktop_app
+from PyQt5.QtCore import Qt
+from windows_desktop_app import HealthMonitor, LLMClient, StreamIncomplete
+
+def sse(*events):
+    return "".join(f"data: {event if isinstance(event, str) else json.dumps(event)}\n\n"
+                   for event in events).encode()
+
+def delta(text):
+    return {"choices": [{"index": 0, "text": text}]}
+
+@pytest.fixture
+def stand_in():
+    """Serves whatever body `stand_in.body` holds, then closes the connection"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            self.wfile.write(server.body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = LLMClient(f"http://127.0.0.1:{server.server_port}")
+    yield server, client
+    client.close()
+    server.shutdown()
+
+def stream(client):
+    return list(client.stream_completion("prompt", {"max_tokens": 8}, threading.Event()))
+
+def test_complete_stream_yields_every_delta(stand_in):
+    server, client = stand_in
+    server.body = sse(delta("Hel"), delta("lo"), {"choices": [], "usage": {}}, "[DONE]")
+    assert stream(client) == ["Hel", "lo"]
+
+def test_stream_cut_before_done_raises(stand_in):
+    server, client = stand_in
+    server.body = sse(delta("Hel"), delta("lo"))
+    with pytest.raises(StreamIncomplete):
+        stream(client)
+
+def test_error_event_raises_with_the_server_message(stand_in):
+    server, client = stand_in
+    server.body = sse(delta("Hel"), {"error": {"message": "engine died"}})
+    with pytest.raises(RuntimeError, match="engine died"):
+        stream(client)
+
+class SlowHealthClient:
+    """health() takes as long as a probe that runs into HEALTH_PROBE_TIMEOUT"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.probing = threading.Event()
+
+    def health(self):
+        self.probing.set()
+        time.sleep(self.seconds)
+        return False
+
+def test_health_monitor_stops_within_one_probe(qapp, monkeypatch):
+    monkeypatch.setattr(windows_desktop_app, "HEALTH_STOP_WAIT_MS", 800)
+    client = SlowHealthClient(0.3)
+    monitor = HealthMonitor(client)
+    emitted = []
+    monitor.status_changed.connect(emitted.append, Qt.DirectConnection)
+    monitor.start()
+    assert client.probing.wait(2)
+    started = time.monotonic()
+    assert monitor.stop()
+    assert time.monotonic() - started < 0.8
+    # The probe in flight when stop() was called is not reported to a closing window
+    assert emitted == []
@@ -0,0 +1,87 @@
+"""
+LocalStore: the response cache keeps at most CACHE_MAX_ENTRIES, evicting
+the least recently used, and task history is searchable through FTS5 or,
+on sqlite builds without it, LIKE.
+"""
+
+import itertools
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+import windows_desktop_app
+from windows_desktop_app import LocalStore
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing time.time(), so last_used never ties"""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(windows_desktop_app.time, "time", lambda: float(next(ticks)))
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalStore(tmp_path / "history.db")
+    yield store
+    store.close()
+
+def keys(store):
+    with store._lock:
+        return {key for (key,) in store.db.execute("SELECT key FROM responses")}
+
+def test_cache_key_covers_prompt_model_and_params():
+    key = LocalStore.cache_key("open the inbox", "m", {"temperature": 0.7, "max_tokens": 8})
+    assert key == LocalStore.cache_key("open the inbox", "m", {"max_tokens": 8, "temperature": 0.7})
+    assert key != LocalStore.cache_key("open the inbox", "other", {"temperature": 0.7, "max_tokens": 8})
+    assert key != LocalStore.cache_key("open the inbox", "m", {"temperature": 0.0, "max_tokens": 8})
+
+def test_cache_evicts_least_recently_used_beyond_the_cap(store, clock, monkeypatch):
+    monkeypatch.setattr(windows_desktop_app, "CACHE_MAX_ENTRIES", 3)
+    for name in "abc":
+        store.store(name, f"prompt {name}", "m", f"response {name}")
+    # Reading "a" makes "b" the least recently used
+    assert store.lookup("a") == "response a"
+    store.store("d", "prompt d", "m", "response d")
+    assert keys(store) == {"a", "c", "d"}
+    store._hot.clear()
+    assert store.lookup("b") is None and store.lookup("c") == "response c"
+
+def test_prefetch_loads_the_most_recently_used(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(windows_desktop_app, "CACHE_PREFETCH", 2)
+    store = LocalStore(tmp_path / "history.db")
+    for name in "abc":
+        store.store(name, name, "m", f"response {name}")
+    store.close()
+    reopened = LocalStore(tmp_path / "history.db")
+    reopened.prefetch()
+    assert list(reopened._hot) == ["b", "c"]
+    reopened.close()
+
+def fill_history(store):
+    store.add_history("search flights to Lisbon", "navigate https://flights.example", "m", False)
+    store.add_history("open the inbox", "click #inbox", "m", True)
+    store.add_history("book a hotel in Lisbon", "type #city Lisbon", "m", False)
+
+def test_fts_search_matches_word_prefixes(store):
+    assert store.fts
+    fill_history(store)
+    assert {row[1] for row in store.search_history("lisb")} == \
+        {"search flights to Lisbon", "book a hotel in Lisbon"}
+    assert [row[1] for row in store.search_history("inbox")] == ["open the inbox"]
+    assert store.search_history("inbox")[0][4] == 1
+    # FTS syntax in user input is matched literally instead of raising
+    assert store.search_history('hotel" OR "inbox') == []
+    assert [row[1] for row in store.search_history("")][0] == "book a hotel in Lisbon"
+
+def test_like_fallback_without_fts5(tmp_path, monkeypatch):
+    monkeypatch.setattr(windows_desktop_app, "HISTORY_FTS_SCHEMA",
+                        "CREATE VIRTUAL TABLE history_fts USING no_such_module(prompt);")
+    store = LocalStore(tmp_path / "history.db")
+    try:
+        assert not store.fts
+        fill_history(store)
+        assert [row[1] for row in store.search_history("Lisbon")] == \
+            ["book a hotel in Lisbon", "search flights to Lisbon"]
+        assert [row[1] for row in store.search_history("#inbox")] == ["open the inbox"]
+    finally:
+        store.close()
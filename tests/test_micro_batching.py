@@ -0,0 +1,40 @@
+"""
+MicroBatcher age bound: a request that waits in a group that is neither
+full nor due is dispatched once it is max_age_ms old, even while full
+batches of other requests keep arriving.
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from micro_batching import MicroBatcher
+
+def run_batch(prompts, sampling_params, lora_request):
+    time.sleep(0.02)
+    return [f"{sampling_params}:{prompt}" for prompt in prompts]
+
+@pytest.mark.anyio
+async def test_small_full_batches_do_not_starve_a_large_request():
+    batcher = MicroBatcher(run_batch, max_wait_ms=10_000, max_batch_size=2, max_age_ms=100)
+    stop = asyncio.Event()
+
+    async def small_requests():
+        while not stop.is_set():
+            await asyncio.gather(batcher.submit("s1", "small"), batcher.submit("s2", "small"))
+
+    producer = asyncio.create_task(small_requests())
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    try:
+        output = await asyncio.wait_for(batcher.submit("big", "large", tokens=4096), timeout=2)
+        waited = time.perf_counter() - started
+    finally:
+        stop.set()
+        await producer
+        await batcher.close()
+    assert output == "large:big"
+    # The age bound plus at most one batch already running
+    assert waited < 0.1 + 0.1
+    assert batcher.stats()["batch_sizes"][2] > 0
@@ -0,0 +1,109 @@
+"""
+The Mistral server that setup_mistral_llm generates, run against a
+stand-in AsyncLLMEngine: importing it loads nothing, the engine is built
+in the lifespan, and generations share the engine instead of blocking the
+event loop (so /health answers while they run).
+"""
+
+import sys
+import types
+import asyncio
+import importlib
+
+import httpx
+import pytest
+
+from setup_mistral_llm import MistralLLMSetup
+
+class Output:
+    def __init__(self, text, finished):
+        self.outputs = [types.SimpleNamespace(text=text, finish_reason="stop" if finished else None)]
+        self.finished = finished
+
+class StandInEngine:
+    """Yields a first chunk, then holds every request until `release` is set"""
+    built = []
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.running = set()
+        self.aborted = []
+        self.stopped = False
+
+    @classmethod
+    def from_engine_args(cls, args):
+        engine = cls()
+        cls.built.append(engine)
+        return engine
+
+    async def generate(self, prompt, sampling_params, request_id):
+        self.running.add(request_id)
+        yield Output("partial", False)
+        await self.release.wait()
+        yield Output(f"answer to {prompt.splitlines()[-1]}", True)
+
+    async def abort(self, request_id):
+        self.aborted.append(request_id)
+
+    def shutdown_background_loop(self):
+        self.stopped = True
+
+@pytest.fixture
+def mistral_server(tmp_path, monkeypatch):
+    """Generate the server script into tmp_path and import it with vllm and torch stood in"""
+    monkeypatch.chdir(tmp_path)
+    MistralLLMSetup.create_vllm_server(None)
+    vllm = types.ModuleType("vllm")
+    vllm.SamplingParams = lambda **kwargs: kwargs
+    arg_utils = types.ModuleType("vllm.engine.arg_utils")
+    arg_utils.AsyncEngineArgs = lambda **kwargs: kwargs
+    async_llm_engine = types.ModuleType("vllm.engine.async_llm_engine")
+    async_llm_engine.AsyncLLMEngine = StandInEngine
+    torch = types.ModuleType("torch")
+    torch.cuda = types.SimpleNamespace(device_count=lambda: 1)
+    for name, module in {"vllm": vllm, "vllm.engine": types.ModuleType("vllm.engine"),
+                         "vllm.engine.arg_utils": arg_utils,
+                         "vllm.engine.async_llm_engine": async_llm_engine,
+                         "torch": torch}.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "mistral_vllm_server", raising=False)
+    StandInEngine.built.clear()
+    yield importlib.import_module("mistral_vllm_server")
+    sys.modules.pop("mistral_vllm_server", None)
+
+@pytest.mark.anyio
+async def test_engine_is_built_in_the_lifespan(mistral_server):
+    assert StandInEngine.built == [] and mistral_server.engine is None
+    async with mistral_server.app.router.lifespan_context(mistral_server.app):
+        assert mistral_server.engine is StandInEngine.built[0]
+    assert StandInEngine.built[0].stopped and mistral_server.engine is None
+
+@pytest.mark.anyio
+async def test_concurrent_requests_share_the_engine(mistral_server):
+    app = mistral_server.app
+    async with app.router.lifespan_context(app):
+        engine = mistral_server.engine
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://server") as client:
+            pending = [asyncio.ensure_future(client.post("/infer", json={"prompt": f"q{i}"}))
+                       for i in range(3)]
+            for _ in range(100):
+                if len(engine.running) == 3:
+                    break
+                await asyncio.sleep(0.01)
+            assert len(engine.running) == 3
+            health = await client.get("/health")
+            assert health.status_code == 200
+            engine.release.set()
+            responses = await asyncio.gather(*pending)
+    assert [r.json() for r in responses] == [
+        {"text": f"answer to q{i}", "stop_reason": "stop"} for i in range(3)]
+    assert engine.aborted == []
+
+@pytest.mark.anyio
+async def test_requests_before_the_engine_is_loaded_are_unavailable(mistral_server):
+    transport = httpx.ASGITransport(app=mistral_server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://server") as client:
+        response = await client.post("/infer", json={"prompt": "q"})
+    assert response.status_code == 503
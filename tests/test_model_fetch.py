@@ -0,0 +1,129 @@
+"""
+ModelFetcher against a local stand-in for the Hugging Face Hub that serves
+byte ranges: parallel ranged downloads, and resuming an interrupted run
+from the durable progress recorded in the sidecar.
+"""
+
+import json
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import setup_mistral_llm
+from setup_mistral_llm import ModelFetcher
+
+REPO = "org/model"
+COMMIT = "0123abcd"
+PART_SIZE = 64 * 1024
+
+def repo_files():
+    rng = random.Random(1)
+    shards = {"model-00001-of-00002.safetensors": rng.randbytes(300_000),
+              "model-00002-of-00002.safetensors": rng.randbytes(200_000)}
+    index = json.dumps({"weight_map": {"a": "model-00001-of-00002.safetensors",
+                                       "b": "model-00002-of-00002.safetensors"}}).encode()
+    return {"config.json": b'{"model_type": "mistral"}',
+            "model.safetensors.index.json": index, **shards}
+
+class Hub:
+    """Serves the repo API and ranged file downloads; `cut` truncates weight bodies"""
+
+    def __init__(self):
+        self.files = repo_files()
+        self.cut = False
+        self.served = 0
+        self.lock = threading.Lock()
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, status, body, headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                return body
+
+            def do_GET(self):
+                if self.path.startswith(f"/api/models/{REPO}/revision/"):
+                    self.wfile.write(self.send_body(200, json.dumps({"sha": COMMIT}).encode()))
+                    return
+                if self.path.startswith(f"/api/models/{REPO}/tree/"):
+                    tree = [hub.entry(name, data) for name, data in hub.files.items()]
+                    self.wfile.write(self.send_body(200, json.dumps(tree).encode()))
+                    return
+                name = self.path.split(f"/{REPO}/resolve/{COMMIT}/", 1)[1]
+                data = hub.files[name]
+                first, last = self.headers["Range"].split("=")[1].split("-")
+                first, last = int(first), int(last or len(data) - 1)
+                body = self.send_body(206, data[first:last + 1],
+                                      [("Content-Range", f"bytes {first}-{last}/{len(data)}")])
+                if hub.cut and name.endswith(".safetensors"):
+                    # Drop the connection a third of the way into the part
+                    body = body[:len(body) // 3]
+                    self.close_connection = True
+                with hub.lock:
+                    hub.served += len(body)
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def entry(name, data):
+        if name.endswith(".safetensors"):
+            return {"type": "file", "path": name, "size": 134,
+                    "lfs": {"oid": hashlib.sha256(data).hexdigest(), "size": len(data)}}
+        oid = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+        return {"type": "file", "path": name, "size": len(data), "oid": oid}
+
+@pytest.fixture
+def hub():
+    hub = Hub()
+    yield hub
+    hub.server.shutdown()
+
+def fetcher(hub, tmp_path):
+    return ModelFetcher(REPO, tmp_path, endpoint=hub.endpoint, token=None, workers=4,
+                        part_size=PART_SIZE)
+
+def test_parallel_ranged_fetch(hub, tmp_path):
+    snapshot = fetcher(hub, tmp_path).fetch()
+    for name, data in hub.files.items():
+        assert (snapshot / name).read_bytes() == data
+    assert (tmp_path / "hub" / "models--org--model" / "refs" / "main").read_text() == COMMIT
+    assert not list(snapshot.glob("*.incomplete*"))
+
+def test_interrupted_fetch_resumes_from_durable_progress(hub, tmp_path, monkeypatch):
+    monkeypatch.setattr(setup_mistral_llm, "FETCH_RETRIES", 0)
+    hub.cut = True
+    with pytest.raises(IOError):
+        fetcher(hub, tmp_path).fetch()
+
+    snapshot = tmp_path / "hub" / "models--org--model" / "snapshots" / COMMIT
+    resumable = 0
+    for name in ("model-00001-of-00002.safetensors", "model-00002-of-00002.safetensors"):
+        saved = json.loads((snapshot / f"{name}.incomplete.json").read_text())
+        partial = (snapshot / f"{name}.incomplete").read_bytes()
+        # Every byte the sidecar counts as done is on disk and correct
+        for (start, end), done in zip(saved["parts"], saved["done"]):
+            assert 0 < done < end - start
+            assert partial[start:start + done] == hub.files[name][start:start + done]
+        resumable += len(hub.files[name]) - sum(saved["done"])
+
+    hub.cut = False
+    hub.served = 0
+    snapshot = fetcher(hub, tmp_path).fetch()
+    for name, data in hub.files.items():
+        assert (snapshot / name).read_bytes() == data
+    # Only the missing bytes were downloaded again (plus the 1-byte range probe)
+    assert hub.served == resumable + 1
@@ -0,0 +1,44 @@
+"""
+Model registry: unregistered model names fall back to the default model,
+and the default registry fits its own memory budget.
+"""
+
+import pytest
+
+from backends import create_backend
+from model_registry import (
+    MODEL_MEMORY_BUDGET_GB, ModelRegistry, ModelSpec, ModelUnavailable, load_specs,
+)
+
+def make_backend(spec, enable_lora):
+    return create_backend("fake", spec.id)
+
+def registry(**kwargs):
+    specs = [ModelSpec("base-a", memory_gb=8), ModelSpec("base-b", memory_gb=8)]
+    return ModelRegistry(specs, make_backend, memory_budget_gb=20, **kwargs)
+
+@pytest.mark.anyio
+async def test_unknown_model_is_served_by_the_default():
+    models = registry(default_model="base-b")
+    lease = await models.lease("gpt-4")
+    assert lease.loaded.spec.id == "base-b"
+    lease.release()
+    await models.shutdown()
+
+@pytest.mark.anyio
+async def test_strict_registry_rejects_unknown_models():
+    with pytest.raises(ModelUnavailable) as raised:
+        await registry(strict=True).lease("gpt-4")
+    assert raised.value.status_code == 404
+
+def test_default_registry_fits_the_default_budget():
+    specs = load_specs(None)
+    assert sum(spec.memory_gb for spec in specs if not spec.is_adapter) <= MODEL_MEMORY_BUDGET_GB
+
+@pytest.mark.anyio
+async def test_server_answers_unregistered_model_names(server_client):
+    response = await server_client.post("/v1/chat/completions", json={
+        "model": "gpt-4", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 3,
+    })
+    assert response.status_code == 200
+    assert response.json()["model"] == "gpt-4"
@@ -0,0 +1,67 @@
+"""
+ChatPromptBuilder: token ids built from the cached system-prompt prefix
+plus the per-request remainder equal a full apply_chat_template encode,
+including templates whose seam would merge tokens.
+"""
+
+import pytest
+
+from backends import FakeTokenizer
+from prompting import ChatPromptBuilder
+
+SYSTEM = "You drive a web browser. Answer with one action per line."
+
+def conversation(system=SYSTEM):
+    return [{"role": "system", "content": system},
+            {"role": "user", "content": "open the inbox"},
+            {"role": "assistant", "content": "navigate https://mail.example.com"},
+            {"role": "user", "content": "now search for invoices"}]
+
+class SpacedTemplate(FakeTokenizer):
+    """Messages joined by a space: a system prompt ending in whitespace merges with it"""
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        text = " ".join(f"[{m['role']}]{m['content']}" for m in messages)
+        if add_generation_prompt:
+            text += " [assistant]"
+        return self.encode(text) if tokenize else text
+
+class RunOnTemplate(FakeTokenizer):
+    """System text runs straight into the first turn, splitting a word at the seam"""
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        text = "".join(m["content"] if m["role"] == "system" else f"{m['content']}\n"
+                       for m in messages)
+        return self.encode(text) if tokenize else text
+
+def test_prefix_cached_tokens_match_a_full_encode():
+    tokenizer = FakeTokenizer()
+    builder = ChatPromptBuilder(tokenizer)
+    for turn in range(2):
+        messages = conversation()[:3 + turn]
+        prompt, token_ids = builder.build(messages)
+        assert prompt == tokenizer.apply_chat_template(messages, tokenize=False)
+        assert token_ids == tokenizer.apply_chat_template(messages, tokenize=True)
+    # The second conversation reused the tokenized system prefix
+    assert builder.cache_info()["hits"] == 1
+
+@pytest.mark.parametrize("tokenizer, system", [(SpacedTemplate(), SYSTEM + "  "),
+                                               (RunOnTemplate(), "You drive a web brow")],
+                         ids=["spaced", "run-on"])
+def test_seams_that_merge_tokens_fall_back_to_a_full_encode(tokenizer, system):
+    messages = conversation(system)
+    assert ChatPromptBuilder(tokenizer).build(messages)[1] == \
+        tokenizer.apply_chat_template(messages, tokenize=True)
+
+def test_system_message_after_the_first_turn_is_encoded_whole():
+    tokenizer = FakeTokenizer()
+    messages = conversation()[1:2] + conversation()[:1]
+    assert ChatPromptBuilder(tokenizer).build(messages)[1] == \
+        tokenizer.apply_chat_template(messages, tokenize=True)
+
+def test_tokenizer_without_template_uses_role_prefixes():
+    tokenizer = FakeTokenizer()
+    tokenizer.chat_template = None
+    prompt, token_ids = ChatPromptBuilder(tokenizer).build(conversation()[:2])
+    assert prompt == f"System: {SYSTEM}\nUser: open the inbox\nAssistant:"
+    assert token_ids == tokenizer.encode(prompt)
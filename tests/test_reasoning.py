@@ -0,0 +1,55 @@
+"""
+budgeted_stream keeps the logprob of what it cuts: a truncated answer or
+thought still carries a cumulative_logprob, so its confidence is not 0.
+"""
+
+import pytest
+
+from advanced_ai_optimization import sequence_confidence
+from backends import CompletionOutput, FakeTokenizer, RequestOutput, SamplingParams
+from reasoning import budgeted_stream
+
+LOGPROB_PER_TOKEN = -0.1
+
+def engine(pieces):
+    """start() stand-in emitting one piece per step at a fixed logprob per token"""
+    tokenizer = FakeTokenizer()
+
+    async def start(prompt_token_ids, params, request_id):
+        text, token_ids = "", []
+        for step, piece in enumerate(pieces):
+            text += piece
+            token_ids += tokenizer.encode(piece)
+            finished = step == len(pieces) - 1
+            yield RequestOutput(request_id, "", prompt_token_ids, [CompletionOutput(
+                0, text, list(token_ids), "stop" if finished else None,
+                LOGPROB_PER_TOKEN * len(token_ids))], finished=finished)
+
+    async def abort(request_id):
+        pass
+
+    return tokenizer, start, abort
+
+async def last_output(pieces, max_tokens, budget):
+    tokenizer, start, abort = engine(pieces)
+    output = None
+    async for output in budgeted_stream(start, abort, tokenizer, "prompt", [1],
+                                        SamplingParams(max_tokens=max_tokens), "r", budget):
+        pass
+    return output.outputs[0]
+
+@pytest.mark.anyio
+async def test_truncated_answer_keeps_its_logprob():
+    completion = await last_output(["<think>", "a", "</think>", "x", " y", " z", " w"], 2, 100)
+    assert completion.finish_reason == "length"
+    assert completion.cumulative_logprob == pytest.approx(LOGPROB_PER_TOKEN * len(completion.token_ids))
+    confidence = sequence_confidence(completion.cumulative_logprob, len(completion.token_ids))
+    assert confidence == pytest.approx(0.905, abs=1e-3)
+
+@pytest.mark.anyio
+async def test_cut_short_thought_keeps_its_logprob():
+    pieces = ["<think>", " a", " b", " c", " d", " e"]
+    completion = await last_output(pieces, 4, 2)
+    # The stand-in replays every piece as the forced answer; the 2 thought tokens come on top
+    answer_tokens = sum(len(FakeTokenizer().encode(piece)) for piece in pieces)
+    assert completion.cumulative_logprob == pytest.approx(LOGPROB_PER_TOKEN * (2 + answer_tokens))
@@ -0,0 +1,69 @@
+"""
+Reasoning modes as generation policies: DEEP is served as FAST under load,
+fields a client set explicitly are never overridden, and the mode actually
+served is reported in X-Reasoning-Mode with a confidence per choice.
+"""
+
+import pytest
+
+from advanced_ai_optimization import ReasoningMode, ReasoningPolicy
+
+def test_deep_is_downgraded_when_the_queue_is_deep():
+    policy = ReasoningPolicy(downgrade_queue_depth=4, downgrade_p95=0)
+    assert policy.select(ReasoningMode.DEEP, queue_depth=3) == (policy.policies[ReasoningMode.DEEP], None)
+    served, downgraded_from = policy.select(ReasoningMode.DEEP, queue_depth=4)
+    assert (served.mode, downgraded_from) == (ReasoningMode.FAST, ReasoningMode.DEEP)
+    # Only DEEP has a cheaper fallback
+    assert policy.select(ReasoningMode.CREATIVE, queue_depth=100)[1] is None
+    assert policy.downgrades == 1
+
+def test_deep_is_downgraded_when_its_p95_latency_is_too_high():
+    policy = ReasoningPolicy(downgrade_queue_depth=0, downgrade_p95=10)
+    for latency in [1.0] * 18 + [12.0] * 2:
+        policy.observe(ReasoningMode.DEEP, latency)
+    assert policy.select(ReasoningMode.DEEP)[1] is ReasoningMode.DEEP
+    # The FAST and CREATIVE windows do not count towards DEEP's p95
+    calm = ReasoningPolicy(downgrade_queue_depth=0, downgrade_p95=10)
+    calm.observe(ReasoningMode.FAST, 60.0)
+    assert calm.select(ReasoningMode.DEEP)[1] is None
+
+def completion_request(server, **fields):
+    return server.CompletionRequest(prompt="plan the search", **fields)
+
+def test_policy_fills_only_fields_the_client_left_unset(server, monkeypatch):
+    monkeypatch.setattr(server, "reasoning_policy", ReasoningPolicy(downgrade_queue_depth=0, downgrade_p95=0))
+    request = completion_request(server, reasoning_mode="deep", temperature=0.2, max_tokens=32)
+    headers = server.apply_reasoning_policy(request)
+    deep = server.reasoning_policy.policies[ReasoningMode.DEEP]
+    assert headers == {"x-reasoning-mode": "deep"}
+    assert (request.temperature, request.max_tokens) == (0.2, 32)
+    assert (request.top_p, request.reasoning_budget) == (deep.top_p, deep.reasoning_budget)
+
+def test_requests_without_a_mode_are_untouched(server):
+    request = completion_request(server, temperature=0.7)
+    assert server.apply_reasoning_policy(request) == {}
+    assert request.reasoning_mode is None and request.reasoning_budget is None
+
+@pytest.mark.anyio
+async def test_server_reports_the_mode_served_and_a_confidence(server_client):
+    response = await server_client.post("/v1/completions", json={
+        "prompt": "plan the search", "reasoning_mode": "fast", "max_tokens": 8})
+    assert response.headers["x-reasoning-mode"] == "fast"
+    assert "x-reasoning-downgraded-from" not in response.headers
+    confidence = response.json()["choices"][0]["confidence"]
+    assert 0.0 < confidence <= 1.0
+    plain = await server_client.post("/v1/completions", json={"prompt": "plan the search", "max_tokens": 8})
+    assert "x-reasoning-mode" not in plain.headers and "confidence" not in plain.json()["choices"][0]
+
+@pytest.mark.anyio
+async def test_server_serves_deep_as_fast_under_load(server, server_client, monkeypatch):
+    overloaded = ReasoningPolicy(downgrade_queue_depth=0, downgrade_p95=1)
+    overloaded.observe(ReasoningMode.DEEP, 5.0)
+    monkeypatch.setattr(server, "reasoning_policy", overloaded)
+    response = await server_client.post("/v1/chat/completions", json={
+        "messages": [{"role": "user", "content": "plan the search"}], "reasoning_mode": "deep",
+        "max_tokens": 8})
+    assert response.status_code == 200
+    assert (response.headers["x-reasoning-mode"], response.headers["x-reasoning-downgraded-from"]) == \
+        ("fast", "deep")
+    assert "confidence" in response.json()["choices"][0]
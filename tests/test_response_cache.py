@@ -0,0 +1,112 @@
+"""
+SQLite tier of the response cache: writes and last_access updates are
+batched by the writer thread, reads never write, and the byte total is
+tracked without re-summing the table. The server reports the outcome of
+each lookup in its x-cache header.
+"""
+
+import time
+
+import pytest
+
+from advanced_ai_optimization import ResponseCache, SQLiteCacheTier, make_cache_key
+
+@pytest.fixture
+def tier(tmp_path):
+    # A long interval keeps the writer thread idle unless a put wakes it
+    tier = SQLiteCacheTier(str(tmp_path / "cache.db"), max_bytes=1000, touch_interval=60)
+    yield tier
+    tier.close()
+
+def test_prompts_differing_only_in_whitespace_get_distinct_keys():
+    keys = {make_cache_key("m", prompt) for prompt in
+            ("a  b", "a b", "a\nb", "a b\n", " a b")}
+    assert len(keys) == 5
+    assert make_cache_key("m", "a b") == make_cache_key("m", "a b")
+
+def row(tier, key):
+    with tier._lock:
+        return tier._conn.execute(
+            "SELECT size, last_access FROM response_cache WHERE key = ?", (key,)).fetchone()
+
+def test_put_is_visible_before_and_after_the_flush(tier):
+    expires_at = time.time() + 60
+    tier.put("a", b"x" * 10, expires_at)
+    assert tier.get("a") == (b"x" * 10, expires_at)
+    tier.flush()
+    assert tier.get("a") == (b"x" * 10, expires_at)
+    assert tier._bytes == 10
+
+def test_hits_do_not_write_until_the_batch_is_flushed(tier):
+    tier.put("a", b"x", time.time() + 60)
+    tier.flush()
+    written_at = row(tier, "a")[1]
+    time.sleep(0.01)
+    assert tier.get("a") is not None
+    assert row(tier, "a")[1] == written_at
+    tier.flush()
+    assert row(tier, "a")[1] > written_at
+
+def test_running_total_drives_lru_eviction(tier):
+    for key in "abc":
+        tier.put(key, b"x" * 400, time.time() + 60)
+        tier.flush()
+        time.sleep(0.01)
+    assert row(tier, "a") is None
+    assert row(tier, "b") is not None and row(tier, "c") is not None
+    assert tier._bytes == 800
+
+def test_expired_rows_are_deleted_by_the_writer(tier):
+    tier.put("a", b"x" * 10, time.time() - 1)
+    tier.flush()
+    assert tier.get("a") is None
+    tier.flush()
+    assert row(tier, "a") is None
+    assert tier._bytes == 0
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(disk=SQLiteCacheTier(path))
+    first.put("key", {"text": "hello"})
+    first.disk.close()
+    second = ResponseCache(disk=SQLiteCacheTier(path))
+    try:
+        assert second.get("key") == {"text": "hello"}
+        assert second.disk_hits == 1
+        assert second.disk._bytes == row(second.disk, "key")[0]
+    finally:
+        second.disk.close()
+
+@pytest.mark.anyio
+async def test_async_lookup_reads_the_disk_tier(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = ResponseCache(disk=SQLiteCacheTier(path))
+    writer.put("key", {"text": "hello"})
+    writer.flush()
+    reader = ResponseCache(disk=SQLiteCacheTier(path))
+    try:
+        assert await reader.aget("key") == {"text": "hello"}
+        assert await reader.aget("missing") is None
+        assert (reader.disk_hits, reader.misses) == (1, 1)
+    finally:
+        writer.disk.close()
+        reader.disk.close()
+
+@pytest.mark.anyio
+async def test_server_reports_cache_miss_then_hit(server_client):
+    body = {"prompt": "summarise the open tabs", "max_tokens": 8, "temperature": 0}
+    first = await server_client.post("/v1/completions", json=body)
+    second = await server_client.post("/v1/completions", json=body)
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert (first.headers["x-cache"], second.headers["x-cache"]) == ("MISS", "HIT")
+    assert second.headers["cache-control"].startswith("private, max-age=")
+    assert second.json()["choices"][0]["text"] == first.json()["choices"][0]["text"]
+
+@pytest.mark.anyio
+async def test_server_skips_the_cache_when_asked_or_sampling(server_client):
+    body = {"prompt": "list the downloads", "max_tokens": 8, "temperature": 0}
+    await server_client.post("/v1/completions", json=body)
+    bypassed = await server_client.post("/v1/completions", json=body, headers={"Cache-Control": "no-cache"})
+    sampled = await server_client.post("/v1/completions", json={**body, "temperature": 0.7})
+    assert (bypassed.headers["x-cache"], sampled.headers["x-cache"]) == ("BYPASS", "NONE")
+    assert bypassed.headers["cache-control"] == sampled.headers["cache-control"] == "no-store"
@@ -0,0 +1,111 @@
+"""Router tests against two local stand-in replicas"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+import router as router_module
+
+REPLICAS = ["http://replica-a", "http://replica-b"]
+
+def stand_in_replica(name: str, delay: float, observed: dict) -> FastAPI:
+    """Non-streaming upstream that answers after `delay`, recording router in-flight counts"""
+    app = FastAPI()
+
+    @app.post("/v1/completions")
+    async def completion():
+        observed[name] = max(observed.get(name, 0), router_module.router.replicas[f"http://{name}"].inflight)
+        await asyncio.sleep(delay)
+        return {"choices": [{"text": name}]}
+
+    return app
+
+@pytest.fixture
+def routed(monkeypatch):
+    observed = {}
+    router = router_module.PrefixRouter(REPLICAS)
+    for replica in router.replicas.values():
+        replica.ready = True
+    mounts = {f"all://{url.split('//')[1]}": httpx.ASGITransport(
+        app=stand_in_replica(url.split("//")[1], 0.2, observed)) for url in REPLICAS}
+    monkeypatch.setattr(router_module, "router", router)
+    monkeypatch.setattr(router_module, "client", httpx.AsyncClient(mounts=mounts))
+    monkeypatch.setattr(router_module, "ROUTER_LOAD_SLACK", 2)
+    return router, observed
+
+@pytest.mark.anyio
+async def test_concurrent_requests_fall_back_to_least_loaded(routed):
+    router, observed = routed
+    transport = httpx.ASGITransport(app=router_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://router") as client:
+        responses = await asyncio.gather(*(
+            client.post("/v1/completions", json={"prompt": "same prefix", "max_tokens": 4})
+            for _ in range(10)))
+    assert all(response.status_code == 200 for response in responses)
+    routed_to = {response.headers["x-routed-to"] for response in responses}
+    assert routed_to == set(REPLICAS)
+    assert router.load_fallbacks > 0
+    # In-flight load was visible while the upstream was still generating
+    assert max(observed.values()) > 1
+    assert all(replica.inflight == 0 for replica in router.replicas.values())
+
+@pytest.mark.anyio
+async def test_prefix_recorded_before_the_response(routed):
+    router, _ = routed
+    transport = httpx.ASGITransport(app=router_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://router") as client:
+        first = asyncio.create_task(client.post("/v1/completions", json={"prompt": "cold prefix"}))
+        await asyncio.sleep(0.05)
+        hashes = router.index.block_hashes("cold prefix")
+        assert router.index.lookup(hashes, set(REPLICAS)) is not None
+        await first
+
+def health_replica(status: int, body) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health/ready")
+    async def ready():
+        return JSONResponse(status_code=status, content=body)
+
+    return app
+
+@pytest.fixture
+def probed(monkeypatch):
+    """Replica a answers 200 with a JSON list, replica b 503 with a string"""
+    router = router_module.PrefixRouter(REPLICAS)
+    mounts = {"all://replica-a": httpx.ASGITransport(app=health_replica(200, [1, 2])),
+              "all://replica-b": httpx.ASGITransport(app=health_replica(503, "loading"))}
+    monkeypatch.setattr(router_module, "router", router)
+    monkeypatch.setattr(router_module, "client", httpx.AsyncClient(mounts=mounts))
+    monkeypatch.setattr(router_module, "ROUTER_HEALTH_INTERVAL", 0.01)
+    return router
+
+@pytest.mark.anyio
+async def test_probe_tolerates_bodies_that_are_not_objects(probed):
+    for replica in probed.replicas.values():
+        await router_module.probe_replica(replica)
+    a, b = (probed.replicas[url] for url in REPLICAS)
+    assert (a.ready, b.ready) == (True, False)
+    assert a.failures == b.failures == 0
+
+@pytest.mark.anyio
+async def test_health_loop_survives_a_failing_probe(probed, monkeypatch):
+    calls = []
+
+    def mark_ready(replica, ready, reasons):
+        calls.append(replica.url)
+        if len(calls) == 1:
+            raise RuntimeError("bug in one probe")
+        replica.ready = ready
+
+    monkeypatch.setattr(probed, "mark_ready", mark_ready)
+    task = asyncio.create_task(router_module.health_loop())
+    await asyncio.sleep(0.1)
+    assert not task.done()
+    task.cancel()
+    # Later rounds kept probing both replicas
+    assert len(calls) > len(REPLICAS)
+    assert probed.replicas["http://replica-a"].ready
@@ -0,0 +1,109 @@
+"""
+Startup cache: keys cover exactly the settings that change the sharded
+weights, a weight cache only counts once its COMPLETE marker is written,
+and the first save runs after the server is already ready.
+"""
+
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+import backends
+from startup_cache import COMPLETE_MARKER, StartupCache, WEIGHT_KEY_ARGS, cache_key
+
+ENGINE_KWARGS = {"dtype": "auto", "tensor_parallel_size": 2, "max_num_seqs": 64}
+
+def test_cache_key_is_stable_and_scoped_to_the_given_fields():
+    assert cache_key("m", {"a": 1, "b": 2}) == cache_key("m", {"b": 2, "a": 1})
+    assert cache_key("m", ENGINE_KWARGS) != cache_key("other", ENGINE_KWARGS)
+    runtime_only = dict(ENGINE_KWARGS, max_num_seqs=256)
+    assert cache_key("m", runtime_only, WEIGHT_KEY_ARGS) == cache_key("m", ENGINE_KWARGS, WEIGHT_KEY_ARGS)
+    assert cache_key("m", runtime_only) != cache_key("m", ENGINE_KWARGS)
+    resharded = dict(ENGINE_KWARGS, tensor_parallel_size=4)
+    assert cache_key("m", resharded, WEIGHT_KEY_ARGS) != cache_key("m", ENGINE_KWARGS, WEIGHT_KEY_ARGS)
+
+class SavingBackend:
+    """Stands in for an engine that can write its sharded state"""
+
+    def __init__(self, fail=False):
+        self.saves = 0
+        self.fail = fail
+
+    async def save_sharded_state(self, path):
+        self.saves += 1
+        if self.fail:
+            raise RuntimeError("disk full")
+        (Path(path) / "model-rank-0-part-0.safetensors").write_bytes(b"weights")
+
+@pytest.fixture
+def snapshot(tmp_path):
+    model = tmp_path / "model"
+    model.mkdir()
+    for name, data in (("config.json", "{}"), ("tokenizer.json", "{}"),
+                       ("model.safetensors", "w"), ("model.safetensors.index.json", "{}")):
+        (model / name).write_text(data)
+    return str(model)
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    for variable in ("VLLM_CACHE_ROOT", "TORCHINDUCTOR_CACHE_DIR", "TRITON_CACHE_DIR"):
+        monkeypatch.delenv(variable, raising=False)
+    return StartupCache(str(tmp_path / "startup"))
+
+@pytest.mark.anyio
+async def test_stored_weights_are_complete_and_loaded_next_time(cache, snapshot):
+    assert cache.prepare(snapshot, ENGINE_KWARGS)[1].get("load_format") is None
+    assert await cache.store_weights(snapshot, ENGINE_KWARGS, SavingBackend())
+    stored = cache.weights_dir(snapshot, ENGINE_KWARGS)
+    names = {path.name for path in stored.iterdir()}
+    assert names == {COMPLETE_MARKER, "config.json", "tokenizer.json",
+                     "model-rank-0-part-0.safetensors"}
+    assert json.loads((stored / COMPLETE_MARKER).read_text())["engine_kwargs"]["tensor_parallel_size"] == 2
+    load_from, kwargs = cache.prepare(snapshot, ENGINE_KWARGS)
+    assert load_from == str(stored) and kwargs["load_format"] == "sharded_state"
+    assert not list(stored.parent.glob("*.tmp-*"))
+
+@pytest.mark.anyio
+async def test_existing_cache_is_not_written_again(cache, snapshot):
+    backend = SavingBackend()
+    assert await cache.store_weights(snapshot, ENGINE_KWARGS, backend)
+    assert not await cache.store_weights(snapshot, ENGINE_KWARGS, backend)
+    assert backend.saves == 1
+
+@pytest.mark.anyio
+async def test_failed_save_leaves_no_cache_behind(cache, snapshot):
+    assert not await cache.store_weights(snapshot, ENGINE_KWARGS, SavingBackend(fail=True))
+    assert not cache.has_weights(snapshot, ENGINE_KWARGS)
+    assert not list((cache.root / "weights").iterdir())
+
+class SlowCache:
+    """startup_cache stand-in whose save finishes only when told to"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.saved = False
+
+    async def store_weights(self, model, engine_kwargs, backend):
+        # Bounded, so a server that waits for the save before serving fails instead of hanging
+        await asyncio.wait_for(self.release.wait(), 2)
+        self.saved = True
+        return True
+
+@pytest.fixture
+def slow_cache(server, monkeypatch):
+    """Makes the fake engine cacheable; requested before server_client so startup sees it"""
+    slow_cache = SlowCache()
+    monkeypatch.setattr(server, "STARTUP_CACHE_ENABLED", True)
+    monkeypatch.setattr(server, "startup_cache", slow_cache)
+    monkeypatch.setattr(backends.FakeBackend, "engine_kwargs", {}, raising=False)
+    return slow_cache
+
+@pytest.mark.anyio
+async def test_server_is_ready_while_the_first_weight_cache_is_written(slow_cache, server, server_client):
+    assert (await server_client.get("/health")).status_code == 200
+    assert not slow_cache.saved and not server.weight_cache_task.done()
+    slow_cache.release.set()
+    await server.weight_cache_task
+    assert slow_cache.saved
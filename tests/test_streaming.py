@@ -0,0 +1,93 @@
+"""
+SSE streaming from /v1/chat/completions and /v1/completions: a role chunk
+first, a finish_reason on each choice's last chunk, a usage frame and a
+terminating data: [DONE]; a client that goes away aborts its generation.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import backends
+
+def events(body: str):
+    """Payloads of the data: frames, in order"""
+    frames = [frame for frame in body.split("\n\n") if frame]
+    assert all(frame.startswith("data: ") for frame in frames)
+    return [frame[len("data: "):] for frame in frames]
+
+@pytest.mark.anyio
+async def test_chat_stream_frames(server_client):
+    request = {"messages": [{"role": "user", "content": "open the inbox"}], "max_tokens": 6,
+               "temperature": 0}
+    streamed = await server_client.post("/v1/chat/completions", json={**request, "stream": True})
+    assert streamed.headers["content-type"].startswith("text/event-stream")
+    payloads = events(streamed.text)
+    assert payloads[-1] == "[DONE]"
+    chunks = [json.loads(payload) for payload in payloads[:-1]]
+    assert all(chunk["object"] == "chat.completion.chunk" for chunk in chunks)
+    assert chunks[0]["choices"][0]["delta"] == {"role": "assistant"}
+    *deltas, finish, usage = chunks
+    assert finish["choices"][0]["finish_reason"] == "length"
+    assert usage["choices"] == [] and usage["usage"]["completion_tokens"] == 6
+    content = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in deltas)
+    whole = await server_client.post("/v1/chat/completions", json=request)
+    assert content == whole.json()["choices"][0]["message"]["content"]
+
+@pytest.mark.anyio
+async def test_completion_stream_finishes_every_choice(server_client):
+    streamed = await server_client.post("/v1/completions", json={
+        "prompt": "open the inbox", "n": 2, "max_tokens": 4, "stream": True})
+    payloads = events(streamed.text)
+    assert payloads[-1] == "[DONE]"
+    chunks = [json.loads(payload) for payload in payloads[:-1]]
+    finished = {choice["index"]: choice["finish_reason"] for chunk in chunks
+                for choice in chunk["choices"] if choice["finish_reason"] is not None}
+    assert finished == {0: "length", 1: "length"}
+    assert chunks[-1]["usage"]["completion_tokens"] == 8
+
+@pytest.mark.anyio
+async def test_client_disconnect_aborts_the_generation(server, server_client, monkeypatch):
+    aborted = []
+    real_abort = backends.FakeBackend.abort
+
+    async def abort(self, request_id):
+        aborted.append(request_id)
+        await real_abort(self, request_id)
+
+    monkeypatch.setattr(backends.FakeBackend, "abort", abort)
+    for backend in server.registry.loaded_backends():
+        # Slow enough that the client leaves long before max_tokens
+        monkeypatch.setattr(backend, "tokens_per_second", 50)
+
+    body = json.dumps({"prompt": "open the inbox", "max_tokens": 100, "stream": True,
+                       "temperature": 0.7}).encode()
+    first_chunk = asyncio.Event()
+    sent = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await first_chunk.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_chunk.set()
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/v1/completions", "raw_path": b"/v1/completions",
+             "query_string": b"", "root_path": "", "server": ("server", 80),
+             "client": ("127.0.0.1", 1234), "headers": [(b"content-type", b"application/json")]}
+    await asyncio.wait_for(server.app(scope, receive, send), 10)
+
+    body_frames = b"".join(message.get("body", b"") for message in sent
+                           if message["type"] == "http.response.body").decode()
+    assert "[DONE]" not in body_frames
+    assert len(aborted) == 1
+    assert server.admission.stats()["running"] == 0
@@ -0,0 +1,21 @@
+"""
+Structured output degrades on its own when the installed vLLM lacks
+guided decoding: plain text keeps working, response_format is refused.
+"""
+
+import pytest
+
+import structured_output
+from structured_output import SchemaCache, SchemaError
+
+def test_schemas_compile_when_guided_decoding_is_available():
+    compiled = SchemaCache().resolve({"type": "json_object"})
+    assert compiled.guided_decoding.json == {"type": "object"}
+
+def test_missing_guided_decoding_only_disables_structured_output(monkeypatch):
+    monkeypatch.setattr(structured_output, "GUIDED_DECODING_AVAILABLE", False)
+    cache = SchemaCache()
+    assert cache.resolve(None) is None
+    assert cache.resolve({"type": "text"}) is None
+    with pytest.raises(SchemaError):
+        cache.resolve({"type": "json_schema", "json_schema": {"name": "action_plan"}})
@@ -0,0 +1,59 @@
+"""
+usage and timings: prompt counts agree with the tokenizer, completion
+counts with the tokens generated, a prompt shared by n choices is counted
+once, and cache replays report the original counts with timings.cached set.
+"""
+
+import pytest
+
+from backends import FakeTokenizer
+
+tokenizer = FakeTokenizer()
+
+def all_cut_at_max_tokens(choices):
+    """Every choice ran to max_tokens, so each generated exactly that many tokens"""
+    return all(choice["finish_reason"] == "length" for choice in choices)
+
+@pytest.mark.anyio
+async def test_completion_usage_counts_prompt_and_generated_tokens(server_client):
+    prompt = "open the inbox and find the newest invoice"
+    body = (await server_client.post("/v1/completions", json={
+        "prompt": prompt, "max_tokens": 7, "temperature": 0.7})).json()
+    assert body["usage"] == {"prompt_tokens": len(tokenizer.encode(prompt)), "completion_tokens": 7,
+                             "total_tokens": len(tokenizer.encode(prompt)) + 7}
+    assert all_cut_at_max_tokens(body["choices"])
+    timings = body["timings"]
+    assert timings["cached"] is False
+    assert 0 <= timings["time_to_first_token"] <= timings["total_time"]
+
+@pytest.mark.anyio
+async def test_prompt_shared_by_n_choices_is_counted_once(server_client):
+    prompts = ["open the inbox", "close every other tab"]
+    body = (await server_client.post("/v1/completions", json={
+        "prompt": prompts, "n": 3, "max_tokens": 5, "temperature": 0.7})).json()
+    assert len(body["choices"]) == 6
+    usage = body["usage"]
+    assert usage["prompt_tokens"] == sum(len(tokenizer.encode(prompt)) for prompt in prompts)
+    assert all_cut_at_max_tokens(body["choices"]) and usage["completion_tokens"] == 6 * 5
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+
+@pytest.mark.anyio
+async def test_chat_usage_counts_the_rendered_template(server_client):
+    messages = [{"role": "system", "content": "You drive a browser."},
+                {"role": "user", "content": "open the inbox"}]
+    body = (await server_client.post("/v1/chat/completions", json={
+        "messages": messages, "max_tokens": 4, "n": 2, "temperature": 0.7})).json()
+    assert body["usage"]["prompt_tokens"] == len(tokenizer.apply_chat_template(messages, tokenize=True))
+    assert all_cut_at_max_tokens(body["choices"]) and body["usage"]["completion_tokens"] == 8
+
+@pytest.mark.anyio
+async def test_cached_choices_report_the_original_usage(server_client):
+    request = {"prompt": "summarise the page", "max_tokens": 6, "n": 2, "seed": 7, "temperature": 0.7}
+    first = await server_client.post("/v1/completions", json=request)
+    replay = await server_client.post("/v1/completions", json=request)
+    assert (first.headers["x-cache"], replay.headers["x-cache"]) == ("MISS", "HIT")
+    assert replay.json()["usage"] == first.json()["usage"]
+    assert replay.json()["usage"]["completion_tokens"] == 12
+    assert first.json()["timings"]["cached"] is False
+    timings = replay.json()["timings"]
+    assert timings["cached"] is True and timings["queue_time"] == 0.0
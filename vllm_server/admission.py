@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Admission control for the Hyper-Jarvis vLLM server
+
+Requests must hold a ticket while they occupy the engine. Tickets are
+granted while global concurrency, per-tenant concurrency and the in-flight
+token budget (prompt + max_tokens) allow it; otherwise the request waits in
+a bounded FIFO queue for at most queue_timeout seconds. A full queue or an
+expired wait is rejected immediately with a Retry-After estimate so the
+requests we do accept keep a sane tail latency. The choices of one request
+(prompt lists, n > 1) are admitted as a group: all their tickets at once or
+none, and a group that could never fit is refused outright.
+"""
+
+import math
+import time
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server saturated ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionTooLarge(Exception):
+    """Raised for a group that exceeds the limits even on an idle server"""
+
+class Ticket:
+    """Capacity held by one admitted request; release() is idempotent"""
+
+    def __init__(self, controller: "AdmissionController", tenant: str, tokens: int):
+        self.controller = controller
+        self.tenant = tenant
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.admitted_at: Optional[float] = None
+        self.released = False
+
+    @property
+    def queue_time(self) -> float:
+        return (self.admitted_at or time.monotonic()) - self.enqueued_at
+
+    def release(self):
+        if self.admitted_at is not None and not self.released:
+            self.released = True
+            self.controller._release(self)
+
+class AdmissionController:
+    """Bounded, tenant- and token-aware admission queue"""
+
+    def __init__(self, max_concurrency: int, max_queue: int, tenant_concurrency: int = 0,
+                 token_budget: int = 0, queue_timeout: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.tenant_concurrency = tenant_concurrency
+        self.token_budget = token_budget
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.tokens_in_use = 0
+        self.per_tenant: Dict[str, int] = defaultdict(int)
+        self._waiters: Deque[Tuple[List[Ticket], asyncio.Future]] = deque()
+        self._service_time = 1.0  # EWMA of seconds a ticket is held
+        self.admitted = 0
+        self.rejected = 0
+
+    def _fits(self, group: List[Ticket]) -> bool:
+        if self.running + len(group) > self.max_concurrency:
+            return False
+        if self.tenant_concurrency and \
+                self.per_tenant[group[0].tenant] + len(group) > self.tenant_concurrency:
+            return False
+        if self.token_budget and self.running and \
+                self.tokens_in_use + sum(ticket.tokens for ticket in group) > self.token_budget:
+            # An oversized request still runs once the engine is otherwise idle
+            return False
+        return True
+
+    def _grant(self, group: List[Ticket]):
+        for ticket in group:
+            ticket.admitted_at = time.monotonic()
+            self.running += 1
+            self.tokens_in_use += ticket.tokens
+            self.per_tenant[ticket.tenant] += 1
+            self.admitted += 1
+
+    def _release(self, ticket: Ticket):
+        self.running -= 1
+        self.tokens_in_use -= ticket.tokens
+        self.per_tenant[ticket.tenant] -= 1
+        if not self.per_tenant[ticket.tenant]:
+            del self.per_tenant[ticket.tenant]
+        held = time.monotonic() - ticket.admitted_at
+        self._service_time = 0.9 * self._service_time + 0.1 * held
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit queued requests, oldest first, skipping tenants at their limit"""
+        if not self._waiters or self.running >= self.max_concurrency:
+            return
+        still_waiting: Deque[Tuple[List[Ticket], asyncio.Future]] = deque()
+        while self._waiters:
+            group, future = self._waiters.popleft()
+            if future.done():
+                continue
+            if self._fits(group):
+                self._grant(group)
+                future.set_result(True)
+            else:
+                still_waiting.append((group, future))
+        self._waiters = still_waiting
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up"""
+        drain = self._service_time * (len(self._waiters) + 1) / max(self.max_concurrency, 1)
+        return max(1, min(60, math.ceil(drain)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(reason, self.retry_after())
+
+    def check_group(self, count: int):
+        """Raise AdmissionTooLarge if `count` tickets could never be held at once"""
+        if count > self.max_concurrency:
+            raise AdmissionTooLarge(f"Request needs {count} concurrent generations; "
+                                    f"the server runs at most {self.max_concurrency}")
+        if self.tenant_concurrency and count > self.tenant_concurrency:
+            raise AdmissionTooLarge(f"Request needs {count} concurrent generations; "
+                                    f"each tenant may run at most {self.tenant_concurrency}")
+
+    async def acquire(self, tenant: str, tokens: int) -> Ticket:
+        """Wait for capacity and return a ticket, or raise AdmissionRejected"""
+        return (await self.acquire_group(tenant, [tokens]))[0]
+
+    async def acquire_group(self, tenant: str, tokens: List[int]) -> List[Ticket]:
+        """
+        Wait until one ticket per entry of `tokens` can be granted together
+        and return them; nothing is held while waiting. Raises
+        AdmissionTooLarge or AdmissionRejected.
+        """
+        self.check_group(len(tokens))
+        group = [Ticket(self, tenant, count) for count in tokens]
+        if not self._waiters and self._fits(group):
+            self._grant(group)
+            return group
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((group, future))
+        # Waiters ahead may be held back only by their tenant limit or size
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up: hand the capacity back
+                for ticket in group:
+                    ticket.release()
+            else:
+                try:
+                    self._waiters.remove((group, future))
+                except ValueError:
+                    pass
+                self._dispatch()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            logger.warning(f"Request for tenant {tenant} timed out after "
+                           f"{group[0].queue_time:.1f}s in the admission queue")
+            raise self._reject("queue_timeout")
+        return group
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": len(self._waiters),
+            "tokens_in_use": self.tokens_in_use,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "token_budget": self.token_budget,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
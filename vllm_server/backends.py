@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+"""
+Inference backends for the Hyper-Jarvis vLLM server
+
+Every backend exposes the same small surface used by the FastAPI layer:
+stream/generate/abort/get_tokenizer/stats. The "vllm" backend wraps
+AsyncLLMEngine; "vllm-offline" drives the synchronous vllm.LLM through a
+micro-batching scheduler; the "fake" backend is a deterministic CPU stand-in that
+emits tokens at a configurable rate so the HTTP layer can be load tested
+without a GPU.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import gc
+import logging
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable
+
+from micro_batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+try:
+    from vllm import LLM, AsyncLLMEngine, SamplingParams, AsyncEngineArgs
+    from vllm.lora.request import LoRARequest
+    VLLM_AVAILABLE = True
+except ImportError:
+    VLLM_AVAILABLE = False
+
+    @dataclass
+    class SamplingParams:
+        """Minimal stand-in for vllm.SamplingParams when vLLM is not installed"""
+        temperature: float = 1.0
+        top_p: float = 1.0
+        max_tokens: Optional[int] = 16
+        stop: Optional[List[str]] = None
+        seed: Optional[int] = None
+        n: int = 1
+        guided_decoding: Optional[Any] = None
+
+    @dataclass
+    class LoRARequest:
+        """Minimal stand-in for vllm.lora.request.LoRARequest"""
+        lora_name: str
+        lora_int_id: int
+        lora_path: Optional[str] = None
+
+# Guided decoding has moved between vLLM releases; losing it only disables structured output
+try:
+    from vllm.sampling_params import GuidedDecodingParams
+    GUIDED_DECODING_AVAILABLE = True
+except ImportError:
+    # Without vLLM the fake backend consumes the stand-in below
+    GUIDED_DECODING_AVAILABLE = not VLLM_AVAILABLE
+    if VLLM_AVAILABLE:
+        logger.warning("vllm.sampling_params.GuidedDecodingParams not found: structured output disabled")
+
+    @dataclass
+    class GuidedDecodingParams:
+        """Minimal stand-in for vllm.sampling_params.GuidedDecodingParams"""
+        json: Optional[Any] = None
+
+# Backend selection
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "vllm")
+
+# Fake backend tuning
+FAKE_TOKENS_PER_SECOND = float(os.environ.get("FAKE_TOKENS_PER_SECOND", "50"))
+FAKE_TTFT_MS = float(os.environ.get("FAKE_TTFT_MS", "20"))
+FAKE_LATENCY_JITTER = float(os.environ.get("FAKE_LATENCY_JITTER", "0.25"))
+FAKE_MAX_OUTPUT_TOKENS = int(os.environ.get("FAKE_MAX_OUTPUT_TOKENS", "128"))
+FAKE_MAX_NUM_SEQS = int(os.environ.get("FAKE_MAX_NUM_SEQS", "256"))
+FAKE_REASONING_WORDS = int(os.environ.get("FAKE_REASONING_WORDS", "0"))  # R1-style <think> length
+
+@dataclass
+class CompletionOutput:
+    """Mirror of vllm.outputs.CompletionOutput fields the server reads"""
+    index: int
+    text: str
+    token_ids: List[int]
+    finish_reason: Optional[str] = None
+    cumulative_logprob: Optional[float] = None
+
+@dataclass
+class RequestMetrics:
+    """Mirror of vllm.sequence.RequestMetrics timing fields"""
+    arrival_time: float
+    first_scheduled_time: Optional[float] = None
+    first_token_time: Optional[float] = None
+    time_in_queue: Optional[float] = None
+    finished_time: Optional[float] = None
+
+@dataclass
+class RequestOutput:
+    """Mirror of vllm.outputs.RequestOutput fields the server reads"""
+    request_id: str
+    prompt: str
+    prompt_token_ids: List[int]
+    outputs: List[CompletionOutput]
+    finished: bool = False
+    metrics: Optional[RequestMetrics] = None
+
+class InferenceBackend:
+    """Interface shared by all inference backends"""
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    async def start(self):
+        """Load the model / start background loops"""
+
+    async def stop(self):
+        """Release resources"""
+
+    def stream(self, prompt: Any, sampling_params: SamplingParams, request_id: str,
+               lora_request: Optional[LoRARequest] = None) -> AsyncIterator[Any]:
+        """Yield cumulative RequestOutput snapshots until finished"""
+        raise NotImplementedError
+
+    async def generate(self, prompt: Any, sampling_params: SamplingParams, request_id: str,
+                       lora_request: Optional[LoRARequest] = None) -> Any:
+        """Run a request to completion and return the final RequestOutput"""
+        final_output = None
+        async for output in self.stream(prompt, sampling_params, request_id, lora_request):
+            final_output = output
+        return final_output
+
+    async def abort(self, request_id: str):
+        """Cancel an in-flight request"""
+        raise NotImplementedError
+
+    async def get_tokenizer(self):
+        """Return the tokenizer used by the engine"""
+        raise NotImplementedError
+
+    async def check_health(self):
+        """Raise if the engine is dead or cannot serve requests"""
+
+    def stats(self) -> Dict[str, Any]:
+        """Cheap scheduler snapshot (running/waiting sequences, KV usage)"""
+        return {"backend": self.name, "model": self.model}
+
+def _read_stat(stats: Dict[str, Any], name: str, read: Callable[[], Any]):
+    """Set stats[name] from an engine internal, skipping it when this vLLM lacks it"""
+    try:
+        stats[name] = read()
+    except Exception as e:
+        logger.debug(f"vLLM stat '{name}' unavailable: {e}")
+
+class VLLMBackend(InferenceBackend):
+    """AsyncLLMEngine-backed inference"""
+    name = "vllm"
+
+    def __init__(self, model: str, engine_kwargs: Optional[Dict[str, Any]] = None,
+                 load_path: Optional[str] = None):
+        super().__init__(model)
+        self.engine_kwargs = engine_kwargs or {}
+        # Local snapshot or startup weight cache to load instead of the Hub id
+        self.load_path = load_path
+        self.engine = None
+
+    async def start(self):
+        if not VLLM_AVAILABLE:
+            raise RuntimeError("vLLM is not installed (pip install -r requirements.txt)")
+        engine_args = AsyncEngineArgs(model=self.load_path or self.model, **self.engine_kwargs)
+        self.engine = AsyncLLMEngine.from_engine_args(engine_args)
+
+    async def save_sharded_state(self, path: str):
+        """Write the loaded weights, one safetensors set per rank ("sharded_state" format)"""
+        core = getattr(self.engine, "engine_core", None)
+        if core is not None and hasattr(core, "save_sharded_state_async"):
+            await core.save_sharded_state_async(path)
+            return
+        executor = self.engine.engine.model_executor
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: executor.save_sharded_state(path=path))
+
+    async def stop(self):
+        if self.engine and hasattr(self.engine, "shutdown_background_loop"):
+            self.engine.shutdown_background_loop()
+        # Drop the engine so its weights and KV cache can be reclaimed for another model
+        self.engine = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def stream(self, prompt, sampling_params, request_id, lora_request=None):
+        if isinstance(prompt, list):
+            # Pre-tokenized prompt (TokensPrompt)
+            prompt = {"prompt_token_ids": prompt}
+        return self.engine.generate(prompt, sampling_params, request_id,
+                                    lora_request=lora_request)
+
+    async def abort(self, request_id: str):
+        await self.engine.abort(request_id)
+
+    async def check_health(self):
+        if self.engine is None:
+            raise RuntimeError("engine not started")
+        # Raises once the background loop or a worker has died
+        await self.engine.check_health()
+
+    async def get_tokenizer(self):
+        return await self.engine.get_tokenizer()
+
+    def _schedulers(self) -> List[Any]:
+        scheduler = getattr(getattr(self.engine, "engine", None), "scheduler", None)
+        if scheduler is None:
+            return []
+        return scheduler if isinstance(scheduler, list) else [scheduler]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        V0 engines expose their schedulers in-process; V1 runs the scheduler
+        in the engine core process, so only the frontend's count of
+        unfinished requests is available (reported as running). Each figure
+        is read separately and left out when this vLLM does not expose it.
+        """
+        stats = super().stats()
+        if self.engine is None:
+            return stats
+        schedulers = self._schedulers()
+        if schedulers:
+            _read_stat(stats, "running", lambda: sum(len(s.running) for s in schedulers))
+            _read_stat(stats, "waiting", lambda: sum(len(s.waiting) for s in schedulers))
+            _read_stat(stats, "kv_cache_usage", lambda: 1.0 - (
+                sum(s.block_manager.get_num_free_gpu_blocks() for s in schedulers)
+                / sum(s.cache_config.num_gpu_blocks for s in schedulers)))
+        else:
+            _read_stat(stats, "running",
+                       lambda: self.engine.output_processor.get_num_unfinished_requests())
+        return stats
+
+class VLLMOfflineBackend(InferenceBackend):
+    """
+    Synchronous vllm.LLM behind a MicroBatcher. Concurrent requests with the
+    same sampling params share one LLM.generate call. Output arrives only
+    when the whole batch finishes, so stream() yields a single snapshot.
+    """
+    name = "vllm-offline"
+
+    def __init__(self, model: str, engine_kwargs: Optional[Dict[str, Any]] = None,
+                 on_batch: Optional[Callable[[int], None]] = None,
+                 load_path: Optional[str] = None):
+        super().__init__(model)
+        self.engine_kwargs = engine_kwargs or {}
+        self.load_path = load_path
+        self.llm = None
+        self.batcher = MicroBatcher(self._run_batch, on_batch=on_batch)
+        self._active = set()
+        self._aborted = set()
+
+    async def start(self):
+        if not VLLM_AVAILABLE:
+            raise RuntimeError("vLLM is not installed (pip install -r requirements.txt)")
+        loop = asyncio.get_running_loop()
+        self.llm = await loop.run_in_executor(
+            None, lambda: LLM(model=self.load_path or self.model, **self.engine_kwargs))
+
+    async def save_sharded_state(self, path: str):
+        """Write the loaded weights, one safetensors set per rank ("sharded_state" format)"""
+        engine = self.llm.llm_engine
+        core = getattr(engine, "engine_core", None)
+        save = core.save_sharded_state if core is not None else engine.model_executor.save_sharded_state
+        await asyncio.get_running_loop().run_in_executor(None, lambda: save(path=path))
+
+    async def stop(self):
+        await self.batcher.close()
+        self.llm = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def _run_batch(self, prompts: List[Any], sampling_params: Any, lora_request: Any) -> List[Any]:
+        prompts = [{"prompt_token_ids": p} if isinstance(p, list) else p for p in prompts]
+        return self.llm.generate(prompts, sampling_params, use_tqdm=False,
+                                 lora_request=lora_request)
+
+    async def stream(self, prompt, sampling_params, request_id, lora_request=None):
+        tokens = (len(prompt) if isinstance(prompt, list) else len(prompt) // 4) \
+            + (sampling_params.max_tokens or 0)
+        self._active.add(request_id)
+        try:
+            output = await self.batcher.submit(prompt, sampling_params, lora_request, tokens)
+            # A batch already running cannot be interrupted; drop the result instead
+            if request_id not in self._aborted:
+                output.request_id = request_id
+                yield output
+        finally:
+            self._active.discard(request_id)
+            self._aborted.discard(request_id)
+
+    async def abort(self, request_id: str):
+        # Requests still queued are dropped when their stream is closed
+        if request_id in self._active:
+            self._aborted.add(request_id)
+
+    async def get_tokenizer(self):
+        return self.llm.get_tokenizer()
+
+    async def check_health(self):
+        if self.llm is None:
+            raise RuntimeError("engine not started")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({"running": self.batcher.running, "waiting": self.batcher.waiting(),
+                      "micro_batching": self.batcher.stats()})
+        return stats
+
+class FakeTokenizer:
+    """Whitespace/punctuation tokenizer with a stable per-word id"""
+    _pattern = re.compile(r"\s+|\w+|[^\w\s]")
+    chat_template = "fake"
+
+    def __init__(self, vocab_size: int = 32000):
+        self.vocab_size = vocab_size
+        self.vocab: Dict[int, str] = {}
+
+    def tokenize(self, text: str) -> List[str]:
+        return self._pattern.findall(text)
+
+    def token_id(self, piece: str) -> int:
+        """Id for one piece of text, remembered so decode() reproduces it exactly"""
+        digest = hashlib.blake2b(piece.encode("utf-8"), digest_size=4).digest()
+        token_id = int.from_bytes(digest, "little") % self.vocab_size
+        self.vocab.setdefault(token_id, piece)
+        return token_id
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        return [self.token_id(piece) for piece in self.tokenize(text)]
+
+    def decode(self, token_ids: List[int], skip_special_tokens: bool = True) -> str:
+        return "".join(self.vocab.get(token_id, "") for token_id in token_ids)
+
+    def apply_chat_template(self, messages: List[Dict[str, str]], tokenize: bool = False,
+                            add_generation_prompt: bool = True) -> Any:
+        text = "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in messages)
+        if add_generation_prompt:
+            text += "<|assistant|>\n"
+        return self.encode(text) if tokenize else text
+
+class FakeBackend(InferenceBackend):
+    """
+    Deterministic CPU stand-in engine.
+
+    Greedy and seeded requests produce text that is a pure function of
+    (prompt, seed), so they are reproducible. Time to first token is drawn from a log-normal around
+    FAKE_TTFT_MS, subsequent tokens are paced at FAKE_TOKENS_PER_SECOND, and
+    at most FAKE_MAX_NUM_SEQS sequences run at once (the rest wait), which is
+    enough to exercise batching, streaming, caching and admission control.
+    """
+    name = "fake"
+
+    WORDS = ("navigate", "click", "type", "wait", "screenshot", "evaluate",
+             "page", "button", "search", "result", "selector", "the", "then",
+             "input", "submit", "link", "open", "scroll", "form", "done")
+
+    def __init__(self, model: str,
+                 tokens_per_second: float = FAKE_TOKENS_PER_SECOND,
+                 ttft_ms: float = FAKE_TTFT_MS,
+                 jitter: float = FAKE_LATENCY_JITTER,
+                 max_output_tokens: int = FAKE_MAX_OUTPUT_TOKENS,
+                 max_num_seqs: int = FAKE_MAX_NUM_SEQS,
+                 reasoning_words: int = FAKE_REASONING_WORDS):
+        super().__init__(model)
+        self.tokens_per_second = tokens_per_second
+        self.ttft_ms = ttft_ms
+        self.jitter = jitter
+        self.max_output_tokens = max_output_tokens
+        self.max_num_seqs = max_num_seqs
+        self.reasoning_words = reasoning_words
+        self.tokenizer = FakeTokenizer()
+        self._slots = asyncio.Semaphore(max_num_seqs)
+        self._active = set()
+        self._aborted = set()
+        self._running = 0
+        self._waiting = 0
+        self._completed = 0
+        self._generated_tokens = 0
+
+    def _rng(self, prompt: Any, sampling_params: SamplingParams, request_id: str,
+             lora_request: Optional[LoRARequest] = None) -> random.Random:
+        seed = getattr(sampling_params, "seed", None)
+        if seed is None and sampling_params.temperature > 0:
+            # Unseeded sampling: vary per request like a real engine would
+            seed = request_id
+        # Each adapter (and the bare model) "writes" differently
+        adapter = lora_request.lora_name if lora_request is not None else ""
+        material = f"{self.model}|{adapter}|{prompt!r}|{seed}".encode("utf-8")
+        return random.Random(int.from_bytes(hashlib.sha256(material).digest()[:8], "little"))
+
+    def _instance(self, schema: Dict[str, Any], rng: random.Random) -> Any:
+        """A random value satisfying the JSON-schema subset used for guided decoding"""
+        if "const" in schema:
+            return schema["const"]
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        for key in ("anyOf", "oneOf"):
+            if key in schema:
+                return self._instance(rng.choice(schema[key]), rng)
+        kind = schema.get("type", "object")
+        if isinstance(kind, list):
+            kind = rng.choice(kind)
+        if kind == "object":
+            properties = schema.get("properties", {})
+            required = set(schema.get("required", []))
+            return {name: self._instance(sub, rng) for name, sub in properties.items()
+                    if name in required or rng.random() < 0.5}
+        if kind == "array":
+            low = schema.get("minItems", 0)
+            high = max(low, min(schema.get("maxItems", low + 3), low + 3))
+            return [self._instance(schema.get("items", {}), rng)
+                    for _ in range(rng.randint(low, high))]
+        if kind == "integer":
+            return rng.randint(schema.get("minimum", 0), schema.get("maximum", 5000))
+        if kind == "number":
+            return round(rng.uniform(schema.get("minimum", 0.0), schema.get("maximum", 1.0)), 2)
+        if kind == "boolean":
+            return rng.random() < 0.5
+        if kind == "null":
+            return None
+        return " ".join(rng.choice(self.WORDS) for _ in range(rng.randint(1, 4)))
+
+    def _delay(self, rng: random.Random, mean_seconds: float) -> float:
+        if mean_seconds <= 0:
+            return 0.0
+        if self.jitter <= 0:
+            return mean_seconds
+        return rng.lognormvariate(0.0, self.jitter) * mean_seconds
+
+    async def stream(self, prompt, sampling_params, request_id, lora_request=None):
+        if isinstance(prompt, list):
+            prompt_token_ids = list(prompt)
+            prompt_text = self.tokenizer.decode(prompt_token_ids)
+        else:
+            prompt_text = prompt
+            prompt_token_ids = self.tokenizer.encode(prompt)
+        max_tokens = min(sampling_params.max_tokens or self.max_output_tokens,
+                         self.max_output_tokens)
+        stop = sampling_params.stop or []
+        rng = self._rng(prompt_text, sampling_params, request_id, lora_request)
+        # Scripted pieces are emitted before (for guided decoding: instead of) random words
+        script: List[str] = []
+        script_only = False
+        guided = getattr(sampling_params, "guided_decoding", None)
+        if guided is not None and guided.json is not None:
+            # Guided decoding: emit a schema-valid document piece by piece
+            schema = guided.json if isinstance(guided.json, dict) else json.loads(guided.json)
+            script = self.tokenizer.tokenize(json.dumps(self._instance(schema, rng)))
+            script_only = True
+            # The document decides its own length; only the caller's max_tokens truncates it
+            max_tokens = sampling_params.max_tokens or len(script)
+        elif self.reasoning_words and not prompt_text.rstrip().endswith("</think>"):
+            # Think first, unless the prompt already closed the <think> block
+            opening = "" if prompt_text.rstrip().endswith("<think>") else "<think>"
+            thought = " ".join(rng.choice(self.WORDS) for _ in range(self.reasoning_words))
+            script = self.tokenizer.tokenize(f"{opening}\n{thought}\n</think>\n\n")
+            max_tokens = min(sampling_params.max_tokens or self.max_output_tokens,
+                             self.max_output_tokens + len(script))
+        token_interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+        metrics = RequestMetrics(arrival_time=time.time())
+        self._active.add(request_id)
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self._active.discard(request_id)
+            raise
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        metrics.first_scheduled_time = time.time()
+        metrics.time_in_queue = metrics.first_scheduled_time - metrics.arrival_time
+        try:
+            await asyncio.sleep(self._delay(rng, self.ttft_ms / 1000.0))
+            text = ""
+            token_ids: List[int] = []
+            cumulative_logprob = 0.0
+            finish_reason = None
+            while finish_reason is None:
+                if request_id in self._aborted:
+                    return
+                if len(token_ids) < len(script):
+                    piece = script[len(token_ids)]
+                    token_ids.append(self.tokenizer.token_id(piece))
+                    if script_only and len(token_ids) == len(script):
+                        finish_reason = "stop"
+                else:
+                    piece = ("" if not text or text[-1].isspace() else " ") + rng.choice(self.WORDS)
+                    token_ids.append(self.tokenizer.token_id(piece))
+                text += piece
+                cumulative_logprob -= rng.expovariate(8.0)
+                for stop_str in stop:
+                    cut = text.find(stop_str)
+                    if cut != -1:
+                        text = text[:cut]
+                        finish_reason = "stop"
+                        break
+                if finish_reason is None and len(token_ids) >= max_tokens:
+                    finish_reason = "length" if max_tokens == sampling_params.max_tokens else "stop"
+                self._generated_tokens += 1
+                now = time.time()
+                if metrics.first_token_time is None:
+                    metrics.first_token_time = now
+                if finish_reason is not None:
+                    metrics.finished_time = now
+                yield RequestOutput(
+                    request_id=request_id,
+                    prompt=prompt_text,
+                    prompt_token_ids=prompt_token_ids,
+                    outputs=[CompletionOutput(0, text, list(token_ids), finish_reason,
+                                              cumulative_logprob)],
+                    finished=finish_reason is not None,
+                    metrics=metrics,
+                )
+                if finish_reason is None:
+                    await asyncio.sleep(self._delay(rng, token_interval))
+            self._completed += 1
+        finally:
+            self._running -= 1
+            self._slots.release()
+            self._active.discard(request_id)
+            self._aborted.discard(request_id)
+
+    async def abort(self, request_id: str):
+        if request_id in self._active:
+            self._aborted.add(request_id)
+
+    async def get_tokenizer(self):
+        return self.tokenizer
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({
+            "running": self._running,
+            "waiting": self._waiting,
+            "kv_cache_usage": self._running / self.max_num_seqs if self.max_num_seqs else 0.0,
+            "completed": self._completed,
+            "generated_tokens": self._generated_tokens,
+        })
+        return stats
+
+BACKENDS = {
+    "vllm": VLLMBackend,
+    "vllm-offline": VLLMOfflineBackend,
+    "fake": FakeBackend,
+}
+
+def create_backend(name: str, model: str, **kwargs) -> InferenceBackend:
+    """Instantiate a backend by its config name"""
+    try:
+        backend_cls = BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(BACKENDS)})")
+    logger.info(f"Using '{backend_cls.name}' inference backend for {model}")
+    return backend_cls(model, **kwargs)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Single-flight request coalescing for the Hyper-Jarvis vLLM server
+
+Identical concurrent generations share one engine request. The first
+caller starts the flight; later callers with the same key subscribe to it
+and receive the same cumulative RequestOutput snapshots. The engine request
+is aborted only once every subscriber has gone away.
+
+A caller that decides at admission time to ride on a running flight takes
+a Reservation: a seat that keeps the flight (and its final snapshot) alive
+until the caller subscribes, so it can never end up starting an engine
+request it was not admitted for.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def flight_key(model: str, prompt: Any, params: Dict[str, Any]) -> str:
+    """Exact canonical form of a generation request"""
+    material = json.dumps({"model": model, "prompt": prompt, "params": params},
+                          sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class Flight:
+    """One in-flight engine generation and its latest snapshot"""
+
+    def __init__(self, key: str, request_id: str):
+        self.key = key
+        self.request_id = request_id
+        self.latest = None
+        self.version = 0
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        """Wake every subscriber waiting on the current event"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+class Reservation:
+    """A seat on a running flight; release() gives it up if it was never used"""
+
+    def __init__(self, single_flight: "SingleFlight", flight: Flight, request_id: str):
+        self.single_flight = single_flight
+        self.flight = flight
+        self.request_id = request_id
+
+    def release(self):
+        if self.single_flight._reserved.get(self.request_id) is self:
+            del self.single_flight._reserved[self.request_id]
+            self.single_flight._leave(self.flight)
+
+class SingleFlight:
+    """Registry of in-flight generations keyed by canonical request"""
+
+    def __init__(self, on_coalesced: Optional[Callable[[], None]] = None):
+        self._flights: Dict[str, Flight] = {}
+        self._reserved: Dict[str, Reservation] = {}  # by the reserving request id
+        self.on_coalesced = on_coalesced
+        self.started = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def has(self, key: str) -> bool:
+        """True if a generation for `key` is already running"""
+        return key in self._flights
+
+    def reserve(self, key: str, request_id: str) -> Optional[Reservation]:
+        """
+        Take a seat on the running generation for `key`, or None if there is
+        none. subscribe() with the same request_id then follows that flight
+        even if it has finished in the meantime.
+        """
+        flight = self._flights.get(key)
+        if flight is None or flight.done:
+            return None
+        flight.subscribers += 1
+        reservation = Reservation(self, flight, request_id)
+        self._reserved[request_id] = reservation
+        self._joined(flight)
+        return reservation
+
+    def _joined(self, flight: Flight):
+        self.coalesced += 1
+        if self.on_coalesced is not None:
+            self.on_coalesced()
+        logger.debug(f"Coalesced request onto in-flight {flight.request_id}")
+
+    async def subscribe(self, key: str, request_id: str,
+                        start: Callable[[str], AsyncIterator[Any]],
+                        abort: Callable[[str], Awaitable[None]]) -> AsyncIterator[Any]:
+        """
+        Yield snapshots of the generation for `key`, starting it with
+        `start(request_id)` if nobody else is running it. Intermediate
+        snapshots may be skipped for slow subscribers; each one is cumulative.
+        """
+        reservation = self._reserved.pop(request_id, None)
+        if reservation is not None:
+            # The seat taken at admission becomes this subscription
+            flight = reservation.flight
+        else:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = Flight(key, request_id)
+                self._flights[key] = flight
+                flight.task = asyncio.create_task(self._run(flight, start, abort))
+                self.started += 1
+            else:
+                self._joined(flight)
+            flight.subscribers += 1
+
+        seen = 0
+        try:
+            while True:
+                changed = flight._changed
+                if flight.version > seen:
+                    seen = flight.version
+                    output = flight.latest
+                    yield output
+                    if output.finished:
+                        return
+                    continue
+                if flight.error is not None:
+                    raise flight.error
+                if flight.done:
+                    return
+                await changed.wait()
+        finally:
+            self._leave(flight)
+
+    def _leave(self, flight: Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # Last listener left: stop paying for the generation
+            self._forget(flight)
+            flight.task.cancel()
+
+    async def _run(self, flight: Flight, start: Callable[[str], AsyncIterator[Any]],
+                   abort: Callable[[str], Awaitable[None]]):
+        finished = False
+        outputs = start(flight.request_id)
+        try:
+            async for output in outputs:
+                flight.latest = output
+                flight.version += 1
+                flight.notify()
+                if output.finished:
+                    finished = True
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Generation {flight.request_id} failed: {e}")
+            flight.error = e
+        finally:
+            if not finished:
+                await abort(flight.request_id)
+            if hasattr(outputs, "aclose"):
+                await outputs.aclose()
+            flight.done = True
+            self._forget(flight)
+            flight.notify()
+
+    def _forget(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "reserved": len(self._reserved),
+        }
@@ -10,24 +10,34 @@ import json
 import logging
 import asyncio
 import sys
-from typing import Optional, List, Dict, Any
+import uuid
+from pathlib import Path
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Tuple, Union
 from contextlib import asynccontextmanager
 
-try:
-    from vllm import AsyncLLMEngine, SamplingParams, AsyncEngineArgs
-    from vllm.lora.request import LoRARequest
-except ImportError:
-    print("Installing vLLM...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "vllm"])
-    from vllm import AsyncLLMEngine, SamplingParams, AsyncEngineArgs
-
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel, Field, ValidationError, field_validator
 import uvicorn
 import time
 
+from backends import SamplingParams, CompletionOutput, INFERENCE_BACKEND, create_backend
+from coalescing import Reservation, SingleFlight, flight_key
+from admission import AdmissionController, AdmissionRejected, AdmissionTooLarge, Ticket
+from structured_output import CompiledSchema, SchemaCache, SchemaError
+from reasoning import budgeted_stream, split_reasoning, starts_in_reasoning
+from model_registry import (
+    Lease, ModelRegistry, ModelSpec, ModelUnavailable, MODEL_MEMORY_BUDGET_GB, load_specs,
+)
+from startup_cache import STARTUP_CACHE_ENABLED, StartupCache, StartupTimeline
+from health import EngineSample, HealthMonitor
+import metrics
+
+# The response cache lives with the orchestrator's optimizer in src/ (copied
+# next to this file in the Docker image)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from advanced_ai_optimization import AdvancedAIOptimizer, AIResponse, ReasoningMode
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,6 +48,28 @@ GPU_MEMORY_UTILIZATION = float(os.environ.get("GPU_MEMORY_UTILIZATION", "0.9"))
 MAX_NUM_SEQS = int(os.environ.get("MAX_NUM_SEQS", "256"))
 TENSOR_PARALLEL_SIZE = int(os.environ.get("TENSOR_PARALLEL_SIZE", "1"))
 PIPELINE_PARALLEL_SIZE = int(os.environ.get("PIPELINE_PARALLEL_SIZE", "1"))
+MAX_LORAS = int(os.environ.get("MAX_LORAS", "4"))
+MAX_LORA_RANK = int(os.environ.get("MAX_LORA_RANK", "64"))
+MODEL_BUSY_RETRY_AFTER = int(os.environ.get("MODEL_BUSY_RETRY_AFTER", "5"))
+GUIDED_DECODING_BACKEND = os.environ.get("GUIDED_DECODING_BACKEND")
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+REQUEST_COALESCING_ENABLED = os.environ.get("REQUEST_COALESCING_ENABLED", "1") == "1"
+# Skip CUDA graph capture: faster startup, slower decoding
+ENFORCE_EAGER = os.environ.get("ENFORCE_EAGER", "0") == "1"
+ENGINE_LOADING_RETRY_AFTER = int(os.environ.get("ENGINE_LOADING_RETRY_AFTER", "10"))
+
+# Admission control
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", str(MAX_NUM_SEQS)))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "512"))
+ADMISSION_TENANT_CONCURRENCY = int(os.environ.get("ADMISSION_TENANT_CONCURRENCY", "0"))
+ADMISSION_TOKEN_BUDGET = int(os.environ.get("ADMISSION_TOKEN_BUDGET", "0"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+# Multi-prompt / batch submissions
+MAX_CHOICES = int(os.environ.get("MAX_CHOICES", "16"))
+MAX_PROMPTS_PER_REQUEST = int(os.environ.get("MAX_PROMPTS_PER_REQUEST", "256"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "64"))
+BATCH_MAX_RETRIES = int(os.environ.get("BATCH_MAX_RETRIES", "5"))
 
 # API Models
 class Message(BaseModel):
@@ -50,52 +82,189 @@ class ChatCompletionRequest(BaseModel):
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     top_p: float = Field(default=0.9, ge=0.0, le=1.0)
     max_tokens: Optional[int] = Field(default=512, ge=1, le=4096)
+    n: int = Field(default=1, ge=1, le=MAX_CHOICES)
     stream: bool = False
     stop: Optional[List[str]] = None
+    seed: Optional[int] = None
+    response_format: Optional[Dict[str, Any]] = None
+    reasoning_mode: Optional[ReasoningMode] = None
+    reasoning_budget: Optional[int] = Field(default=None, ge=0)
+    include_reasoning: bool = True
+    bypass_cache: bool = False
 
 class CompletionRequest(BaseModel):
     model: str = Field(default=MODEL_NAME)
-    prompt: str
+    prompt: Union[str, List[str]]
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     top_p: float = Field(default=0.9, ge=0.0, le=1.0)
     max_tokens: Optional[int] = Field(default=512, ge=1, le=4096)
+    n: int = Field(default=1, ge=1, le=MAX_CHOICES)
     stream: bool = False
     stop: Optional[List[str]] = None
+    seed: Optional[int] = None
+    response_format: Optional[Dict[str, Any]] = None
+    reasoning_mode: Optional[ReasoningMode] = None
+    reasoning_budget: Optional[int] = Field(default=None, ge=0)
+    include_reasoning: bool = True
+    bypass_cache: bool = False
+
+    @field_validator("prompt")
+    @classmethod
+    def prompt_not_empty(cls, prompt):
+        if isinstance(prompt, list) and not prompt:
+            raise ValueError("prompt list must not be empty")
+        return prompt
 
 class HealthResponse(BaseModel):
     status: str
     model: str
     timestamp: float
+    phase: Optional[str] = None
+    startup_seconds: Optional[float] = None
+
+# Loaded models (InferenceBackends, see backends.py) keyed by the request's model field
+registry: Optional[ModelRegistry] = None
+
+# "loading" until the default model is up, then "ready" (or "failed")
+engine_state = "loading"
+startup = StartupTimeline()
+startup_cache = StartupCache()
+engine_task: Optional[asyncio.Task] = None
+weight_cache_task: Optional[asyncio.Task] = None
+
+# Replay cache for deterministic generations
+response_cache = AdvancedAIOptimizer(model=MODEL_NAME)
+
+# ReasoningMode -> sampling/budget/model/cache settings, downgrading DEEP under load
+reasoning_policy = response_cache.policy
+
+# Compiled guided-decoding schemas keyed by schema hash
+schema_cache = SchemaCache()
+
+# Identical concurrent generations share one engine request
+coalescer = SingleFlight(on_coalesced=metrics.COALESCED.inc)
+
+# Bounded queue in front of the engine
+admission = AdmissionController(
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    tenant_concurrency=ADMISSION_TENANT_CONCURRENCY,
+    token_budget=ADMISSION_TOKEN_BUDGET,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+)
+
+async def probe_engine() -> EngineSample:
+    """Health monitor hook: engine state, scheduler/admission load, dead engines"""
+    admission_stats = admission.stats()
+    sample = EngineSample(state=engine_state, running=admission_stats["running"],
+                          queued=admission_stats["queued"], max_queue=admission_stats["max_queue"])
+    if registry:
+        engine_stats = registry.engine_stats()
+        sample.running = max(sample.running, engine_stats["running"])
+        sample.waiting = engine_stats["waiting"]
+        sample.kv_cache_usage = engine_stats["kv_cache_usage"]
+        for backend in registry.loaded_backends():
+            try:
+                await backend.check_health()
+            except Exception as e:
+                sample.engine_errors.append(f"{backend.model}: {e or type(e).__name__}")
+    return sample
+
+# Liveness/readiness verdicts, sampled off the request path
+health_monitor = HealthMonitor(probe_engine)
 
-# Global engine
-engine = None
+def backend_kwargs(backend_name: str, spec: ModelSpec, enable_lora: bool) -> Dict[str, Any]:
+    """Engine construction arguments for the configured backend"""
+    if backend_name in ("vllm", "vllm-offline"):
+        # Each engine claims its share of the GPU, so co-resident models fit side by side
+        gpu_share = GPU_MEMORY_UTILIZATION
+        if spec.memory_gb and MODEL_MEMORY_BUDGET_GB:
+            gpu_share *= min(1.0, spec.memory_gb / MODEL_MEMORY_BUDGET_GB)
+        engine_kwargs = dict(
+            trust_remote_code=True,
+            gpu_memory_utilization=gpu_share,
+            max_num_seqs=MAX_NUM_SEQS,
+            tensor_parallel_size=TENSOR_PARALLEL_SIZE,
+            pipeline_parallel_size=PIPELINE_PARALLEL_SIZE,
+            dtype="auto",
+            enforce_eager=ENFORCE_EAGER,
+            # Batched prompts and n>1 choices share prompt prefixes
+            enable_prefix_caching=True,
+        )
+        if enable_lora:
+            engine_kwargs.update(enable_lora=True, max_loras=MAX_LORAS, max_lora_rank=MAX_LORA_RANK)
+        if GUIDED_DECODING_BACKEND:
+            engine_kwargs["guided_decoding_backend"] = GUIDED_DECODING_BACKEND
+        engine_kwargs.update(spec.engine_kwargs)
+        if backend_name == "vllm-offline":
+            return {"engine_kwargs": engine_kwargs, "on_batch": metrics.MICRO_BATCH_SIZE.observe}
+        return {"engine_kwargs": engine_kwargs}
+    return {}
+
+def make_backend(spec: ModelSpec, enable_lora: bool):
+    """Registry hook: build (but do not start) the engine for a base model"""
+    kwargs = backend_kwargs(INFERENCE_BACKEND, spec, enable_lora)
+    if STARTUP_CACHE_ENABLED and "engine_kwargs" in kwargs:
+        kwargs["load_path"], kwargs["engine_kwargs"] = startup_cache.prepare(
+            spec.id, kwargs["engine_kwargs"])
+    return create_backend(INFERENCE_BACKEND, spec.id, **kwargs)
+
+async def cache_weights(lease: Lease):
+    """Write the sharded weight cache while serving, keeping the model loaded until done"""
+    try:
+        with startup.phase(f"{MODEL_NAME}: weight cache"):
+            await startup_cache.store_weights(MODEL_NAME, lease.backend.engine_kwargs, lease.backend)
+    except Exception:
+        logger.exception(f"Weight cache for {MODEL_NAME} failed")
+    finally:
+        lease.release()
 
 async def initialize_engine():
-    """Initialize vLLM engine with DeepSeek model"""
-    global engine
-    logger.info(f"Initializing vLLM engine with {MODEL_NAME}...")
-    
-    engine_args = AsyncEngineArgs(
-        model=MODEL_NAME,
-        trust_remote_code=True,
-        gpu_memory_utilization=GPU_MEMORY_UTILIZATION,
-        max_num_seqs=MAX_NUM_SEQS,
-        tensor_parallel_size=TENSOR_PARALLEL_SIZE,
-        pipeline_parallel_size=PIPELINE_PARALLEL_SIZE,
-        dtype="auto",
-        enforce_eager=False,
-    )
+    """Create the model registry and load the default DeepSeek model"""
+    global registry, engine_state, weight_cache_task
+    logger.info(f"Initializing {INFERENCE_BACKEND} engine with {MODEL_NAME}...")
     
-    engine = AsyncLLMEngine.from_engine_args(engine_args)
-    logger.info(f"Engine initialized successfully")
+    lease = None
+    try:
+        with startup.phase("registry"):
+            model_registry = ModelRegistry(load_specs(), make_backend, timeline=startup,
+                                           default_model=MODEL_NAME)
+        if MODEL_NAME in model_registry.specs:
+            lease = await model_registry.lease(MODEL_NAME)
+    except Exception:
+        engine_state = "failed"
+        logger.exception("Engine initialization failed")
+        return
+    registry = model_registry
+    engine_state = "ready"
+    startup.finish()
+    logger.info(f"Engine initialized successfully "
+                f"({len(registry.specs)} models registered: {', '.join(registry.specs)})")
+    if lease is None:
+        return
+    if STARTUP_CACHE_ENABLED and hasattr(lease.backend, "engine_kwargs"):
+        # Saving takes as long as a load; serve meanwhile instead of after
+        weight_cache_task = asyncio.create_task(cache_weights(lease))
+    else:
+        lease.release()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage engine lifecycle"""
-    await initialize_engine()
+    global engine_task
+    # Load in the background so /health can answer "loading" meanwhile
+    engine_task = asyncio.create_task(initialize_engine())
+    health_monitor.start()
     yield
-    if engine:
-        engine.stop()
+    await health_monitor.stop()
+    for task in (engine_task, weight_cache_task):
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    if registry:
+        await registry.shutdown()
+    # Writes queued for the disk tier are applied before exit
+    response_cache.flush()
 
 app = FastAPI(
     title="Hyper-Jarvis vLLM Server",
@@ -104,114 +273,958 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-@app.get("/health")
-async def health_check() -> HealthResponse:
-    """Health check endpoint"""
-    return HealthResponse(
-        status="healthy",
+@app.get("/health", response_model=HealthResponse)
+async def health_check():
+    """
+    "ready" (200) once the default model is loaded; "loading" or "failed"
+    (503) before that, so load balancers skip half-started replicas
+    """
+    health = HealthResponse(
+        status=engine_state,
         model=MODEL_NAME,
-        timestamp=time.time()
+        timestamp=time.time(),
+        phase=startup.current,
+        startup_seconds=round(startup.elapsed(), 3)
     )
+    if engine_state == "ready":
+        return health
+    return JSONResponse(status_code=503, content=health.model_dump(),
+                        headers={"Retry-After": str(ENGINE_LOADING_RETRY_AFTER)})
 
-@app.post("/v1/chat/completions")
-async def chat_completion(request: ChatCompletionRequest):
-    """OpenAI-compatible chat completion endpoint"""
-    if not engine:
-        raise HTTPException(status_code=503, detail="Engine not initialized")
-    
-    # Format messages into prompt
-    prompt = ""
-    for message in request.messages:
-        if message["role"] == "system":
-            prompt += f"System: {message['content']}\n"
-        elif message["role"] == "user":
-            prompt += f"User: {message['content']}\n"
-        elif message["role"] == "assistant":
-            prompt += f"Assistant: {message['content']}\n"
-    prompt += "Assistant:"
-    
-    # Create sampling params
+def probe_response(ok: bool, status: str, reasons: List[str]) -> JSONResponse:
+    snapshot = health_monitor.snapshot
+    content = {"status": status, "reasons": reasons, "state": snapshot["state"],
+               "checks": snapshot["checks"], "sampled_at": snapshot["sampled_at"],
+               "timestamp": time.time()}
+    return JSONResponse(status_code=200 if ok else 503, content=content)
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: 503 means restart this replica (startup failed, engine dead or stalled)"""
+    snapshot = health_monitor.snapshot
+    return probe_response(snapshot["live"], "alive" if snapshot["live"] else "dead",
+                          snapshot["live_reasons"])
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: 503 means send no traffic (loading, unhealthy, no GPU headroom, queue full)"""
+    snapshot = health_monitor.snapshot
+    return probe_response(snapshot["ready"], "ready" if snapshot["ready"] else "not_ready",
+                          snapshot["ready_reasons"])
+
+@app.get("/stats")
+async def server_stats():
+    """JSON snapshot of health, startup, admission, engines, models and caches"""
+    return {
+        "timestamp": time.time(),
+        "model": MODEL_NAME,
+        "backend": INFERENCE_BACKEND,
+        "uptime_seconds": round(time.time() - startup.started, 3),
+        "health": health_monitor.snapshot,
+        "startup": {"status": engine_state, **startup.report()},
+        "admission": admission.stats(),
+        "engines": [backend.stats() for backend in registry.loaded_backends()] if registry else [],
+        "models": registry.stats() if registry else None,
+        "coalescing": coalescer.stats(),
+        "schema_cache": schema_cache.stats(),
+        "response_cache": response_cache.stats(),
+    }
+
+@app.get("/startup")
+async def startup_timeline():
+    """Per-phase startup timeline (resolve, engine, tokenizer, weight cache)"""
+    return {"status": engine_state, **startup.report()}
+
+def choice_seed(request, choice: int) -> Optional[int]:
+    """Seeded requests derive a distinct, reproducible seed for each of the n choices"""
+    return None if request.seed is None else request.seed + choice
+
+def build_sampling_params(request, choice: int = 0,
+                          schema: Optional[CompiledSchema] = None) -> SamplingParams:
+    """Translate an API request into vLLM sampling params"""
     sampling_params = SamplingParams(
         temperature=request.temperature,
         top_p=request.top_p,
         max_tokens=request.max_tokens,
         stop=request.stop,
+        seed=choice_seed(request, choice),
     )
-    
-    # Generate
-    request_id = f"hyper-jarvis-{int(time.time() * 1000)}"
-    results = await engine.generate(prompt, sampling_params, request_id)
-    
-    # Format response
+    if schema is not None:
+        sampling_params.guided_decoding = schema.guided_decoding
+    return sampling_params
+
+def apply_reasoning_policy(request) -> Dict[str, str]:
+    """
+    Fill the sampling fields a client left unset from its reasoning_mode's
+    policy (possibly downgraded from DEEP to FAST under load) and return
+    headers describing the mode actually served.
+    """
+    if request.reasoning_mode is None:
+        return {}
+    queue_depth = admission.stats()["queued"]
+    policy, downgraded_from = reasoning_policy.select(request.reasoning_mode, queue_depth)
+    explicit = set(request.model_fields_set)
+    for field in ("temperature", "top_p", "max_tokens", "reasoning_budget"):
+        if field not in explicit:
+            setattr(request, field, getattr(policy, field))
+    if policy.model and "model" not in explicit:
+        request.model = policy.model
+    request.reasoning_mode = policy.mode
+    headers = {"x-reasoning-mode": policy.mode.value}
+    if downgraded_from is not None:
+        logger.info(f"Serving {downgraded_from.value} request as {policy.mode.value} "
+                    f"(queue depth {queue_depth})")
+        headers["x-reasoning-downgraded-from"] = downgraded_from.value
+        metrics.REASONING_DOWNGRADES.inc()
+    return headers
+
+def response_schema(request) -> Optional[CompiledSchema]:
+    """Compiled schema for the request's response_format, or None for free text"""
+    try:
+        return schema_cache.resolve(request.response_format)
+    except SchemaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def new_request_id() -> str:
+    """Unique engine request id (millisecond timestamps collide under load)"""
+    return f"hyper-jarvis-{uuid.uuid4().hex}"
+
+def sse_event(payload: Any) -> str:
+    """Encode one server-sent event frame"""
+    if isinstance(payload, str):
+        return f"data: {payload}\n\n"
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def canonical_params(request, choice: int = 0,
+                     schema: Optional[CompiledSchema] = None) -> Dict[str, Any]:
+    """Sampling fields that determine the output of a generation"""
+    params = {
+        "temperature": request.temperature,
+        "top_p": request.top_p,
+        "max_tokens": request.max_tokens,
+        "stop": request.stop,
+        "seed": choice_seed(request, choice),
+    }
+    if schema is not None:
+        params["response_schema"] = schema.schema_hash
+    if request.reasoning_budget is not None:
+        params["reasoning_budget"] = request.reasoning_budget
+    return params
+
+def is_deterministic(request) -> bool:
+    """Only greedy or explicitly seeded generations are safe to replay"""
+    return request.temperature == 0.0 or request.seed is not None
+
+def response_cache_key(request, raw_request: Request, prompt: str, choice: int = 0,
+                       schema: Optional[CompiledSchema] = None) -> Optional[str]:
+    """Cache key for this request, or None when the cache must not be used"""
+    if not RESPONSE_CACHE_ENABLED or not is_deterministic(request):
+        return None
+    if request.bypass_cache or "no-cache" in raw_request.headers.get("cache-control", ""):
+        return None
+    if request.reasoning_mode is not None and \
+            not reasoning_policy.policies[request.reasoning_mode].cacheable:
+        return None
+    return response_cache.cache_key(prompt, request.reasoning_mode or ReasoningMode.FAST,
+                                    canonical_params(request, choice, schema), request.model)
+
+def cache_headers(request, cacheable: bool, status: str) -> Dict[str, str]:
+    """x-cache / Cache-Control headers describing how the response was produced"""
+    if not cacheable:
+        status = "BYPASS" if is_deterministic(request) and RESPONSE_CACHE_ENABLED else "NONE"
+        return {"x-cache": status, "Cache-Control": "no-store"}
+    return {"x-cache": status, "Cache-Control": f"private, max-age={int(response_cache.cache.ttl)}"}
+
+def remember(cache_key: Optional[str], output) -> None:
+    """Store a finished generation so identical deterministic requests replay it"""
+    if cache_key is None or output is None or not output.finished:
+        return
+    completion = output.outputs[0]
+    response_cache.cache.put(cache_key, {
+        "text": completion.text,
+        "finish_reason": completion.finish_reason or "stop",
+        "prompt_tokens": len(output.prompt_token_ids or []),
+        "completion_tokens": len(completion.token_ids),
+        "cumulative_logprob": getattr(completion, "cumulative_logprob", None),
+    })
+
+class GenerationStats:
+    """Token counts and per-request timings taken from engine outputs"""
+
+    def __init__(self, request_id: str, endpoint: str, mode: Optional[ReasoningMode] = None):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.mode = mode
+        self.arrival = time.perf_counter()
+        self.last_token_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.queue_time: Optional[float] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cumulative_logprob: Optional[float] = None
+        self.cached = False
+
+    def observe(self, output) -> None:
+        """Record a RequestOutput snapshot"""
+        now = time.perf_counter()
+        completion = output.outputs[0]
+        new_tokens = len(completion.token_ids) - self.completion_tokens
+        self.completion_tokens = len(completion.token_ids)
+        if new_tokens > 0:
+            if self.last_token_at is not None:
+                metrics.INTER_TOKEN_LATENCY.observe((now - self.last_token_at) / new_tokens)
+            self.last_token_at = now
+        if self.first_token_at is None and self.completion_tokens:
+            self.first_token_at = now
+            self.prompt_tokens = len(output.prompt_token_ids or [])
+        if output.finished:
+            self.finished_at = now
+            self.prompt_tokens = len(output.prompt_token_ids or [])
+            self.cumulative_logprob = getattr(completion, "cumulative_logprob", None)
+            self.queue_time = engine_queue_time(output)
+            self.record()
+
+    def observe_cached(self, cached: Dict[str, Any]) -> None:
+        """Record a replayed cache entry"""
+        self.cached = True
+        self.first_token_at = self.finished_at = time.perf_counter()
+        self.queue_time = 0.0
+        self.prompt_tokens = cached.get("prompt_tokens", 0)
+        self.completion_tokens = cached.get("completion_tokens", 0)
+        self.cumulative_logprob = cached.get("cumulative_logprob")
+        self.record()
+
+    def usage(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+    def timings(self) -> Dict[str, Any]:
+        ttft = self.first_token_at - self.arrival if self.first_token_at is not None else None
+        total = self.finished_at - self.arrival if self.finished_at is not None else None
+        decode_time = (self.finished_at - self.first_token_at
+                       if self.finished_at is not None and self.first_token_at is not None else 0.0)
+        tokens_per_second = (
+            (self.completion_tokens - 1) / decode_time
+            if decode_time > 0 and self.completion_tokens > 1 else None
+        )
+        return {
+            "queue_time": self.queue_time,
+            "time_to_first_token": ttft,
+            "total_time": total,
+            "tokens_per_second": tokens_per_second,
+            "cached": self.cached,
+        }
+
+    def record(self) -> None:
+        """Export the finished request to Prometheus and the log"""
+        t = self.timings()
+        metrics.E2E_LATENCY.labels(self.endpoint).observe(t["total_time"])
+        if not self.cached:
+            if t["queue_time"] is not None:
+                metrics.QUEUE_WAIT.observe(t["queue_time"])
+            if t["time_to_first_token"] is not None:
+                metrics.TIME_TO_FIRST_TOKEN.observe(t["time_to_first_token"])
+            metrics.PROMPT_TOKENS.inc(self.prompt_tokens)
+            metrics.GENERATION_TOKENS.inc(self.completion_tokens)
+            if self.mode is not None:
+                reasoning_policy.observe(self.mode, t["total_time"])
+        self.log(t)
+
+    def log(self, t: Dict[str, Any]) -> None:
+
+        def fmt(value: Optional[float], scale: float = 1000.0) -> str:
+            return "-" if value is None else f"{value * scale:.1f}"
+
+        logger.info(
+            f"{self.request_id} prompt_tokens={self.prompt_tokens} "
+            f"completion_tokens={self.completion_tokens} queue_ms={fmt(t['queue_time'])} "
+            f"ttft_ms={fmt(t['time_to_first_token'])} total_ms={fmt(t['total_time'])} "
+            f"tok_s={fmt(t['tokens_per_second'], 1.0)} cached={self.cached}"
+        )
+
+async def lookup_cache(cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Fetch a cached generation, counting the hit or miss"""
+    if cache_key is None:
+        return None
+    cached = await response_cache.cache.aget(cache_key)
+    if cached is None:
+        metrics.CACHE_MISSES.inc()
+    else:
+        metrics.CACHE_HITS.inc()
+    return cached
+
+def engine_queue_time(output) -> Optional[float]:
+    """Scheduler queue time reported by the engine, when it tracks one"""
+    metrics = getattr(output, "metrics", None)
+    if metrics is None:
+        return None
+    queue_time = getattr(metrics, "time_in_queue", None)
+    if queue_time is None:
+        first_scheduled = getattr(metrics, "first_scheduled_time", None)
+        arrival = getattr(metrics, "arrival_time", None)
+        if first_scheduled is not None and arrival is not None:
+            queue_time = first_scheduled - arrival
+    return queue_time
+
+async def iterate_outputs(raw_request: Request, lease: Lease,
+                          start: Callable[[str], AsyncIterator[Any]], request_id: str,
+                          coalesce_key: Optional[str] = None) -> AsyncIterator[Any]:
+    """
+    Yield RequestOutput snapshots from the engine (`start(request_id)`
+    submits the request), aborting the engine request if the client
+    disconnects or the consumer stops iterating. With a coalesce_key the
+    snapshots come from a shared single-flight generation, which is only
+    aborted once its last subscriber leaves.
+    """
+    engine = lease.backend
+    if coalesce_key is not None:
+        outputs = coalescer.subscribe(coalesce_key, request_id, start, engine.abort)
+    else:
+        outputs = start(request_id)
+    finished = False
+    try:
+        async for output in outputs:
+            health_monitor.note_progress()
+            if await raw_request.is_disconnected():
+                logger.info(f"Client disconnected, aborting {request_id}")
+                metrics.ABORTS.inc()
+                break
+            yield output
+            if output.finished:
+                finished = True
+    except Exception:
+        metrics.ERRORS.inc()
+        raise
+    finally:
+        await outputs.aclose()
+        if coalesce_key is None and not finished:
+            await engine.abort(request_id)
+
+def coalescing_key(request, prompt: Any, choice: int = 0,
+                   schema: Optional[CompiledSchema] = None) -> Optional[str]:
+    """
+    Single-flight key for this request, or None when it must run on its own:
+    sampled (unseeded, temperature > 0) requests are expected to differ.
+    """
+    if not REQUEST_COALESCING_ENABLED or not is_deterministic(request):
+        return None
+    return flight_key(request.model, prompt, canonical_params(request, choice, schema))
+
+async def replay_cached(cached: Dict[str, Any]) -> AsyncIterator[Any]:
+    """Yield a cached result as if the engine had produced it in one step"""
+    yield CompletionOutput(index=0, text=cached["text"], token_ids=[],
+                           finish_reason=cached["finish_reason"])
+
+async def generation_steps(raw_request: Request, lease: Lease,
+                           start: Callable[[str], AsyncIterator[Any]], request_id: str,
+                           cache_key: Optional[str],
+                           cached: Optional[Dict[str, Any]],
+                           stats: GenerationStats,
+                           coalesce_key: Optional[str] = None) -> AsyncIterator[Any]:
+    """
+    Yield cumulative CompletionOutputs, with finish_reason set on the last
+    one, either replayed from the cache or produced by the engine.
+    """
+    if cached is not None:
+        stats.observe_cached(cached)
+        async for completion in replay_cached(cached):
+            yield completion
+        return
+    async for output in iterate_outputs(raw_request, lease, start, request_id, coalesce_key):
+        stats.observe(output)
+        if output.finished:
+            remember(cache_key, output)
+        yield output.outputs[0]
+
+async def generate_full(raw_request: Request, lease: Lease,
+                        start: Callable[[str], AsyncIterator[Any]], request_id: str,
+                        stats: GenerationStats,
+                        cache_key: Optional[str] = None,
+                        coalesce_key: Optional[str] = None):
+    """Run a generation to completion and return the final RequestOutput"""
+    final_output = None
+    async for output in iterate_outputs(raw_request, lease, start, request_id, coalesce_key):
+        stats.observe(output)
+        final_output = output
+    if final_output is None or not final_output.finished:
+        # 499: client closed request (nginx convention)
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    remember(cache_key, final_output)
+    return final_output
+
+class ChoicePlan:
+    """Everything needed to produce one choice of a response"""
+
+    def __init__(self, request, raw_request: Request, lease: Lease, index: int, choice: int,
+                 request_id: str, endpoint: str, prompt: str,
+                 prompt_token_ids: Optional[List[int]] = None,
+                 schema: Optional[CompiledSchema] = None):
+        self.lease = lease
+        self.index = index
+        self.prompt = prompt
+        self.prompt_token_ids = prompt_token_ids
+        self.request_id = request_id
+        self.sampling_params = build_sampling_params(request, choice, schema)
+        self.mode = request.reasoning_mode
+        self.stats = GenerationStats(request_id, endpoint, self.mode)
+        self.cache_key = response_cache_key(request, raw_request, prompt, choice, schema)
+        self.cached: Optional[Dict[str, Any]] = None  # filled in by build_plans
+        self.coalesce_key = coalescing_key(request, prompt, choice, schema)
+        self.reasoning_budget = request.reasoning_budget
+        self.in_reasoning = starts_in_reasoning(prompt)
+        self.include_reasoning = request.include_reasoning
+        self.ticket: Optional[Union[Ticket, Reservation]] = None
+
+    def start(self, request_id: str) -> AsyncIterator[Any]:
+        """Submit this choice to the engine, under a reasoning budget when one is set"""
+        engine, lora_request = self.lease.backend, self.lease.lora_request
+        if self.reasoning_budget is None:
+            return engine.stream(self.prompt_token_ids, self.sampling_params, request_id,
+                                 lora_request)
+        return budgeted_stream(
+            lambda token_ids, params, rid: engine.stream(token_ids, params, rid, lora_request),
+            engine.abort, self.lease.prompt_builder.tokenizer, self.prompt,
+            self.prompt_token_ids, self.sampling_params, request_id, self.reasoning_budget,
+        )
+
+    def visible(self, text: str, final: bool) -> Tuple[str, str]:
+        """(reasoning, content) to send for cumulative output text"""
+        reasoning, content = split_reasoning(text, self.in_reasoning, final)
+        return (reasoning if self.include_reasoning else ""), content
+
+    def ai_response(self, text: str) -> AIResponse:
+        """The finished choice as measured by the reasoning policy"""
+        reasoning, content = split_reasoning(text, self.in_reasoning, final=True)
+        return reasoning_policy.make_response(
+            content, reasoning, self.mode or ReasoningMode.FAST,
+            self.stats.timings()["total_time"] or 0.0,
+            self.stats.cumulative_logprob, self.stats.completion_tokens,
+        )
+
+async def build_plans(request, raw_request: Request, lease: Lease, response_id: str, endpoint: str,
+                      prompts: List[str], token_ids: Optional[List[List[int]]] = None) -> List[ChoicePlan]:
+    """One plan per (prompt, choice), indexed the way OpenAI numbers choices"""
+    schema = response_schema(request)
+    plans = []
+    total = len(prompts) * request.n
+    for prompt_index, prompt in enumerate(prompts):
+        for choice in range(request.n):
+            index = prompt_index * request.n + choice
+            request_id = response_id if total == 1 else f"{response_id}-{index}"
+            plans.append(ChoicePlan(
+                request, raw_request, lease, index, choice, request_id, endpoint, prompt,
+                token_ids[prompt_index] if token_ids else None, schema,
+            ))
+    # Disk-tier lookups run on worker threads; do them all at once
+    cached = await asyncio.gather(*(lookup_cache(plan.cache_key) for plan in plans))
+    for plan, hit in zip(plans, cached):
+        plan.cached = hit
+    return plans
+
+def plans_cache_headers(request, plans: List[ChoicePlan]) -> Dict[str, str]:
+    """HIT only when every choice was replayed from the cache"""
+    cacheable = plans[0].cache_key is not None
+    status = "HIT" if all(plan.cached is not None for plan in plans) else "MISS"
+    return cache_headers(request, cacheable, status)
+
+async def admit_plans(request, raw_request: Request, plans: List[ChoicePlan]):
+    """
+    Reserve capacity for every choice that needs the engine, all or nothing.
+    Choices that attach to an in-flight generation cost the engine nothing
+    and skip the queue; their seat on it is reserved here, so the flight
+    cannot end and leave them to start an unadmitted one.
+    """
+    try:
+        queued = []
+        for plan in plans:
+            if plan.cached is not None:
+                continue
+            if plan.coalesce_key is not None:
+                plan.ticket = coalescer.reserve(plan.coalesce_key, plan.request_id)
+            if plan.ticket is None:
+                queued.append(plan)
+        if queued:
+            tickets = await admit(request, raw_request,
+                                  [len(plan.prompt_token_ids) for plan in queued])
+            for plan, ticket in zip(queued, tickets):
+                plan.ticket = ticket
+    except BaseException:
+        release_plans(plans)
+        raise
+
+def release_plans(plans: List[ChoicePlan]):
+    for plan in plans:
+        if plan.ticket is not None:
+            plan.ticket.release()
+
+async def run_choice(raw_request: Request, plan: ChoicePlan) -> Tuple[str, str]:
+    """Produce one choice to completion, returning (text, finish_reason)"""
+    if plan.cached is not None:
+        plan.stats.observe_cached(plan.cached)
+        return plan.cached["text"], plan.cached["finish_reason"]
+    try:
+        final_output = await generate_full(raw_request, plan.lease, plan.start, plan.request_id,
+                                           plan.stats, plan.cache_key, plan.coalesce_key)
+    finally:
+        if plan.ticket is not None:
+            plan.ticket.release()
+    completion = final_output.outputs[0]
+    return completion.text, completion.finish_reason or "stop"
+
+async def run_choices(raw_request: Request, plans: List[ChoicePlan]) -> List[Tuple[str, str]]:
+    """Submit every choice concurrently so the engine batches them together"""
+    try:
+        return await asyncio.gather(*(run_choice(raw_request, plan) for plan in plans))
+    finally:
+        release_plans(plans)
+
+def plan_streams(raw_request: Request, plans: List[ChoicePlan]) -> List[AsyncIterator[Any]]:
+    """Per-choice step iterators that give back their admission ticket when done"""
+    return [
+        release_when_done(generation_steps(
+            raw_request, plan.lease, plan.start, plan.request_id,
+            plan.cache_key, plan.cached, plan.stats, plan.coalesce_key,
+        ), plan.ticket)
+        for plan in plans
+    ]
+
+async def merge_streams(streams: List[AsyncIterator[Any]]) -> AsyncIterator[Tuple[int, Any]]:
+    """Interleave async iterators, yielding (stream_index, item) as items arrive"""
+    if len(streams) == 1:
+        async for item in streams[0]:
+            yield 0, item
+        return
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump(index: int, stream: AsyncIterator[Any]):
+        try:
+            async for item in stream:
+                queue.put_nowait((index, item))
+        except Exception as e:
+            queue.put_nowait((index, e))
+        finally:
+            queue.put_nowait((index, done))
+
+    tasks = [asyncio.create_task(pump(i, stream)) for i, stream in enumerate(streams)]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            index, item = await queue.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield index, item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def total_usage(plans: List[ChoicePlan]) -> Dict[str, int]:
+    """Usage summed over choices; a prompt shared by n choices is counted once"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    counted_prompts = set()
+    for plan in plans:
+        plan_usage = plan.stats.usage()
+        if plan.prompt not in counted_prompts:
+            counted_prompts.add(plan.prompt)
+            usage["prompt_tokens"] += plan_usage["prompt_tokens"]
+        usage["completion_tokens"] += plan_usage["completion_tokens"]
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    return usage
+
+def total_timings(plans: List[ChoicePlan]) -> Dict[str, Any]:
+    """Request-level timings: slowest queue/total, fastest first token, summed throughput"""
+    if len(plans) == 1:
+        return plans[0].stats.timings()
+    timings = [plan.stats.timings() for plan in plans]
+
+    def pick(key: str, fn):
+        values = [t[key] for t in timings if t[key] is not None]
+        return fn(values) if values else None
+
     return {
-        "id": request_id,
+        "queue_time": pick("queue_time", max),
+        "time_to_first_token": pick("time_to_first_token", min),
+        "total_time": pick("total_time", max),
+        "tokens_per_second": pick("tokens_per_second", sum),
+        "cached": all(t["cached"] for t in timings),
+    }
+
+async def stream_chat_chunks(steps: AsyncIterator[Tuple[int, Any]], response_id: str,
+                             model: str, plans: List[ChoicePlan]) -> AsyncIterator[str]:
+    """Stream chat.completion.chunk frames as the engine produces tokens"""
+    created = int(time.time())
+
+    def chunk(index: int, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        return sse_event({
+            "id": response_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": index,
+                "delta": delta,
+                "finish_reason": finish_reason
+            }]
+        })
+
+    for plan in plans:
+        yield chunk(plan.index, {"role": "assistant"})
+    sent_reasoning = [0] * len(plans)
+    sent_content = [0] * len(plans)
+    async for i, completion in steps:
+        reasoning, content = plans[i].visible(completion.text, completion.finish_reason is not None)
+        if len(reasoning) > sent_reasoning[i]:
+            yield chunk(plans[i].index, {"reasoning_content": reasoning[sent_reasoning[i]:]})
+            sent_reasoning[i] = len(reasoning)
+        if len(content) > sent_content[i]:
+            yield chunk(plans[i].index, {"content": content[sent_content[i]:]})
+            sent_content[i] = len(content)
+        if completion.finish_reason is not None:
+            yield chunk(plans[i].index, {}, completion.finish_reason)
+    yield sse_event({
+        "id": response_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [],
+        "usage": total_usage(plans),
+        "timings": total_timings(plans)
+    })
+    yield sse_event("[DONE]")
+
+def completion_text(plan: ChoicePlan, text: str, final: bool = True) -> str:
+    """Raw completion text, or only the answer when reasoning is excluded"""
+    if plan.include_reasoning:
+        return text
+    return plan.visible(text, final)[1]
+
+async def stream_completion_chunks(steps: AsyncIterator[Tuple[int, Any]], response_id: str,
+                                   model: str, plans: List[ChoicePlan]) -> AsyncIterator[str]:
+    """Stream text_completion frames as the engine produces tokens"""
+    created = int(time.time())
+
+    def chunk(index: int, text: str, finish_reason: Optional[str] = None) -> str:
+        return sse_event({
+            "id": response_id,
+            "object": "text_completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "text": text,
+                "index": index,
+                "logprobs": None,
+                "finish_reason": finish_reason
+            }]
+        })
+
+    sent = [0] * len(plans)
+    async for i, completion in steps:
+        text = completion_text(plans[i], completion.text, completion.finish_reason is not None)
+        delta_text = text[sent[i]:]
+        sent[i] = max(sent[i], len(text))
+        if completion.finish_reason is not None:
+            yield chunk(plans[i].index, delta_text, completion.finish_reason)
+        elif delta_text:
+            yield chunk(plans[i].index, delta_text)
+    yield sse_event({
+        "id": response_id,
+        "object": "text_completion",
+        "created": created,
+        "model": model,
+        "choices": [],
+        "usage": total_usage(plans),
+        "timings": total_timings(plans)
+    })
+    yield sse_event("[DONE]")
+
+async def admit(request, raw_request: Request, prompt_tokens: List[int]) -> List[Ticket]:
+    """
+    Reserve engine capacity for the given choices in one step, or fail fast:
+    400 if they could never run together, 429 if the server is saturated.
+    """
+    tenant = raw_request.headers.get("x-tenant-id", "default")
+    try:
+        return await admission.acquire_group(
+            tenant, [tokens + (request.max_tokens or 0) for tokens in prompt_tokens])
+    except AdmissionTooLarge as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AdmissionRejected as e:
+        metrics.ADMISSION_REJECTED.labels(e.reason).inc()
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+
+async def release_when_done(items: AsyncIterator[Any],
+                            held: Optional[Union[Ticket, Reservation, Lease]]) -> AsyncIterator[Any]:
+    """Hold an admission ticket or model lease until the stream ends or the client leaves"""
+    try:
+        async for item in items:
+            yield item
+    finally:
+        if held is not None:
+            held.release()
+
+def event_stream(chunks: AsyncIterator[str], headers: Dict[str, str]) -> StreamingResponse:
+    """Wrap an SSE generator in a non-buffered streaming response"""
+    return StreamingResponse(
+        chunks,
+        media_type="text/event-stream",
+        headers={**headers, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def require_engine():
+    if not registry:
+        detail = "Engine failed to start" if engine_state == "failed" else \
+            f"Engine loading ({startup.current or 'starting'})"
+        raise HTTPException(status_code=503, detail=detail,
+                            headers={"Retry-After": str(ENGINE_LOADING_RETRY_AFTER)})
+
+async def lease_model(model_id: str) -> Lease:
+    """Lease the requested model, loading it on demand"""
+    try:
+        return await registry.lease(model_id)
+    except ModelUnavailable as e:
+        headers = {"Retry-After": str(MODEL_BUSY_RETRY_AFTER)} if e.status_code == 503 else None
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+async def chat_plans(request: ChatCompletionRequest, raw_request: Request, lease: Lease,
+                     response_id: str) -> List[ChoicePlan]:
+    # Render with the model's chat template and tokenize once
+    prompt, prompt_token_ids = lease.prompt_builder.build(
+        [message.model_dump() for message in request.messages]
+    )
+    return await build_plans(request, raw_request, lease, response_id, "chat", [prompt],
+                             [prompt_token_ids])
+
+def with_confidence(plan: ChoicePlan, choice: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """Add the policy's confidence estimate to choices of reasoning_mode requests"""
+    if plan.mode is not None:
+        choice["confidence"] = plan.ai_response(text).confidence
+    return choice
+
+def chat_message(plan: ChoicePlan, text: str) -> Dict[str, Any]:
+    """Assistant message with any <think> trace moved to reasoning_content"""
+    reasoning, content = plan.visible(text, final=True)
+    message = {"role": "assistant", "content": content}
+    if reasoning:
+        message["reasoning_content"] = reasoning
+    return message
+
+async def chat_response(request: ChatCompletionRequest, raw_request: Request,
+                        response_id: str, plans: List[ChoicePlan]) -> Dict[str, Any]:
+    results = await run_choices(raw_request, plans)
+    return {
+        "id": response_id,
         "object": "chat.completion",
         "created": int(time.time()),
         "model": request.model,
-        "choices": [{
-            "index": 0,
-            "message": {
-                "role": "assistant",
-                "content": results[0].outputs[0].text
-            },
-            "finish_reason": "stop"
-        }],
-        "usage": {
-            "prompt_tokens": len(prompt.split()),
-            "completion_tokens": len(results[0].outputs[0].text.split()),
-            "total_tokens": len(prompt.split()) + len(results[0].outputs[0].text.split())
-        }
+        "choices": [with_confidence(plan, {
+            "index": plan.index,
+            "message": chat_message(plan, text),
+            "finish_reason": finish_reason
+        }, text) for plan, (text, finish_reason) in zip(plans, results)],
+        "usage": total_usage(plans),
+        "timings": total_timings(plans)
     }
 
-@app.post("/v1/completions")
-async def completion(request: CompletionRequest):
-    """OpenAI-compatible completion endpoint"""
-    if not engine:
-        raise HTTPException(status_code=503, detail="Engine not initialized")
-    
-    sampling_params = SamplingParams(
-        temperature=request.temperature,
-        top_p=request.top_p,
-        max_tokens=request.max_tokens,
-        stop=request.stop,
-    )
-    
-    request_id = f"hyper-jarvis-{int(time.time() * 1000)}"
-    results = await engine.generate(request.prompt, sampling_params, request_id)
-    
+async def completion_plans(request: CompletionRequest, raw_request: Request, lease: Lease,
+                           response_id: str) -> List[ChoicePlan]:
+    prompts = [request.prompt] if isinstance(request.prompt, str) else request.prompt
+    if len(prompts) > MAX_PROMPTS_PER_REQUEST:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_PROMPTS_PER_REQUEST} prompts per request")
+    plans = await build_plans(request, raw_request, lease, response_id, "completion", prompts)
+    # Tokenize once here (and once per distinct prompt) so admission sees real lengths
+    token_ids: Dict[str, List[int]] = {}
+    for plan in plans:
+        if plan.cached is None:
+            if plan.prompt not in token_ids:
+                token_ids[plan.prompt] = lease.prompt_builder.encode(plan.prompt)
+            plan.prompt_token_ids = token_ids[plan.prompt]
+    return plans
+
+async def completion_response(request: CompletionRequest, raw_request: Request,
+                              response_id: str, plans: List[ChoicePlan]) -> Dict[str, Any]:
+    results = await run_choices(raw_request, plans)
     return {
-        "id": request_id,
+        "id": response_id,
         "object": "text_completion",
         "created": int(time.time()),
         "model": request.model,
-        "choices": [{
-            "text": results[0].outputs[0].text,
-            "index": 0,
-            "finish_reason": "stop"
-        }],
-        "usage": {
-            "prompt_tokens": len(request.prompt.split()),
-            "completion_tokens": len(results[0].outputs[0].text.split()),
-            "total_tokens": len(request.prompt.split()) + len(results[0].outputs[0].text.split())
-        }
+        "choices": [with_confidence(plan, {
+            "text": completion_text(plan, text),
+            "index": plan.index,
+            "finish_reason": finish_reason
+        }, text) for plan, (text, finish_reason) in zip(plans, results)],
+        "usage": total_usage(plans),
+        "timings": total_timings(plans)
     }
 
+async def serve(request, raw_request: Request, make_plans, make_response, stream_chunks):
+    """
+    Lease the requested model, plan and admit every choice, then stream or
+    return the response. A streamed response keeps the lease until it ends.
+    """
+    response_id = new_request_id()
+    mode_headers = apply_reasoning_policy(request)
+    lease = await lease_model(request.model)
+    streaming = False
+    try:
+        plans = await make_plans(request, raw_request, lease, response_id)
+        headers = {**plans_cache_headers(request, plans), **mode_headers}
+        await admit_plans(request, raw_request, plans)
+        
+        if request.stream:
+            steps = merge_streams(plan_streams(raw_request, plans))
+            chunks = stream_chunks(steps, response_id, request.model, plans)
+            streaming = True
+            return event_stream(release_when_done(chunks, lease), headers)
+        
+        content = await make_response(request, raw_request, response_id, plans)
+        return JSONResponse(headers=headers, content=content)
+    finally:
+        if not streaming:
+            lease.release()
+
+@app.post("/v1/chat/completions")
+async def chat_completion(request: ChatCompletionRequest, raw_request: Request):
+    """OpenAI-compatible chat completion endpoint"""
+    require_engine()
+    metrics.REQUESTS.labels("chat").inc()
+    return await serve(request, raw_request, chat_plans, chat_response, stream_chat_chunks)
+
+@app.post("/v1/completions")
+async def completion(request: CompletionRequest, raw_request: Request):
+    """OpenAI-compatible completion endpoint (single prompt or list of prompts)"""
+    require_engine()
+    metrics.REQUESTS.labels("completion").inc()
+    return await serve(request, raw_request, completion_plans, completion_response,
+                       stream_completion_chunks)
+
+BATCH_ENDPOINTS = {
+    "/v1/chat/completions": (ChatCompletionRequest, chat_plans, chat_response),
+    "/v1/completions": (CompletionRequest, completion_plans, completion_response),
+}
+
+def parse_batch_line(line_number: int, line: str) -> Tuple[str, Any, Any]:
+    """
+    Accept either an OpenAI batch line ({"custom_id", "url", "body"}) or a
+    bare completion request body. Valid JSON of the wrong shape is passed
+    through for run_batch_item to answer with a 400 on that line alone.
+    """
+    item = json.loads(line)
+    if isinstance(item, dict) and "body" in item:
+        return (str(item.get("custom_id", line_number)),
+                item.get("url", "/v1/completions"), item["body"])
+    return str(line_number), "/v1/completions", item
+
+async def run_batch_item(raw_request: Request, custom_id: str, url: Any,
+                         body: Any, limiter: asyncio.Semaphore) -> Dict[str, Any]:
+    """Run one batch line, waiting out admission 429s instead of failing the line"""
+    def result(status_code: int, response_body: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "custom_id": custom_id,
+            "response": {"status_code": status_code, "body": response_body},
+            "error": {"message": error} if error else None,
+        }
+
+    if not isinstance(body, dict):
+        return result(400, error=f"Batch request body must be a JSON object, "
+                                 f"not {type(body).__name__}")
+    if not isinstance(url, str) or url not in BATCH_ENDPOINTS:
+        return result(404, error=f"Unsupported batch url: {url}")
+    request_cls, make_plans, make_response = BATCH_ENDPOINTS[url]
+    try:
+        request = request_cls(**{**body, "stream": False})
+    except ValidationError as e:
+        return result(400, error=str(e))
+
+    async with limiter:
+        apply_reasoning_policy(request)
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            response_id = new_request_id()
+            lease = None
+            try:
+                lease = await lease_model(request.model)
+                plans = await make_plans(request, raw_request, lease, response_id)
+                await admit_plans(request, raw_request, plans)
+                return result(200, await make_response(request, raw_request, response_id, plans))
+            except HTTPException as e:
+                if e.status_code == 429 and attempt < BATCH_MAX_RETRIES:
+                    await asyncio.sleep(float((e.headers or {}).get("Retry-After", "1")))
+                    continue
+                return result(e.status_code, error=str(e.detail))
+            except Exception as e:
+                logger.error(f"Batch line {custom_id} failed: {e}")
+                return result(500, error=str(e))
+            finally:
+                if lease is not None:
+                    lease.release()
+
+async def batch_results(raw_request: Request,
+                        lines: List[Tuple[str, Any, Any]]) -> AsyncIterator[str]:
+    """Yield one JSON line per request, in completion order"""
+    limiter = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    tasks = [asyncio.create_task(run_batch_item(raw_request, custom_id, url, body, limiter))
+             for custom_id, url, body in lines]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield json.dumps(await finished, ensure_ascii=False) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@app.post("/v1/batch")
+async def batch(raw_request: Request):
+    """
+    Run a JSONL file of completion/chat requests concurrently and stream
+    JSONL results back as each one finishes, e.g.
+    curl --data-binary @requests.jsonl http://host:8000/v1/batch
+    """
+    require_engine()
+    body = (await raw_request.body()).decode("utf-8")
+    lines = []
+    for line_number, line in enumerate(body.splitlines()):
+        if not line.strip():
+            continue
+        try:
+            lines.append(parse_batch_line(line_number, line))
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid batch line {line_number}: {e}")
+    metrics.REQUESTS.labels("batch").inc()
+    return StreamingResponse(batch_results(raw_request, lines), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    if registry:
+        metrics.refresh_engine_gauges(registry.engine_stats())
+    metrics.refresh_admission_gauges(admission.stats())
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/models")
 async def list_models():
-    """List available models"""
+    """List registered models (base models and LoRA adapters) and whether they are loaded"""
+    require_engine()
     return {
         "object": "list",
-        "data": [{
-            "id": MODEL_NAME,
-            "object": "model",
-            "created": int(time.time()),
-            "owned_by": "deepseek-ai",
-            "permission": [],
-            "root": MODEL_NAME,
-            "parent": None
-        }]
+        "data": registry.list_models()
     }
 
+@app.get("/models/stats")
+async def model_stats():
+    """Loaded models, memory use against the budget, load/eviction counts"""
+    require_engine()
+    return registry.stats()
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     host = os.environ.get("HOST", "0.0.0.0")
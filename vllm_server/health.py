@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Engine-aware health checks for the Hyper-Jarvis vLLM server
+
+HealthMonitor samples the engine once per HEALTH_INTERVAL on a background
+task and keeps the verdict; /health/live and /health/ready only read that
+snapshot, so load balancers can poll every second without reaching the
+engine or the request path. The only hot-path cost is note_progress(), a
+timestamp assignment per engine output.
+
+Liveness fails when restarting is the fix: startup failed, the engine
+reports itself dead (or its health check hangs), or requests are pending
+but no output has been produced for HEALTH_STALL_SECONDS. Readiness
+additionally requires the default model to be loaded, GPU memory headroom
+above HEALTH_MIN_GPU_FREE_MB and an admission queue below
+HEALTH_MAX_QUEUE_FRACTION of its capacity.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HEALTH_INTERVAL = float(os.environ.get("HEALTH_INTERVAL", "1"))
+HEALTH_PROBE_TIMEOUT = float(os.environ.get("HEALTH_PROBE_TIMEOUT", "5"))
+# Offline (micro-batched) engines emit nothing until a batch ends: keep this above the longest batch
+HEALTH_STALL_SECONDS = float(os.environ.get("HEALTH_STALL_SECONDS", "120"))
+HEALTH_MIN_GPU_FREE_MB = float(os.environ.get("HEALTH_MIN_GPU_FREE_MB", "256"))
+HEALTH_MAX_QUEUE_FRACTION = float(os.environ.get("HEALTH_MAX_QUEUE_FRACTION", "0.9"))
+
+@dataclass
+class EngineSample:
+    """What the server knows about its engines at one instant"""
+    state: str                      # "loading", "ready" or "failed"
+    running: int = 0                # sequences being generated (engine or admission view)
+    waiting: int = 0                # sequences queued in the engine scheduler
+    queued: int = 0                 # requests waiting for admission
+    max_queue: int = 0
+    kv_cache_usage: float = 0.0
+    engine_errors: List[str] = field(default_factory=list)
+
+_nvml = None
+
+def gpu_memory() -> Optional[List[Dict[str, Any]]]:
+    """
+    Free/total memory per visible GPU through NVML, which (unlike
+    torch.cuda) does not create a CUDA context in this process. None when
+    NVML is unavailable.
+    """
+    global _nvml
+    if _nvml is False:
+        return None
+    try:
+        if _nvml is None:
+            import pynvml
+            pynvml.nvmlInit()
+            _nvml = pynvml
+        visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+        if visible and all(part.strip().isdigit() for part in visible.split(",")):
+            indices = [int(part) for part in visible.split(",")]
+        else:
+            indices = range(_nvml.nvmlDeviceGetCount())
+        devices = []
+        for index in indices:
+            info = _nvml.nvmlDeviceGetMemoryInfo(_nvml.nvmlDeviceGetHandleByIndex(index))
+            devices.append({"index": index, "free_mb": info.free / 2**20, "total_mb": info.total / 2**20})
+        return devices
+    except Exception as e:
+        if _nvml is None:
+            logger.info(f"GPU memory checks disabled (NVML unavailable: {e})")
+            _nvml = False
+        else:
+            logger.warning(f"NVML query failed: {e}")
+        return None
+
+class HealthMonitor:
+    """Periodic engine sampler holding the current liveness/readiness verdict"""
+
+    def __init__(self, probe: Callable[[], Awaitable[EngineSample]],
+                 interval: float = HEALTH_INTERVAL,
+                 stall_seconds: float = HEALTH_STALL_SECONDS,
+                 min_gpu_free_mb: float = HEALTH_MIN_GPU_FREE_MB,
+                 max_queue_fraction: float = HEALTH_MAX_QUEUE_FRACTION):
+        self.probe = probe
+        self.interval = interval
+        self.stall_seconds = stall_seconds
+        self.min_gpu_free_mb = min_gpu_free_mb
+        self.max_queue_fraction = max_queue_fraction
+        self.last_progress = time.monotonic()
+        self._busy_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.snapshot: Dict[str, Any] = {
+            "live": True, "ready": False, "state": "loading",
+            "live_reasons": [], "ready_reasons": ["not sampled yet"],
+            "checks": {}, "sampled_at": None,
+        }
+
+    def note_progress(self):
+        """Called for every engine output: the scheduler is making progress"""
+        self.last_progress = time.monotonic()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.error(f"Health sampling failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sample(self) -> Dict[str, Any]:
+        """Probe the engine and recompute the verdict"""
+        try:
+            sample = await asyncio.wait_for(self.probe(), timeout=HEALTH_PROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            sample = EngineSample(state=self.snapshot["state"],
+                                  engine_errors=[f"engine probe timed out after {HEALTH_PROBE_TIMEOUT}s"])
+        gpus = await asyncio.get_running_loop().run_in_executor(None, gpu_memory) \
+            if self.min_gpu_free_mb > 0 else None
+        self.snapshot = self.evaluate(sample, gpus)
+        return self.snapshot
+
+    def evaluate(self, sample: EngineSample, gpus: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        now = time.monotonic()
+        pending = sample.running + sample.waiting
+        if pending == 0:
+            self._busy_since = None
+        elif self._busy_since is None:
+            self._busy_since = now
+        stalled_for = now - max(self.last_progress, self._busy_since) if pending else 0.0
+
+        live_reasons = []
+        if sample.state == "failed":
+            live_reasons.append("engine failed to start")
+        live_reasons.extend(sample.engine_errors)
+        if stalled_for > self.stall_seconds:
+            live_reasons.append(f"{pending} sequences pending with no output for {stalled_for:.0f}s")
+
+        ready_reasons = list(live_reasons)
+        if sample.state == "loading":
+            ready_reasons.append("engine loading")
+        min_free = min((gpu["free_mb"] for gpu in gpus), default=None) if gpus else None
+        if min_free is not None and min_free < self.min_gpu_free_mb:
+            ready_reasons.append(f"GPU memory headroom {min_free:.0f} MB < {self.min_gpu_free_mb:.0f} MB")
+        if sample.max_queue and sample.queued >= self.max_queue_fraction * sample.max_queue:
+            ready_reasons.append(f"admission queue {sample.queued}/{sample.max_queue}")
+
+        return {
+            "live": not live_reasons,
+            "ready": not ready_reasons,
+            "state": sample.state,
+            "live_reasons": live_reasons,
+            "ready_reasons": ready_reasons,
+            "checks": {
+                "running": sample.running,
+                "waiting": sample.waiting,
+                "queued": sample.queued,
+                "max_queue": sample.max_queue,
+                "kv_cache_usage": sample.kv_cache_usage,
+                "seconds_since_progress": round(now - self.last_progress, 3),
+                "stalled_seconds": round(stalled_for, 3),
+                "gpu_min_free_mb": None if min_free is None else round(min_free, 1),
+                "gpus": gpus,
+            },
+            "sampled_at": time.time(),
+        }
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Prometheus metrics for the Hyper-Jarvis vLLM server
+
+Latency histograms and token/cache/abort counters are updated on the
+request path; scheduler gauges are refreshed from the backend's stats()
+snapshot each time /metrics is scraped.
+"""
+
+from typing import Any, Dict, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest,
+)
+
+# Buckets tuned for LLM serving: sub-ms cache hits up to minute-long generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.03, 0.05, 0.075,
+                         0.1, 0.15, 0.2, 0.3, 0.5, 1.0)
+
+QUEUE_WAIT = Histogram(
+    "hyperjarvis_queue_wait_seconds", "Time a request waited before the engine scheduled it",
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "hyperjarvis_time_to_first_token_seconds", "Request arrival to first generated token",
+    buckets=LATENCY_BUCKETS,
+)
+INTER_TOKEN_LATENCY = Histogram(
+    "hyperjarvis_inter_token_latency_seconds", "Time between consecutive generated tokens",
+    buckets=TOKEN_LATENCY_BUCKETS,
+)
+E2E_LATENCY = Histogram(
+    "hyperjarvis_e2e_request_latency_seconds", "Request arrival to final token",
+    ["endpoint"], buckets=LATENCY_BUCKETS,
+)
+
+REQUESTS = Counter("hyperjarvis_requests_total", "Generation requests received", ["endpoint"])
+PROMPT_TOKENS = Counter("hyperjarvis_prompt_tokens_total", "Prompt tokens in served requests")
+GENERATION_TOKENS = Counter("hyperjarvis_generation_tokens_total", "Completion tokens returned to clients")
+CACHE_HITS = Counter("hyperjarvis_cache_hits_total", "Responses served from the response cache")
+CACHE_MISSES = Counter("hyperjarvis_cache_misses_total", "Cacheable requests that missed the cache")
+COALESCED = Counter("hyperjarvis_coalesced_requests_total",
+                    "Requests attached to an identical in-flight generation")
+ABORTS = Counter("hyperjarvis_aborts_total", "Generations aborted because the client went away")
+ERRORS = Counter("hyperjarvis_errors_total", "Generations that failed inside the engine")
+ADMISSION_REJECTED = Counter("hyperjarvis_admission_rejected_total",
+                             "Requests shed by admission control", ["reason"])
+REASONING_DOWNGRADES = Counter("hyperjarvis_reasoning_downgrades_total",
+                               "DEEP reasoning requests served as FAST because of load")
+
+MICRO_BATCH_SIZE = Histogram("hyperjarvis_micro_batch_size",
+                             "Requests per generate() call of an offline (micro-batched) engine",
+                             buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+RUNNING_SEQS = Gauge("hyperjarvis_running_sequences", "Sequences currently running in the engine")
+WAITING_SEQS = Gauge("hyperjarvis_waiting_sequences", "Sequences waiting for the engine scheduler")
+KV_CACHE_USAGE = Gauge("hyperjarvis_kv_cache_usage_ratio", "Fraction of KV-cache blocks in use")
+ADMITTED_RUNNING = Gauge("hyperjarvis_admitted_requests", "Requests holding an admission ticket")
+ADMISSION_QUEUE = Gauge("hyperjarvis_admission_queue_depth", "Requests waiting for admission")
+
+def refresh_engine_gauges(stats: Dict[str, Any]) -> None:
+    """Copy the backend's scheduler snapshot into the gauges"""
+    if "running" in stats:
+        RUNNING_SEQS.set(stats["running"])
+    if "waiting" in stats:
+        WAITING_SEQS.set(stats["waiting"])
+    if "kv_cache_usage" in stats:
+        KV_CACHE_USAGE.set(stats["kv_cache_usage"])
+
+def refresh_admission_gauges(stats: Dict[str, Any]) -> None:
+    """Copy the admission controller's snapshot into the gauges"""
+    ADMITTED_RUNNING.set(stats["running"])
+    ADMISSION_QUEUE.set(stats["queued"])
+
+def render() -> Tuple[bytes, str]:
+    """Exposition payload and its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Micro-batching scheduler for the Hyper-Jarvis vLLM server
+
+Engines that only expose an offline batch API (vllm.LLM.generate) run one
+call at a time and block while they do. MicroBatcher collects concurrent
+requests into groups of compatible sampling params and runs each group as
+one generate() call on a dedicated thread. A group is dispatched once it
+is full (max batch size or token budget) or its first request has waited
+max_wait_ms; while the engine is busy, due groups keep collecting
+requests, since they could not start any sooner. Whatever the mix of
+groups, a request queued for max_age_ms is dispatched next, so a stream
+of small full batches cannot hold back a large request indefinitely.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MICRO_BATCH_WAIT_MS = float(os.environ.get("MICRO_BATCH_WAIT_MS", "10"))
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_MAX_TOKENS = int(os.environ.get("MICRO_BATCH_MAX_TOKENS", "65536"))
+MICRO_BATCH_MAX_AGE_MS = float(os.environ.get("MICRO_BATCH_MAX_AGE_MS", "1000"))
+
+def params_key(sampling_params: Any, lora_request: Any = None) -> str:
+    """Requests can share a generate() call when this key is equal"""
+    adapter = getattr(lora_request, "lora_name", None) if lora_request is not None else None
+    return f"{adapter}|{sampling_params!r}"
+
+class Pending:
+    """One queued request"""
+
+    def __init__(self, prompt: Any, future: asyncio.Future, tokens: int):
+        self.prompt = prompt
+        self.future = future
+        self.tokens = tokens
+        self.queued_at = time.perf_counter()
+
+class Group:
+    """Requests with identical sampling params, dispatched together"""
+
+    def __init__(self, key: str, sampling_params: Any, lora_request: Any, deadline: float):
+        self.key = key
+        self.sampling_params = sampling_params
+        self.lora_request = lora_request
+        self.deadline = deadline
+        self.items: List[Pending] = []
+        self.tokens = 0
+        self.full = False
+
+class MicroBatcher:
+    """
+    Batches submit() calls into run_batch(prompts, sampling_params,
+    lora_request) calls, which must return one output per prompt in order
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any], Any, Any], List[Any]],
+                 max_wait_ms: float = MICRO_BATCH_WAIT_MS,
+                 max_batch_size: int = MICRO_BATCH_MAX_SIZE,
+                 max_batch_tokens: int = MICRO_BATCH_MAX_TOKENS,
+                 max_age_ms: float = MICRO_BATCH_MAX_AGE_MS,
+                 on_batch: Optional[Callable[[int], None]] = None):
+        self.run_batch = run_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_age = max_age_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.on_batch = on_batch
+        self._groups: List[Group] = []  # collecting, oldest first
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        # The engine is not thread-safe: one batch at a time, always on the same thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch")
+        self.running = 0
+        self.batches = 0
+        self.requests = 0
+        self.batch_sizes: Counter = Counter()
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+
+    async def submit(self, prompt: Any, sampling_params: Any, lora_request: Any = None,
+                     tokens: int = 0) -> Any:
+        """Queue one prompt and return its output; `tokens` counts against the token budget"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        key = params_key(sampling_params, lora_request)
+        group = next((g for g in self._groups if g.key == key and not g.full), None)
+        if group is not None and group.items and group.tokens + tokens > self.max_batch_tokens:
+            group.full = True
+            self._wakeup.set()
+            group = None
+        if group is None:
+            group = Group(key, sampling_params, lora_request, loop.time() + self.max_wait)
+            self._groups.append(group)
+            loop.call_later(min(self.max_wait, self.max_age), self._wakeup.set)
+        future = loop.create_future()
+        group.items.append(Pending(prompt, future, tokens))
+        group.tokens += tokens
+        if len(group.items) >= self.max_batch_size or group.tokens >= self.max_batch_tokens:
+            group.full = True
+            self._wakeup.set()
+        return await future
+
+    def _next_group(self) -> Optional[Group]:
+        """
+        The group holding the oldest request once that request is older
+        than max_age, else the oldest group that is full or due. Requests
+        cancelled while queued are dropped.
+        """
+        now = asyncio.get_running_loop().time()
+        for group in list(self._groups):
+            group.items = [item for item in group.items if not item.future.done()]
+            if not group.items:
+                self._groups.remove(group)
+        if not self._groups:
+            return None
+        oldest = min(self._groups, key=lambda g: g.items[0].queued_at)
+        if time.perf_counter() - oldest.items[0].queued_at >= self.max_age:
+            self._groups.remove(oldest)
+            return oldest
+        for group in self._groups:
+            if group.full or group.deadline <= now:
+                self._groups.remove(group)
+                return group
+        return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            group = self._next_group()
+            while group is not None:
+                await self._dispatch(loop, group)
+                group = self._next_group()
+
+    async def _dispatch(self, loop: asyncio.AbstractEventLoop, group: Group):
+        items = group.items
+        started = time.perf_counter()
+        waits = [started - item.queued_at for item in items]
+        self.running = len(items)
+        try:
+            outputs = await loop.run_in_executor(
+                self._executor, self.run_batch, [item.prompt for item in items],
+                group.sampling_params, group.lora_request)
+        except Exception as e:
+            logger.error(f"Batch of {len(items)} failed: {e}")
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        finally:
+            self.running = 0
+        for item, output in zip(items, outputs):
+            if not item.future.done():
+                item.future.set_result(output)
+        self.batches += 1
+        self.requests += len(items)
+        self.batch_sizes[len(items)] += 1
+        self.total_wait += sum(waits)
+        self.max_wait_seen = max(self.max_wait_seen, max(waits))
+        if self.on_batch is not None:
+            self.on_batch(len(items))
+        logger.debug(f"Ran batch of {len(items)} in {time.perf_counter() - started:.2f}s "
+                     f"(longest queue wait {max(waits) * 1000:.1f}ms)")
+
+    def waiting(self) -> int:
+        return sum(len(group.items) for group in self._groups)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for group in self._groups:
+            for item in group.items:
+                if not item.future.done():
+                    item.future.cancel()
+        self._groups.clear()
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "mean_queue_wait_ms": self.total_wait / self.requests * 1000 if self.requests else 0.0,
+            "max_queue_wait_ms": self.max_wait_seen * 1000,
+            "max_age_ms": self.max_age * 1000,
+        }
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Multi-model registry for the Hyper-Jarvis vLLM server
+
+One server process hosts several models. Base models are loaded on first
+use and unloaded least-recently-used when the memory budget is exceeded;
+LoRA adapters are served through their (shared) base model's engine. A
+model is only unloaded while no request holds a lease on it.
+
+Unregistered model names (clients sending their own default, e.g.
+"gpt-4") are served by the default model unless MODEL_STRICT=1.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from backends import InferenceBackend, LoRARequest
+from prompting import ChatPromptBuilder
+from startup_cache import StartupTimeline
+
+logger = logging.getLogger(__name__)
+
+MODEL_REGISTRY_CONFIG = os.environ.get("MODEL_REGISTRY_CONFIG")
+MODEL_MEMORY_BUDGET_GB = float(os.environ.get("MODEL_MEMORY_BUDGET_GB", "20"))
+# 404 for unregistered model names instead of serving them with the default model
+MODEL_STRICT = os.environ.get("MODEL_STRICT", "0") == "1"
+
+# Further models (e.g. mistralai/Mistral-7B-Instruct-v0.2) come from MODEL_REGISTRY_CONFIG
+DEFAULT_MODELS = [
+    {"id": "deepseek-ai/DeepSeek-R1-Distill-Qwen-7B", "owned_by": "deepseek-ai", "memory_gb": 18},
+]
+
+class ModelUnavailable(Exception):
+    """Raised when a model cannot be found or cannot fit right now"""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+@dataclass
+class ModelSpec:
+    """Registry entry: a base model, or a LoRA adapter on top of one"""
+    id: str
+    owned_by: str = "hyper-jarvis"
+    memory_gb: float = 0.0
+    base: Optional[str] = None      # LoRA adapters only
+    path: Optional[str] = None      # LoRA adapter weights
+    engine_kwargs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def is_adapter(self) -> bool:
+        return self.base is not None
+
+@dataclass
+class LoadedModel:
+    """A running engine and everything needed to send it requests"""
+    spec: ModelSpec
+    backend: InferenceBackend
+    prompt_builder: ChatPromptBuilder
+    active: int = 0
+    loaded_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+
+class Lease:
+    """Keeps a model loaded while a request uses it; release() is idempotent"""
+
+    def __init__(self, registry: "ModelRegistry", loaded: LoadedModel,
+                 lora_request: Optional[LoRARequest]):
+        self.registry = registry
+        self.loaded = loaded
+        self.lora_request = lora_request
+        self.released = False
+        loaded.active += 1
+        loaded.last_used = time.time()
+
+    @property
+    def backend(self) -> InferenceBackend:
+        return self.loaded.backend
+
+    @property
+    def prompt_builder(self) -> ChatPromptBuilder:
+        return self.loaded.prompt_builder
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.loaded.active -= 1
+            self.loaded.last_used = time.time()
+
+def load_specs(config_path: Optional[str] = MODEL_REGISTRY_CONFIG) -> List[ModelSpec]:
+    """Read model specs from a JSON file ({"models": [...]}) or use the defaults"""
+    entries = DEFAULT_MODELS
+    if config_path:
+        with open(config_path) as f:
+            entries = json.load(f)["models"]
+    return [ModelSpec(**entry) for entry in entries]
+
+class ModelRegistry:
+    """Loads, leases and evicts models under a memory budget"""
+
+    def __init__(self, specs: List[ModelSpec],
+                 make_backend: Callable[[ModelSpec, bool], InferenceBackend],
+                 memory_budget_gb: float = MODEL_MEMORY_BUDGET_GB,
+                 timeline: Optional[StartupTimeline] = None,
+                 default_model: Optional[str] = None, strict: bool = MODEL_STRICT):
+        self.specs = {spec.id: spec for spec in specs}
+        self.default_model = default_model if default_model in self.specs else \
+            next(iter(self.specs), None)
+        self.strict = strict
+        self.timeline = timeline or StartupTimeline()
+        self.make_backend = make_backend
+        self.memory_budget_gb = memory_budget_gb
+        self._loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        # Loads are serialized so two cold models never both pass the budget check
+        self._load_lock = asyncio.Lock()
+        self._lora_ids: Dict[str, int] = {}
+        for spec in specs:
+            if spec.is_adapter:
+                if spec.base not in self.specs:
+                    raise ValueError(f"LoRA adapter {spec.id} references unknown base {spec.base}")
+                self._lora_ids[spec.id] = len(self._lora_ids) + 1
+        base_gb = sum(spec.memory_gb for spec in specs if not spec.is_adapter)
+        if base_gb > memory_budget_gb:
+            logger.warning(f"Registered base models need {base_gb} GB but the budget is "
+                           f"{memory_budget_gb} GB: they will evict each other when used alternately")
+        self.loads = 0
+        self.evictions = 0
+
+    def has_adapters(self, base_id: str) -> bool:
+        return any(spec.base == base_id for spec in self.specs.values())
+
+    def loaded_memory_gb(self) -> float:
+        return sum(loaded.spec.memory_gb for loaded in self._loaded.values())
+
+    async def lease(self, model_id: str) -> Lease:
+        """Return a lease on `model_id`, loading (and evicting) as needed"""
+        spec = self.specs.get(model_id)
+        if spec is None:
+            if self.strict or self.default_model is None:
+                raise ModelUnavailable(f"Model '{model_id}' is not registered", status_code=404)
+            logger.debug(f"Model '{model_id}' is not registered; serving {self.default_model}")
+            spec = self.specs[self.default_model]
+        base_id = spec.base if spec.is_adapter else spec.id
+        loaded = await self._ensure_loaded(self.specs[base_id])
+        lora_request = None
+        if spec.is_adapter:
+            lora_request = LoRARequest(spec.id, self._lora_ids[spec.id], spec.path)
+        return Lease(self, loaded, lora_request)
+
+    async def _ensure_loaded(self, spec: ModelSpec) -> LoadedModel:
+        loaded = self._loaded.get(spec.id)
+        if loaded is not None:
+            self._loaded.move_to_end(spec.id)
+            return loaded
+        async with self._load_lock:
+            loaded = self._loaded.get(spec.id)
+            if loaded is not None:
+                return loaded
+            await self._make_room(spec)
+            logger.info(f"Loading model {spec.id} ({spec.memory_gb} GB)...")
+            started = time.perf_counter()
+            with self.timeline.phase(f"{spec.id}: resolve"):
+                backend = self.make_backend(spec, self.has_adapters(spec.id))
+            # Weights, KV-cache profiling and graph capture / compilation
+            with self.timeline.phase(f"{spec.id}: engine"):
+                await backend.start()
+            with self.timeline.phase(f"{spec.id}: tokenizer"):
+                prompt_builder = ChatPromptBuilder(await backend.get_tokenizer())
+            loaded = LoadedModel(spec=spec, backend=backend, prompt_builder=prompt_builder)
+            self._loaded[spec.id] = loaded
+            self.loads += 1
+            logger.info(f"Model {spec.id} loaded in {time.perf_counter() - started:.1f}s")
+            return loaded
+
+    async def _make_room(self, spec: ModelSpec):
+        """Unload idle models, least recently used first, until `spec` fits"""
+        if spec.memory_gb > self.memory_budget_gb:
+            raise ModelUnavailable(f"Model {spec.id} needs {spec.memory_gb} GB, "
+                                   f"budget is {self.memory_budget_gb} GB")
+        for model_id in list(self._loaded):
+            if self.loaded_memory_gb() + spec.memory_gb <= self.memory_budget_gb:
+                return
+            loaded = self._loaded[model_id]
+            if loaded.active == 0:
+                await self.unload(model_id)
+        if self.loaded_memory_gb() + spec.memory_gb > self.memory_budget_gb:
+            raise ModelUnavailable(f"No memory for {spec.id}: loaded models are busy")
+
+    async def unload(self, model_id: str):
+        loaded = self._loaded.pop(model_id, None)
+        if loaded is None:
+            return
+        logger.info(f"Unloading model {model_id} (idle since {loaded.last_used:.0f})")
+        self.evictions += 1
+        await loaded.backend.stop()
+
+    async def shutdown(self):
+        for model_id in list(self._loaded):
+            await self.unload(model_id)
+
+    def loaded_backends(self) -> List[InferenceBackend]:
+        return [loaded.backend for loaded in self._loaded.values()]
+
+    def list_models(self) -> List[Dict[str, Any]]:
+        """OpenAI /models entries, with load state"""
+        entries = []
+        for spec in self.specs.values():
+            base_id = spec.base or spec.id
+            loaded = self._loaded.get(base_id)
+            entries.append({
+                "id": spec.id,
+                "object": "model",
+                "created": int(loaded.loaded_at if loaded else time.time()),
+                "owned_by": spec.owned_by,
+                "permission": [],
+                "root": base_id,
+                "parent": spec.base,
+                "loaded": loaded is not None,
+            })
+        return entries
+
+    def engine_stats(self) -> Dict[str, Any]:
+        """Scheduler stats summed over loaded engines"""
+        stats: Dict[str, Any] = {"running": 0, "waiting": 0, "kv_cache_usage": 0.0}
+        for backend in self.loaded_backends():
+            backend_stats = backend.stats()
+            stats["running"] += backend_stats.get("running", 0)
+            stats["waiting"] += backend_stats.get("waiting", 0)
+            stats["kv_cache_usage"] = max(stats["kv_cache_usage"],
+                                          backend_stats.get("kv_cache_usage", 0.0))
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": {model_id: {"active": loaded.active, "memory_gb": loaded.spec.memory_gb,
+                                  "loaded_at": loaded.loaded_at, "last_used": loaded.last_used}
+                       for model_id, loaded in self._loaded.items()},
+            "memory_gb": self.loaded_memory_gb(),
+            "memory_budget_gb": self.memory_budget_gb,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
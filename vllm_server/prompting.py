@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Chat prompt construction for the Hyper-Jarvis vLLM server
+
+Prompts are rendered with the model tokenizer's own chat template and
+tokenized once on the server, so the engine receives token IDs directly.
+The system-prompt prefix (the long, fixed browser-automation instructions)
+is rendered and tokenized once and then served from an LRU cache.
+"""
+
+import os
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMPT_PREFIX_CACHE_SIZE = int(os.environ.get("PROMPT_PREFIX_CACHE_SIZE", "128"))
+# Characters each side of the prefix/remainder seam re-tokenized to check they do not merge
+PROMPT_SEAM_WINDOW = int(os.environ.get("PROMPT_SEAM_WINDOW", "32"))
+
+class ChatPromptBuilder:
+    """Render and tokenize chat messages with prefix-token caching"""
+
+    def __init__(self, tokenizer: Any, cache_size: int = PROMPT_PREFIX_CACHE_SIZE):
+        self.tokenizer = tokenizer
+        self.has_template = bool(getattr(tokenizer, "chat_template", None))
+        if not self.has_template:
+            logger.warning("Tokenizer has no chat template, using plain role prefixes")
+        # Templates render BOS themselves; plain role prefixes need the tokenizer to add it
+        self.add_special_tokens = not self.has_template
+        self._render_prefix = lru_cache(maxsize=cache_size)(self._render_prefix_uncached)
+        self._encode_prefix = lru_cache(maxsize=cache_size)(self._encode_prefix_uncached)
+
+    def render(self, messages: List[Dict[str, str]], add_generation_prompt: bool = True) -> str:
+        """Prompt text for a conversation"""
+        if self.has_template:
+            return self.tokenizer.apply_chat_template(
+                messages, tokenize=False, add_generation_prompt=add_generation_prompt
+            )
+        prompt = ""
+        for message in messages:
+            prompt += f"{message['role'].capitalize()}: {message['content']}\n"
+        if add_generation_prompt:
+            prompt += "Assistant:"
+        return prompt
+
+    def _render_prefix_uncached(self, system_messages: Tuple[str, ...]) -> str:
+        return self.render([{"role": "system", "content": content} for content in system_messages],
+                           add_generation_prompt=False)
+
+    def _encode_prefix_uncached(self, prefix: str) -> Tuple[int, ...]:
+        return tuple(self.tokenizer.encode(prefix, add_special_tokens=self.add_special_tokens))
+
+    def build(self, messages: List[Dict[str, str]]) -> Tuple[str, List[int]]:
+        """
+        Return (prompt_text, prompt_token_ids). Leading system messages are
+        tokenized through the prefix cache; only the remainder is encoded per
+        request. Falls back to a full encode if the template does not render
+        the system block as a literal prefix of the conversation, or if
+        tokens would merge across the seam (e.g. whitespace or punctuation
+        runs on both sides), so the ids always match a full encode.
+        """
+        prompt = self.render(messages)
+        system = tuple(m["content"] for m in messages if m["role"] == "system")
+        leading = 0
+        while leading < len(messages) and messages[leading]["role"] == "system":
+            leading += 1
+        if system and leading == len(system):
+            prefix = self._render_prefix(system)
+            rest = prompt[len(prefix):]
+            if prefix and prompt.startswith(prefix) and self._splits_cleanly(prefix, rest):
+                token_ids = list(self._encode_prefix(prefix))
+                token_ids.extend(self.tokenizer.encode(rest, add_special_tokens=False))
+                return prompt, token_ids
+        return prompt, list(self.tokenizer.encode(prompt, add_special_tokens=self.add_special_tokens))
+
+    def _splits_cleanly(self, prefix: str, rest: str) -> bool:
+        """Whether encoding either side of the seam apart gives the ids of encoding it whole"""
+        tail, head = prefix[-PROMPT_SEAM_WINDOW:], rest[:PROMPT_SEAM_WINDOW]
+        whole = self.tokenizer.encode(tail + head, add_special_tokens=False)
+        return whole == (self.tokenizer.encode(tail, add_special_tokens=False) +
+                         self.tokenizer.encode(head, add_special_tokens=False))
+
+    def encode(self, prompt: str) -> List[int]:
+        """Token IDs for a raw completion prompt, as the engine would compute them"""
+        return list(self.tokenizer.encode(prompt))
+
+    def cache_info(self) -> Dict[str, Any]:
+        info = self._encode_prefix.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
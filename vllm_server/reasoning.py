@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Reasoning-trace control for the Hyper-Jarvis vLLM server
+
+DeepSeek-R1 style models think inside <think>...</think> before answering.
+split_reasoning() separates that trace from the answer (reasoning_content
+vs content). budgeted_stream() caps the trace: once the model has spent its
+reasoning budget without closing the tag, the engine request is aborted and
+resumed as a continuation whose prompt ends with a forced "</think>", so the
+model moves straight on to the answer. The answer itself is limited to the
+request's max_tokens, independent of how long the model thought.
+"""
+
+import os
+import copy
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from backends import CompletionOutput, RequestOutput
+
+logger = logging.getLogger(__name__)
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+REASONING_FORCED_CLOSE = os.environ.get("REASONING_FORCED_CLOSE", "\n</think>\n\n")
+
+def starts_in_reasoning(prompt: str) -> bool:
+    """True when the chat template already opened the <think> block"""
+    return prompt.rstrip().endswith(THINK_OPEN)
+
+def _partial_tag(text: str, tag: str) -> int:
+    """Length of the longest suffix of `text` that could still become `tag`"""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+def split_reasoning(text: str, in_reasoning: bool, final: bool = False) -> Tuple[str, str]:
+    """
+    Return (reasoning, content) for cumulative output text. While streaming,
+    a possibly incomplete tag at the end is held back so neither part ever
+    has to shrink; `final` flushes it.
+    """
+    if not in_reasoning:
+        stripped = text.lstrip()
+        if stripped.startswith(THINK_OPEN):
+            text = stripped[len(THINK_OPEN):]
+        elif not final and stripped and THINK_OPEN.startswith(stripped):
+            return "", ""
+        elif not final and not stripped:
+            return "", ""
+        else:
+            return "", text
+    close = text.find(THINK_CLOSE)
+    if close == -1:
+        hold = 0 if final else _partial_tag(text, THINK_CLOSE)
+        return text[:len(text) - hold].lstrip(), ""
+    return text[:close].lstrip(), text[close + len(THINK_CLOSE):].lstrip()
+
+def with_max_tokens(sampling_params: Any, max_tokens: Optional[int]) -> Any:
+    """Copy of sampling params with a different max_tokens"""
+    if hasattr(sampling_params, "clone"):
+        params = sampling_params.clone()
+    else:
+        params = copy.copy(sampling_params)
+    params.max_tokens = max_tokens
+    return params
+
+def _snapshot(request_id: str, prompt: str, prompt_token_ids: List[int], text: str,
+              token_ids: List[int], finish_reason: Optional[str], metrics: Any,
+              cumulative_logprob: Optional[float] = None) -> RequestOutput:
+    return RequestOutput(
+        request_id=request_id,
+        prompt=prompt,
+        prompt_token_ids=prompt_token_ids,
+        outputs=[CompletionOutput(0, text, token_ids, finish_reason, cumulative_logprob)],
+        finished=finish_reason is not None,
+        metrics=metrics,
+    )
+
+def _prefix_logprob(completion: Any, kept: int) -> Optional[float]:
+    """
+    cumulative_logprob of the first `kept` tokens of `completion`. Without
+    per-token logprobs the cut tokens are assumed to be as likely as the
+    kept ones, which preserves the mean the confidence score is built on.
+    """
+    cumulative = getattr(completion, "cumulative_logprob", None)
+    generated = len(completion.token_ids)
+    if cumulative is None or kept >= generated:
+        return cumulative
+    return cumulative * kept / generated
+
+async def budgeted_stream(start: Callable[[List[int], Any, str], AsyncIterator[Any]],
+                          abort: Callable[[str], Awaitable[None]],
+                          tokenizer: Any, prompt: str, prompt_token_ids: List[int],
+                          sampling_params: Any, request_id: str,
+                          budget: int) -> AsyncIterator[Any]:
+    """
+    Yield cumulative RequestOutput snapshots like backend.stream(), with at
+    most `budget` reasoning tokens and at most sampling_params.max_tokens
+    answer tokens. `start(prompt_token_ids, params, request_id)` submits an
+    engine request.
+    """
+    max_answer = sampling_params.max_tokens
+    in_reasoning = starts_in_reasoning(prompt)
+    active_id = request_id
+    outputs = None
+    finished = False
+    text, token_ids, metrics = "", [], None
+    answer_start: Optional[int] = None  # token index where the answer began
+    try:
+        forced = budget <= 0 and in_reasoning
+        if not forced:
+            first_max = budget + max_answer if max_answer is not None else None
+            outputs = start(prompt_token_ids, with_max_tokens(sampling_params, first_max), request_id)
+            async for output in outputs:
+                completion = output.outputs[0]
+                text, token_ids = completion.text, list(completion.token_ids)
+                metrics = getattr(output, "metrics", None)
+                if answer_start is None:
+                    head = text.lstrip()[:len(THINK_OPEN)]
+                    if not in_reasoning and head and not THINK_OPEN.startswith(head):
+                        answer_start = 0  # the model skipped thinking
+                    elif THINK_CLOSE in text:
+                        answer_start = len(token_ids)
+                    elif (in_reasoning or head) and len(token_ids) >= budget \
+                            and not output.finished:
+                        forced = True
+                        break
+                if answer_start is not None and max_answer is not None \
+                        and len(token_ids) - answer_start > max_answer:
+                    # Answer over its own limit: cut it where max_tokens would have
+                    token_ids = token_ids[:answer_start + max_answer]
+                    await abort(request_id)
+                    output = _snapshot(request_id, prompt, prompt_token_ids,
+                                       tokenizer.decode(token_ids), token_ids, "length", metrics,
+                                       _prefix_logprob(completion, len(token_ids)))
+                finished = output.finished
+                yield output
+                if finished:
+                    return
+            await outputs.aclose()
+            if not forced:
+                return
+            await abort(request_id)
+
+        # Budget spent inside <think>: force the tag closed and continue with the answer
+        thought_ids = token_ids[:budget]
+        thought = text if len(thought_ids) == len(token_ids) else tokenizer.decode(thought_ids)
+        # Forced tokens count as certain
+        thought_logprob = _prefix_logprob(completion, len(thought_ids)) if token_ids else 0.0
+        if not in_reasoning and THINK_OPEN not in thought:
+            thought = THINK_OPEN
+            thought_ids = list(tokenizer.encode(THINK_OPEN, add_special_tokens=False))
+        close_ids = list(tokenizer.encode(REASONING_FORCED_CLOSE, add_special_tokens=False))
+        logger.info(f"{request_id} reached its {budget}-token reasoning budget, forcing the answer")
+        prefix_text = thought + REASONING_FORCED_CLOSE
+        prefix_ids = thought_ids + close_ids
+        active_id = f"{request_id}-answer"
+        outputs = start(prompt_token_ids + prefix_ids, sampling_params, active_id)
+        async for output in outputs:
+            completion = output.outputs[0]
+            metrics = metrics or getattr(output, "metrics", None)
+            finished = output.finished
+            answer_logprob = getattr(completion, "cumulative_logprob", None)
+            yield _snapshot(request_id, prompt, prompt_token_ids, prefix_text + completion.text,
+                            prefix_ids + list(completion.token_ids),
+                            completion.finish_reason if finished else None, metrics,
+                            None if thought_logprob is None or answer_logprob is None
+                            else thought_logprob + answer_logprob)
+            if finished:
+                return
+    finally:
+        if outputs is not None:
+            await outputs.aclose()
+        if not finished:
+            await abort(active_id)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Prefix-cache-aware router for Hyper-Jarvis inference replicas
+
+A lightweight gateway in front of several deepseek_vllm_server replicas.
+Prompts are split into fixed-size character blocks whose chained hashes are
+remembered per replica, so requests sharing a long prefix (the fixed
+browser-automation system prompt, a page chunk) land on the replica whose
+KV prefix cache already holds it. New prefixes go to a rendezvous-hashed
+replica; either choice falls back to the least-loaded replica when the
+preferred one is busy. Replicas are probed on /health/ready: a replica that
+answers "not ready" (loading, wedged, out of GPU headroom, queue full)
+leaves the rotation at once, one that cannot be reached after
+ROUTER_UNHEALTHY_AFTER failed probes.
+
+Run with:  ROUTER_REPLICAS=http://gpu-a:8000,http://gpu-b:8000 python router.py
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+# Health probes would otherwise log a line per replica every interval
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Router configuration
+ROUTER_REPLICAS = [url.strip().rstrip("/") for url in
+                   os.environ.get("ROUTER_REPLICAS", "http://localhost:8000").split(",") if url.strip()]
+ROUTER_BLOCK_CHARS = int(os.environ.get("ROUTER_BLOCK_CHARS", "256"))
+ROUTER_MAX_BLOCKS = int(os.environ.get("ROUTER_MAX_BLOCKS", "32"))
+ROUTER_INDEX_SIZE = int(os.environ.get("ROUTER_INDEX_SIZE", "100000"))
+ROUTER_LOAD_SLACK = int(os.environ.get("ROUTER_LOAD_SLACK", "8"))
+ROUTER_HEALTH_PATH = os.environ.get("ROUTER_HEALTH_PATH", "/health/ready")
+ROUTER_HEALTH_INTERVAL = float(os.environ.get("ROUTER_HEALTH_INTERVAL", "1"))
+ROUTER_HEALTH_TIMEOUT = float(os.environ.get("ROUTER_HEALTH_TIMEOUT", "1"))
+ROUTER_UNHEALTHY_AFTER = int(os.environ.get("ROUTER_UNHEALTHY_AFTER", "2"))
+ROUTER_REQUEST_TIMEOUT = float(os.environ.get("ROUTER_REQUEST_TIMEOUT", "600"))
+
+# Headers worth passing through in each direction
+FORWARD_REQUEST_HEADERS = ("content-type", "cache-control", "x-tenant-id", "authorization")
+FORWARD_RESPONSE_HEADERS = ("content-type", "cache-control", "x-cache", "retry-after",
+                            "x-accel-buffering", "x-reasoning-mode", "x-reasoning-downgraded-from")
+
+class Replica:
+    """One upstream inference server"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        # Not routable until its first readiness probe succeeds
+        self.ready = False
+        self.not_ready_reasons: List[str] = []
+        self.failures = 0
+        self.inflight = 0
+        self.served = 0
+        self.last_check: Optional[float] = None
+
+    @property
+    def routable(self) -> bool:
+        return self.healthy and self.ready
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ready": self.ready,
+            "not_ready_reasons": self.not_ready_reasons,
+            "inflight": self.inflight,
+            "served": self.served,
+            "failures": self.failures,
+            "last_check": self.last_check,
+        }
+
+class PrefixIndex:
+    """LRU map from chained prompt-block hashes to the replica that last served them"""
+
+    def __init__(self, block_chars: int = ROUTER_BLOCK_CHARS, max_blocks: int = ROUTER_MAX_BLOCKS,
+                 max_entries: int = ROUTER_INDEX_SIZE):
+        self.block_chars = block_chars
+        self.max_blocks = max_blocks
+        self.max_entries = max_entries
+        self._owners: "OrderedDict[str, str]" = OrderedDict()
+
+    def block_hashes(self, text: str) -> List[str]:
+        """Hash of each prefix block, chained so equal hashes imply equal prefixes"""
+        hashes = []
+        previous = b""
+        limit = min(len(text), self.block_chars * self.max_blocks)
+        for start in range(0, max(limit, 1), self.block_chars):
+            block = text[start:start + self.block_chars].encode("utf-8")
+            previous = hashlib.blake2b(previous + block, digest_size=16).digest()
+            hashes.append(previous.hex())
+        return hashes
+
+    def lookup(self, hashes: List[str], candidates: Set[str]) -> Optional[str]:
+        """Replica holding the longest known prefix, restricted to `candidates`"""
+        for block_hash in reversed(hashes):
+            owner = self._owners.get(block_hash)
+            if owner is not None and owner in candidates:
+                self._owners.move_to_end(block_hash)
+                return owner
+        return None
+
+    def record(self, hashes: List[str], url: str):
+        for block_hash in hashes:
+            self._owners[block_hash] = url
+            self._owners.move_to_end(block_hash)
+        while len(self._owners) > self.max_entries:
+            self._owners.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+class PrefixRouter:
+    """Replica selection: prefix affinity, then rendezvous hash, then least load"""
+
+    def __init__(self, urls: List[str]):
+        self.replicas = {url: Replica(url) for url in urls}
+        self.index = PrefixIndex()
+        self.prefix_hits = 0
+        self.hash_routes = 0
+        self.load_fallbacks = 0
+
+    def choose(self, hashes: List[str], exclude: Set[str] = frozenset()) -> Replica:
+        healthy = [r for r in self.replicas.values() if r.routable and r.url not in exclude]
+        if not healthy:
+            raise HTTPException(status_code=503, detail="No healthy inference replicas")
+        least = min(healthy, key=lambda r: r.inflight)
+
+        def busy(replica: Replica) -> bool:
+            return replica.inflight > least.inflight + ROUTER_LOAD_SLACK
+
+        owner = self.index.lookup(hashes, {r.url for r in healthy})
+        if owner is not None and not busy(self.replicas[owner]):
+            self.prefix_hits += 1
+            return self.replicas[owner]
+
+        # Rendezvous hashing on the first block keeps new prefixes sticky too
+        preferred = max(healthy, key=lambda r: hashlib.blake2b(
+            (hashes[0] + r.url).encode("utf-8"), digest_size=8).digest())
+        if not busy(preferred):
+            self.hash_routes += 1
+            return preferred
+        self.load_fallbacks += 1
+        return least
+
+    def mark_failed(self, replica: Replica):
+        replica.failures += 1
+        if replica.failures >= ROUTER_UNHEALTHY_AFTER and replica.healthy:
+            logger.warning(f"Replica {replica.url} marked unhealthy")
+            replica.healthy = False
+
+    def mark_ok(self, replica: Replica):
+        if not replica.healthy:
+            logger.info(f"Replica {replica.url} is healthy again")
+        replica.failures = 0
+        replica.healthy = True
+
+    def mark_ready(self, replica: Replica, ready: bool, reasons: List[str]):
+        """Readiness verdict of a replica that answered its probe"""
+        self.mark_ok(replica)
+        if ready != replica.ready:
+            if ready:
+                logger.info(f"Replica {replica.url} is ready")
+            else:
+                logger.warning(f"Replica {replica.url} is not ready: {'; '.join(reasons) or 'no reason given'}")
+        replica.ready = ready
+        replica.not_ready_reasons = [] if ready else reasons
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replicas": [r.stats() for r in self.replicas.values()],
+            "indexed_blocks": len(self.index),
+            "prefix_hits": self.prefix_hits,
+            "hash_routes": self.hash_routes,
+            "load_fallbacks": self.load_fallbacks,
+        }
+
+router = PrefixRouter(ROUTER_REPLICAS)
+client: Optional[httpx.AsyncClient] = None
+
+def prefix_text(payload: Dict[str, Any]) -> str:
+    """The part of a request that determines the engine's KV prefix"""
+    if "messages" in payload:
+        return "".join(f"<{m.get('role')}>{m.get('content')}" for m in payload["messages"]
+                       if isinstance(m, dict))
+    prompt = payload.get("prompt", "")
+    if isinstance(prompt, list):
+        prompt = prompt[0] if prompt else ""
+    return prompt if isinstance(prompt, str) else ""
+
+async def probe_replica(replica: Replica):
+    """One readiness probe: 200/503 set readiness (reasons only from a JSON object), anything else is a failure"""
+    try:
+        response = await client.get(f"{replica.url}{ROUTER_HEALTH_PATH}",
+                                    timeout=ROUTER_HEALTH_TIMEOUT)
+    except httpx.HTTPError:
+        response = None
+    replica.last_check = time.time()
+    if response is not None and response.status_code in (200, 503):
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        reasons = body.get("reasons") if isinstance(body, dict) else None
+        if not isinstance(reasons, list):
+            reasons = []
+        router.mark_ready(replica, response.status_code == 200, [str(reason) for reason in reasons])
+    else:
+        router.mark_failed(replica)
+
+async def health_loop():
+    """Poll every replica's readiness probe and update its routing eligibility"""
+    while True:
+        replicas = list(router.replicas.values())
+        results = await asyncio.gather(*(probe_replica(r) for r in replicas), return_exceptions=True)
+        for replica, result in zip(replicas, results):
+            # One bad probe must not stop the checks that keep routing up to date
+            if isinstance(result, Exception):
+                logger.error(f"Health probe of {replica.url} failed: {result!r}")
+                router.mark_failed(replica)
+        await asyncio.sleep(ROUTER_HEALTH_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Manage the upstream connection pool and health checker"""
+    global client
+    client = httpx.AsyncClient(
+        timeout=httpx.Timeout(ROUTER_REQUEST_TIMEOUT, connect=5.0),
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=200),
+    )
+    health_task = asyncio.create_task(health_loop())
+    logger.info(f"Routing across {len(router.replicas)} replicas: {', '.join(router.replicas)}")
+    yield
+    health_task.cancel()
+    await client.aclose()
+
+app = FastAPI(
+    title="Hyper-Jarvis Inference Router",
+    description="Prefix-cache-aware gateway for vLLM replicas",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+async def relay(response: httpx.Response, replica: Replica) -> AsyncIterator[bytes]:
+    """Pass upstream bytes through as they arrive, then free the replica slot"""
+    try:
+        async for chunk in response.aiter_raw():
+            yield chunk
+    finally:
+        await response.aclose()
+        replica.inflight -= 1
+
+async def forward(raw_request: Request, path: str) -> StreamingResponse:
+    body = await raw_request.body()
+    try:
+        payload = json.loads(body) if path != "/v1/batch" else {}
+    except json.JSONDecodeError:
+        payload = {}
+    hashes = router.index.block_hashes(prefix_text(payload if isinstance(payload, dict) else {}))
+    headers = {k: v for k, v in raw_request.headers.items() if k.lower() in FORWARD_REQUEST_HEADERS}
+
+    tried: Set[str] = set()
+    while True:
+        replica = router.choose(hashes, exclude=tried)
+        tried.add(replica.url)
+        # Count the request and remember its prefix as soon as the route is chosen:
+        # a non-streaming response only arrives once generation has finished
+        replica.inflight += 1
+        router.index.record(hashes, replica.url)
+        upstream = client.build_request("POST", f"{replica.url}{path}", content=body, headers=headers)
+        try:
+            response = await client.send(upstream, stream=True)
+        except BaseException as e:
+            replica.inflight -= 1
+            if not isinstance(e, httpx.TransportError):
+                raise
+            logger.warning(f"Replica {replica.url} failed: {e}")
+            router.mark_failed(replica)
+            continue
+        if response.status_code == 429 and len(tried) < len(router.replicas):
+            # Saturated replica: try another one before passing the 429 on
+            replica.inflight -= 1
+            await response.aclose()
+            continue
+        break
+
+    replica.served += 1
+    passthrough = {k: v for k, v in response.headers.items() if k.lower() in FORWARD_RESPONSE_HEADERS}
+    passthrough["x-routed-to"] = replica.url
+    return StreamingResponse(relay(response, replica), status_code=response.status_code,
+                             headers=passthrough)
+
+@app.post("/v1/chat/completions")
+async def chat_completion(raw_request: Request):
+    return await forward(raw_request, "/v1/chat/completions")
+
+@app.post("/v1/completions")
+async def completion(raw_request: Request):
+    return await forward(raw_request, "/v1/completions")
+
+@app.post("/v1/batch")
+async def batch(raw_request: Request):
+    return await forward(raw_request, "/v1/batch")
+
+@app.get("/models")
+async def list_models():
+    """Models served by any healthy replica"""
+    for replica in router.replicas.values():
+        if replica.routable:
+            try:
+                response = await client.get(f"{replica.url}/models")
+                return response.json()
+            except httpx.HTTPError:
+                router.mark_failed(replica)
+    raise HTTPException(status_code=503, detail="No healthy inference replicas")
+
+@app.get("/health")
+@app.get("/health/ready")
+async def health_check():
+    """Healthy (ready) while at least one replica is routable"""
+    healthy = sum(1 for r in router.replicas.values() if r.routable)
+    if not healthy:
+        raise HTTPException(status_code=503, detail="No healthy inference replicas")
+    return {"status": "healthy", "replicas": len(router.replicas), "healthy_replicas": healthy,
+            "timestamp": time.time()}
+
+@app.get("/health/live")
+async def liveness():
+    """The router itself is up; replica problems only affect readiness"""
+    return {"status": "alive", "timestamp": time.time()}
+
+@app.get("/router/stats")
+async def router_stats():
+    return router.stats()
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 8080))
+    host = os.environ.get("HOST", "0.0.0.0")
+
+    logger.info(f"Starting router on {host}:{port}")
+    uvicorn.run(app, host=host, port=port, log_level="info")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Startup cache for the Hyper-Jarvis vLLM server
+
+A cold start resolves the model on the Hub, reads and shards the weights,
+then compiles the model and captures CUDA graphs. StartupCache removes the
+repeatable parts:
+
+- Weights: after the first load the engine writes its already-sharded
+  weights (one safetensors set per tensor/pipeline rank, vLLM's
+  "sharded_state" format) under STARTUP_CACHE_DIR/weights/<key>. Later
+  starts load that directory, which the loader memory-maps rank by rank
+  instead of re-reading and re-splitting the original checkpoint.
+  Without a weight cache the model is still resolved to its local Hub
+  snapshot, so no network round-trip happens at startup.
+- Compilation: vLLM's torch.compile cache, Inductor and Triton kernels are
+  kept under STARTUP_CACHE_DIR/compile/<key>, keyed by model, engine args
+  and library versions, so restarts and new replicas with the same volume
+  reuse them.
+
+StartupTimeline records how long each startup phase took; /health reports
+it while the server is still loading.
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from contextlib import contextmanager
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STARTUP_CACHE_ENABLED = os.environ.get("STARTUP_CACHE_ENABLED", "1") == "1"
+STARTUP_CACHE_DIR = os.environ.get(
+    "STARTUP_CACHE_DIR",
+    os.path.join(os.environ.get("MODEL_CACHE", "~/.cache/hyper-jarvis"), "startup"))
+# Write the sharded weight cache after a load that could not use one
+STARTUP_WEIGHT_CACHE = os.environ.get("STARTUP_WEIGHT_CACHE", "1") == "1"
+
+# Engine args that change how weights are split or stored; the rest only affect runtime
+WEIGHT_KEY_ARGS = ("revision", "dtype", "quantization", "tensor_parallel_size",
+                   "pipeline_parallel_size")
+# Files in a model snapshot that the weight cache replaces
+WEIGHT_FILE_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth")
+COMPLETE_MARKER = "startup_cache.json"
+# Models loaded later (on demand, after evictions) keep appending phases
+TIMELINE_MAX_PHASES = 200
+
+class StartupTimeline:
+    """Named startup phases with their durations, in the order they started"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases: "deque[Dict[str, Any]]" = deque(maxlen=TIMELINE_MAX_PHASES)
+        self.current: Optional[str] = None
+        self.finished: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        entry = {"phase": name, "start": round(time.time() - self.started, 3), "seconds": None}
+        self.phases.append(entry)
+        previous, self.current = self.current, name
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["seconds"] = round(time.perf_counter() - began, 3)
+            self.current = previous
+            logger.info(f"Startup phase '{name}' took {entry['seconds']:.2f}s")
+
+    def finish(self):
+        self.finished = time.time()
+        summary = ", ".join(f"{p['phase']} {p['seconds']:.1f}s" for p in self.phases
+                            if p["seconds"] is not None)
+        logger.info(f"Startup finished in {self.elapsed():.1f}s ({summary})")
+
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def report(self) -> Dict[str, Any]:
+        return {"elapsed_seconds": round(self.elapsed(), 3), "current_phase": self.current,
+                "phases": list(self.phases)}
+
+def _version(package: str) -> Optional[str]:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+def cache_key(model: str, engine_kwargs: Dict[str, Any], fields: Optional[Tuple[str, ...]] = None) -> str:
+    """Stable short hash of the model, (selected) engine args and library versions"""
+    args = {k: v for k, v in engine_kwargs.items() if fields is None or k in fields}
+    payload = json.dumps({"model": model, "engine_kwargs": args,
+                          "vllm": _version("vllm"), "torch": _version("torch")},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def local_snapshot(model: str) -> Optional[Path]:
+    """Local directory holding `model`, without contacting the Hub"""
+    if Path(model).is_dir():
+        return Path(model)
+    try:
+        from huggingface_hub import snapshot_download
+        return Path(snapshot_download(model, local_files_only=True))
+    except Exception:
+        # Not downloaded yet (or huggingface_hub missing): let the engine fetch it
+        return None
+
+class StartupCache:
+    """Resolves where an engine should load from and where its compile caches live"""
+
+    def __init__(self, root: str = STARTUP_CACHE_DIR, save_weights: bool = STARTUP_WEIGHT_CACHE):
+        self.root = Path(root).expanduser()
+        self.save_weights = save_weights
+
+    def weights_dir(self, model: str, engine_kwargs: Dict[str, Any]) -> Path:
+        name = model.replace("/", "--")
+        return self.root / "weights" / f"{name}-{cache_key(model, engine_kwargs, WEIGHT_KEY_ARGS)}"
+
+    def compile_dir(self, model: str, engine_kwargs: Dict[str, Any]) -> Path:
+        name = model.replace("/", "--")
+        return self.root / "compile" / f"{name}-{cache_key(model, engine_kwargs)}"
+
+    def has_weights(self, model: str, engine_kwargs: Dict[str, Any]) -> bool:
+        return (self.weights_dir(model, engine_kwargs) / COMPLETE_MARKER).exists()
+
+    def prepare(self, model: str, engine_kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        (path to load, engine kwargs) for `model`. Points the compile caches
+        at this configuration's directory; vLLM spawns its engine processes
+        after this, so they inherit the environment.
+        """
+        compile_dir = self.compile_dir(model, engine_kwargs)
+        for variable, sub in (("VLLM_CACHE_ROOT", "vllm"), ("TORCHINDUCTOR_CACHE_DIR", "inductor"),
+                              ("TRITON_CACHE_DIR", "triton")):
+            (compile_dir / sub).mkdir(parents=True, exist_ok=True)
+            os.environ[variable] = str(compile_dir / sub)
+        kwargs = dict(engine_kwargs, served_model_name=model)
+        load_from = model
+        if self.has_weights(model, engine_kwargs):
+            load_from = str(self.weights_dir(model, engine_kwargs))
+            logger.info(f"Loading {model} from the sharded weight cache {load_from}")
+            kwargs["load_format"] = "sharded_state"
+        else:
+            snapshot = local_snapshot(model)
+            if snapshot is not None:
+                load_from = str(snapshot)
+        # The cache and the snapshot both carry the tokenizer files
+        kwargs.setdefault("tokenizer", load_from)
+        return load_from, kwargs
+
+    async def store_weights(self, model: str, engine_kwargs: Dict[str, Any], backend: Any) -> bool:
+        """
+        Save a loaded engine's sharded weights plus the snapshot's config and
+        tokenizer files. Written to a temporary directory and renamed, so a
+        crash never leaves a half-written cache behind. File work runs on a
+        worker thread; the server keeps serving while this runs.
+        """
+        if not self.save_weights or not hasattr(backend, "save_sharded_state"):
+            return False
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, self.has_weights, model, engine_kwargs):
+            return False
+        snapshot = await loop.run_in_executor(None, local_snapshot, model)
+        if snapshot is None:
+            logger.warning(f"No local snapshot of {model}; not caching its weights")
+            return False
+        target = self.weights_dir(model, engine_kwargs)
+        staging = target.with_name(f"{target.name}.tmp-{os.getpid()}")
+        try:
+            await loop.run_in_executor(None, _reset_dir, staging)
+            await backend.save_sharded_state(str(staging))
+            await loop.run_in_executor(None, _complete_weights, model, engine_kwargs, snapshot,
+                                       staging, target)
+        except asyncio.CancelledError:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        except Exception as e:
+            logger.warning(f"Could not write the weight cache for {model}: {e}")
+            await loop.run_in_executor(None, lambda: shutil.rmtree(staging, ignore_errors=True))
+            return False
+        logger.info(f"Cached sharded weights of {model} in {target}")
+        return True
+
+def _reset_dir(path: Path):
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+
+def _complete_weights(model: str, engine_kwargs: Dict[str, Any], snapshot: Path,
+                      staging: Path, target: Path):
+    """Copy the non-weight snapshot files next to the saved shards, mark complete, publish"""
+    for path in snapshot.iterdir():
+        if path.is_file() and not path.name.endswith(WEIGHT_FILE_SUFFIXES) \
+                and not path.name.endswith(".index.json"):
+            shutil.copy(path, staging / path.name)
+    (staging / COMPLETE_MARKER).write_text(json.dumps({
+        "model": model, "created": time.time(),
+        "engine_kwargs": {k: engine_kwargs.get(k) for k in WEIGHT_KEY_ARGS},
+    }, default=str))
+    shutil.rmtree(target, ignore_errors=True)
+    staging.rename(target)
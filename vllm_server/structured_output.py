@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Structured (JSON-schema constrained) output for the Hyper-Jarvis vLLM server
+
+`response_format={"type": "json_schema", ...}` constrains decoding so the
+model can only emit JSON matching the schema. Schemas are serialized
+compactly and hashed once; the resulting guided-decoding params are cached
+by that hash and reused, so the engine's grammar compiler (itself keyed by the schema
+string) sees a byte-identical schema and compiles each grammar only once.
+ACTION_PLAN_SCHEMA mirrors the action vocabulary of src/modules/dispatcher.js.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from backends import GUIDED_DECODING_AVAILABLE, GuidedDecodingParams
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CACHE_SIZE = int(os.environ.get("SCHEMA_CACHE_SIZE", "256"))
+ACTION_PLAN_MAX_ACTIONS = int(os.environ.get("ACTION_PLAN_MAX_ACTIONS", "20"))
+
+def action_schema(action_type: str, parameters: Dict[str, Any],
+                  required: tuple = ()) -> Dict[str, Any]:
+    """One browser action: {"type", "description", "parameters"}"""
+    return {
+        "type": "object",
+        "properties": {
+            "type": {"const": action_type},
+            "description": {"type": "string"},
+            "parameters": {
+                "type": "object",
+                "properties": parameters,
+                "required": list(required),
+                "additionalProperties": False,
+            },
+        },
+        "required": ["type", "description", "parameters"],
+        "additionalProperties": False,
+    }
+
+ACTION_SCHEMAS = [
+    action_schema("navigate", {"url": {"type": "string"}}, ("url",)),
+    action_schema("click", {"selector": {"type": "string"}}, ("selector",)),
+    action_schema("type", {"selector": {"type": "string"}, "text": {"type": "string"}},
+                  ("selector", "text")),
+    action_schema("wait", {
+        "selector": {"type": "string"},
+        "timeout": {"type": "integer", "minimum": 0},
+        "state": {"enum": ["attached", "detached", "visible", "hidden"]},
+    }, ("timeout",)),
+    action_schema("screenshot", {"fullPage": {"type": "boolean"},
+                                 "type": {"enum": ["png", "jpeg"]}}),
+    action_schema("evaluate", {"script": {"type": "string"}}, ("script",)),
+    action_schema("getContent", {}),
+]
+
+ACTION_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reasoning": {"type": "string"},
+        "actions": {
+            "type": "array",
+            "items": {"anyOf": ACTION_SCHEMAS},
+            "minItems": 1,
+            "maxItems": ACTION_PLAN_MAX_ACTIONS,
+        },
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    },
+    "required": ["reasoning", "actions"],
+    "additionalProperties": False,
+}
+
+# Schemas clients can ask for by name instead of sending them
+NAMED_SCHEMAS = {"action_plan": ACTION_PLAN_SCHEMA}
+
+class SchemaError(ValueError):
+    """Raised for a response_format the server cannot enforce"""
+
+def canonical_schema(schema: Dict[str, Any]) -> str:
+    """
+    Compact serialization: equal schemas give identical strings (and grammars).
+    Keys are not sorted because property order is the order the model writes
+    fields in (reasoning before actions).
+    """
+    return json.dumps(schema, separators=(",", ":"), ensure_ascii=False)
+
+@dataclass
+class CompiledSchema:
+    """A schema ready to attach to SamplingParams"""
+    schema_hash: str
+    schema: Dict[str, Any]
+    guided_decoding: Any
+
+class SchemaCache:
+    """LRU of compiled schemas keyed by the hash of their canonical form"""
+
+    def __init__(self, max_size: int = SCHEMA_CACHE_SIZE):
+        self.max_size = max_size
+        self._compiled: "OrderedDict[str, CompiledSchema]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, schema: Dict[str, Any]) -> CompiledSchema:
+        if not isinstance(schema, dict):
+            raise SchemaError("json_schema.schema must be a JSON object")
+        text = canonical_schema(schema)
+        schema_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        compiled = self._compiled.get(schema_hash)
+        if compiled is not None:
+            self.hits += 1
+            self._compiled.move_to_end(schema_hash)
+            return compiled
+        self.misses += 1
+        canonical = json.loads(text)
+        compiled = CompiledSchema(schema_hash, canonical, GuidedDecodingParams(json=canonical))
+        self._compiled[schema_hash] = compiled
+        while len(self._compiled) > self.max_size:
+            self._compiled.popitem(last=False)
+        logger.info(f"Compiled JSON schema {schema_hash[:12]} ({len(text)} bytes)")
+        return compiled
+
+    def resolve(self, response_format: Optional[Dict[str, Any]]) -> Optional[CompiledSchema]:
+        """
+        Compiled schema for an OpenAI-style response_format, or None for
+        plain text. `{"type": "json_schema", "json_schema": {"name":
+        "action_plan"}}` selects the built-in browser action-plan schema;
+        `{"type": "json_object"}` accepts any JSON object.
+        """
+        if not response_format:
+            return None
+        kind = response_format.get("type", "text")
+        if kind == "text":
+            return None
+        if not GUIDED_DECODING_AVAILABLE:
+            raise SchemaError("Structured output is not supported by the installed vLLM")
+        if kind == "json_object":
+            return self.compile({"type": "object"})
+        if kind != "json_schema":
+            raise SchemaError(f"Unsupported response_format type '{kind}'")
+        spec = response_format.get("json_schema") or {}
+        schema = spec.get("schema")
+        if schema is None:
+            schema = NAMED_SCHEMAS.get(spec.get("name"))
+            if schema is None:
+                raise SchemaError(f"json_schema needs a schema or one of: {', '.join(NAMED_SCHEMAS)}")
+        return self.compile(schema)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._compiled), "hits": self.hits, "misses": self.misses}